@@ -0,0 +1,69 @@
+""" Benchmark line chart figure size and build time with and without downsampling.
+
+For each size, two synthetic event_type series with that many points in total are plotted:
+    full: every point as an SVG px.line, as before (skipped above SVG_LIMIT points)
+    auto: line_figure, downsampled to the point budget and drawn with WebGL above the threshold
+
+The build time covers creating the figure and serializing it to JSON, which is what Streamlit
+sends to the browser. The JSON size is a proxy for the time the browser takes to parse and draw
+the figure, since rendering in the browser can't be timed from Python.
+
+Run from the repository root:
+    python benchmarks/bench_charts.py
+"""
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.joinpath("src")))
+
+from paralympics.charts import line_figure, point_budget  # noqa: E402
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+REPEATS = 3
+# A full figure of a million points is tens of MB of JSON, leave it out
+SVG_LIMIT = 100_000
+
+
+def make_series(n):
+    """ Two noisy random walk series with n points in total """
+    rng = np.random.default_rng(0)
+    half = n // 2
+    return pd.DataFrame({"event_type": ["summer"] * half + ["winter"] * (n - half),
+                         "year": np.concatenate([np.arange(half), np.arange(n - half)]),
+                         "participants": rng.normal(size=n).cumsum()})
+
+
+def measure(build):
+    """ Return (best time in ms, JSON size in KB) to build and serialize a figure """
+    sizes = []
+
+    def run():
+        sizes.append(len(build().to_json()))
+
+    ms = min(timeit.repeat(run, number=1, repeat=REPEATS)) * 1000
+    return ms, sizes[-1] / 1024
+
+
+def main():
+    budget = point_budget()
+    print(f"point budget {budget}")
+    print(f"{'points':>9} | {'mode':<5} | {'trace':<9} | {'build ms':>9} | {'JSON KB':>9}")
+    for n in SIZES:
+        df = make_series(n)
+        modes = {"auto": lambda: line_figure(df, "participants", budget)}
+        if n <= SVG_LIMIT:
+            modes["full"] = lambda: px.line(df, x="year", y="participants",
+                                            color="event_type", render_mode="svg")
+        for mode, build in modes.items():
+            ms, kb = measure(build)
+            trace = build().data[0].type
+            print(f"{n:>9} | {mode:<5} | {trace:<9} | {ms:>9.1f} | {kb:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+""" Benchmark the vectorized ColumnarDataset against the SQLite path for the /all dataset.
+
+The real dataset has only a few dozen rows, so the rows are repeated to the sizes below. The
+SQLite path runs the same filter or GROUP BY as SQL over an in-memory copy of the rows.
+
+Run from the repository root:
+    python benchmarks/bench_columnar.py
+"""
+import sqlite3
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.joinpath("src")))
+
+from data.columnar import ColumnarDataset  # noqa: E402
+from data.paralympics_data import ParalympicsData  # noqa: E402
+
+SIZES = (1_000, 10_000, 100_000)
+REPEATS = 20
+
+
+def make_rows(base, n):
+    """ Repeat the base rows to n rows, shifting the year so the rows are not identical. """
+    return [{**base[i % len(base)], "year": base[i % len(base)]["year"] + 4 * (i // len(base))}
+            for i in range(n)]
+
+
+def load_sqlite(rows):
+    conn = sqlite3.connect(":memory:")
+    cols = list(rows[0].keys())
+    conn.execute(f"CREATE TABLE all_data ({', '.join(cols)})")
+    conn.executemany(f"INSERT INTO all_data VALUES ({', '.join('?' for _ in cols)})",
+                     [tuple(r[c] for c in cols) for r in rows])
+    return conn
+
+
+def time_ms(func):
+    return min(timeit.repeat(func, number=1, repeat=REPEATS)) * 1000
+
+
+def main():
+    data = ParalympicsData()
+    base = data.get_all_data()
+    data.close()
+    print(f"{'rows':>8} | {'query':<32} | {'sqlite ms':>10} | {'columnar ms':>11} | speed up")
+    for n in SIZES:
+        rows = make_rows(base, n)
+        conn = load_sqlite(rows)
+        dataset = ColumnarDataset(rows)
+        queries = {
+            "filter event_type, year range": (
+                lambda: conn.execute(
+                    "SELECT year, place_name, participants FROM all_data "
+                    "WHERE event_type = ? AND year BETWEEN ? AND ?",
+                    ("winter", 1990, 2100)).fetchall(),
+                lambda: dataset.filter({"event_type": "winter", "year_min": "1990",
+                                        "year_max": "2100"},
+                                       ["year", "place_name", "participants"])),
+            "count event_type, year range": (
+                lambda: conn.execute(
+                    "SELECT COUNT(*) FROM all_data "
+                    "WHERE event_type = ? AND year BETWEEN ? AND ?",
+                    ("winter", 1990, 2100)).fetchall(),
+                lambda: int(dataset.filter_mask({"event_type": "winter", "year_min": "1990",
+                                                 "year_max": "2100"}).sum())),
+            "sum participants by event_type": (
+                lambda: conn.execute(
+                    "SELECT event_type, SUM(participants) FROM all_data "
+                    "GROUP BY event_type").fetchall(),
+                lambda: dataset.group_by(["event_type"], "participants", "sum")),
+        }
+        for name, (sqlite_query, columnar_query) in queries.items():
+            sqlite_ms = time_ms(sqlite_query)
+            columnar_ms = time_ms(columnar_query)
+            print(f"{n:>8} | {name:<32} | {sqlite_ms:>10.3f} | {columnar_ms:>11.3f} | "
+                  f"{sqlite_ms / columnar_ms:>7.1f}x")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+""" Admission control for the API: per-route concurrency limits, bounded queues and coalescing.
+
+When a class opens the dashboard at the same moment every session requests /all and /question
+at once. Without a limit every request starts a database query, they all compete for the CPU
+and the latency of every request rises until the clients time out. AdmissionMiddleware instead:
+
+    limits the requests running at once for each group of routes (see RouteLimit), queueing the
+        rest in a bounded queue
+    rejects a request straight away with 503 Service Unavailable and a Retry-After header when
+        the queue is full, or when it has waited queue_timeout seconds, so a client can back off
+        rather than wait for its own timeout
+    coalesces identical GET requests: while one is running, the same request (path and query)
+        waits for its response rather than running the same query again
+
+Streaming routes (/events and the exports) are not coalesced, and /events, /metrics, /admin and
+the docs are not limited. The limits are set with the PARALYMPICS_ADMISSION variable, a comma
+separated list of pattern=concurrency/queue_size, e.g. '/all*=2/16,*=8/64'; patterns use
+fnmatch syntax and the first that matches a path applies.
+
+Usage:
+    controller = AdmissionController()
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+    controller.metrics()
+"""
+import asyncio
+import os
+from dataclasses import dataclass, field
+from fnmatch import fnmatchcase
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+ADMISSION_ENV = "PARALYMPICS_ADMISSION"
+# Seconds a client is asked to wait before retrying a rejected request
+RETRY_AFTER = 1
+# Most seconds a request waits in the queue before it is rejected
+QUEUE_TIMEOUT = 5.0
+# Paths that are never limited: the change stream, metrics, backups and the API docs
+EXEMPT = ("/", "/events", "/metrics", "/admin/*", "/docs*", "/redoc*", "/openapi.json")
+
+
+@dataclass(frozen=True)
+class RouteLimit:
+    """ Limit on the requests to the paths matching a pattern.
+
+    Attributes:
+        pattern: fnmatch pattern of the paths, e.g. '/all*'
+        concurrency: most requests running at once
+        queue_size: most requests waiting for one of those to finish
+        coalesce: True if identical GET requests share a response
+    """
+    pattern: str
+    concurrency: int
+    queue_size: int
+    coalesce: bool = True
+
+
+# The /all dataset is the largest response and is requested by every dashboard session
+DEFAULT_LIMITS = (
+    RouteLimit("*/export", 2, 8, coalesce=False),
+    RouteLimit("/all*", 4, 64),
+    RouteLimit("*", 16, 128),
+)
+
+
+def parse_limits(value: Optional[str]) -> Tuple[RouteLimit, ...]:
+    """ Parse the PARALYMPICS_ADMISSION setting, see the module docstring.
+
+    Export routes are never coalesced whatever the setting.
+
+    Raises:
+        ValueError: if the setting is not a list of pattern=concurrency/queue_size
+    """
+    if not value:
+        return DEFAULT_LIMITS
+    limits = []
+    for item in value.split(","):
+        try:
+            pattern, sizes = item.strip().split("=")
+            concurrency, queue_size = (int(n) for n in sizes.split("/"))
+        except ValueError as e:
+            raise ValueError(f"{ADMISSION_ENV} must be a comma separated list of "
+                             f"pattern=concurrency/queue_size, not '{item}'") from e
+        if concurrency < 1 or queue_size < 0:
+            raise ValueError(f"{ADMISSION_ENV}: concurrency must be at least 1 and the queue "
+                             f"size 0 or more in '{item}'")
+        limits.append(RouteLimit(pattern, concurrency, queue_size,
+                                 coalesce=not pattern.endswith("export")))
+    return tuple(limits)
+
+
+@dataclass
+class _Gate:
+    """ The running requests and queue of one RouteLimit, with its counts for metrics. """
+    limit: RouteLimit
+    active: int = 0
+    queued: int = 0
+    max_queued: int = 0
+    admitted: int = 0
+    shed: int = 0
+    coalesced: int = 0
+    semaphore: asyncio.Semaphore = field(init=False)
+
+    def __post_init__(self):
+        self.semaphore = asyncio.Semaphore(self.limit.concurrency)
+
+    async def acquire(self, timeout: float) -> bool:
+        """ Wait for a slot, returning False if the queue is full or the wait times out. """
+        if not self.semaphore.locked():
+            # A slot is free, acquired without waiting
+            await self.semaphore.acquire()
+        elif self.queued >= self.limit.queue_size:
+            self.shed += 1
+            return False
+        else:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), timeout)
+            except asyncio.TimeoutError:
+                self.shed += 1
+                return False
+            finally:
+                self.queued -= 1
+        self.active += 1
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        self.active -= 1
+        self.semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pattern": self.limit.pattern, "concurrency": self.limit.concurrency,
+                "queue_size": self.limit.queue_size, "active": self.active,
+                "queued": self.queued, "max_queued": self.max_queued,
+                "admitted": self.admitted, "shed": self.shed, "coalesced": self.coalesced}
+
+
+class AdmissionController:
+    """ Decides which gate each request goes through and holds the in-flight GET requests.
+
+    All of its state is only used from the event loop, so needs no locks.
+
+    Attributes:
+        limits: the RouteLimits, the first whose pattern matches a path applies
+        exempt: patterns of the paths that are not limited
+        queue_timeout: most seconds a request waits in the queue
+        retry_after: seconds a rejected client is asked to wait
+    """
+
+    def __init__(self, limits: Optional[Sequence[RouteLimit]] = None,
+                 exempt: Sequence[str] = EXEMPT, queue_timeout: float = QUEUE_TIMEOUT,
+                 retry_after: int = RETRY_AFTER):
+        if limits is None:
+            limits = parse_limits(os.environ.get(ADMISSION_ENV))
+        self.limits = tuple(limits)
+        self.exempt = tuple(exempt)
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._gates: Optional[List[_Gate]] = None
+        # (path, query string): future of the recorded response messages
+        self._in_flight: Dict[Tuple[str, bytes], asyncio.Future] = {}
+
+    def _gate(self, path: str) -> Optional[_Gate]:
+        if any(fnmatchcase(path, pattern) for pattern in self.exempt):
+            return None
+        if self._gates is None:
+            # Created on first use so the semaphores belong to the server's event loop
+            self._gates = [_Gate(limit) for limit in self.limits]
+        return next((g for g in self._gates if fnmatchcase(path, g.limit.pattern)), None)
+
+    def metrics(self) -> Dict[str, Any]:
+        """ Return the counts of each route limit: running, queued, admitted, shed, coalesced. """
+        return {"routes": [g.stats() for g in self._gates or ()],
+                "in_flight": len(self._in_flight)}
+
+
+class AdmissionMiddleware:
+    """ ASGI middleware applying an AdmissionController to the HTTP requests of an app. """
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        controller = self.controller
+        gate = controller._gate(scope["path"])
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+        if not gate.limit.coalesce or scope["method"] != "GET":
+            await self._admit(gate, scope, receive, send)
+            return
+
+        key = (scope["path"], scope.get("query_string", b""))
+        in_flight = controller._in_flight.get(key)
+        if in_flight is not None:
+            # The same request is already running or queued, send a copy of its response
+            gate.coalesced += 1
+            for message in await asyncio.shield(in_flight):
+                await send(message)
+            return
+        in_flight = asyncio.get_running_loop().create_future()
+        controller._in_flight[key] = in_flight
+        try:
+            messages = await self._admit(gate, scope, receive, send, record=True)
+        except BaseException as e:
+            in_flight.set_exception(e)
+            # Retrieved here so an exception no other request waited for isn't logged as lost
+            in_flight.exception()
+            raise
+        else:
+            in_flight.set_result(messages)
+        finally:
+            del controller._in_flight[key]
+
+    async def _admit(self, gate: _Gate, scope, receive, send,
+                     record: bool = False) -> List[Dict[str, Any]]:
+        """ Run the request once the gate admits it, or send a 503 if it is shed.
+
+        Returns:
+            The response messages sent, if record is True
+        """
+        if not await gate.acquire(self.controller.queue_timeout):
+            messages = _unavailable(self.controller.retry_after)
+            for message in messages:
+                await send(message)
+            return messages
+        messages: List[Dict[str, Any]] = []
+
+        async def _send(message):
+            if record:
+                messages.append(message)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            gate.release()
+        return messages
+
+
+def _unavailable(retry_after: int) -> List[Dict[str, Any]]:
+    """ Return the ASGI messages of a 503 response asking the client to retry later. """
+    body = b'{"detail":"Service busy, retry later"}'
+    return [{"type": "http.response.start", "status": 503,
+             "headers": [(b"content-type", b"application/json"),
+                         (b"content-length", str(len(body)).encode()),
+                         (b"retry-after", str(retry_after).encode())]},
+            {"type": "http.response.body", "body": body}]
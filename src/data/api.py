@@ -5,14 +5,21 @@
  do not use this as an example for coursework 2!
 
  """
-from typing import Callable
+import argparse
+import asyncio
+import json
+import os
+from typing import Callable, Optional
 
 import uvicorn
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.responses import RedirectResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import RedirectResponse, StreamingResponse
 
-from data.paralympics_data import ParalympicsData
+from data import backup, export
+from data.admission import AdmissionController, AdmissionMiddleware
+from data.paralympics_data import DATABASE_ENV, ParalympicsData
 
 app = FastAPI(title="Mock Paralympics API")
 
@@ -24,6 +31,12 @@ origins = [
     "http://localhost:8501",  # streamlit default
 ]
 
+# Limits the requests running at once per route, queueing or rejecting the rest with a 503, and
+# shares one response between identical GET requests (see data/admission.py). Added before CORS
+# so the CORS middleware wraps it and adds its headers to the 503 responses too.
+admission = AdmissionController()
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -32,7 +45,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-data = ParalympicsData()
+# Set by the --workers launch mode below, each worker process serves reads of the reference
+# tables from its own in-memory snapshot (see data/snapshot.py)
+SNAPSHOT_ENV = "PARALYMPICS_SNAPSHOT"
+
+data = ParalympicsData(snapshot=os.environ.get(SNAPSHOT_ENV) == "1")
 _tables = data.tables
 
 
@@ -49,12 +66,30 @@ async def root(request: Request):
     raise HTTPException(status_code=404, detail="No API docs configured")
 
 
+def _split(value: str):
+    """ Split a comma separated query parameter value into a list, None if empty. """
+    return [v.strip() for v in value.split(",") if v.strip()] if value else None
+
+
 def _make_get_all_route(table_name: str) -> Callable:
-    """ Create a GET /<table> route to get all data from a table """
+    """ Create a GET /<table> route to get all data from a table
+
+    With ?ids=1,2,3 only the rows with those primary keys are returned, in that order, as
+    {"rows": [...], "missing": [...]} where missing lists the ids that were not found.
 
-    async def _route():
+    With ?expand=host.country,team the related rows are nested in each row, following the
+    foreign keys (see data/relations.py), e.g. /games?expand=host.country
+    """
+
+    def _route(ids: Optional[str] = None, expand: Optional[str] = None):
         try:
-            return data.get_table_as_json(table_name)
+            if ids is not None:
+                result = data.get_rows_by_ids(table_name, _split(ids) or [])
+                data.expand_rows(table_name, result["rows"], expand)
+                return result
+            return data.expand_rows(table_name, data.get_table_as_json(table_name), expand)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
         except AttributeError:
             raise HTTPException(status_code=500, detail="ParalympicsData.get_json not implemented")
         except Exception as exc:
@@ -64,16 +99,23 @@ def _make_get_all_route(table_name: str) -> Callable:
 
 
 def _make_get_by_id_route(table_name: str) -> Callable:
-    """ Create a GET /<table>/{item_id} route to get a row by its primary key """
+    """ Create a GET /<table>/{item_id} route to get a row by its primary key
 
-    async def _route(item_id: int):
+    Accepts ?expand= as for GET /<table>, e.g. /games/1?expand=host.country,team,disability
+    """
+
+    def _route(item_id: str, expand: Optional[str] = None):
+        # str rather than int so text primary keys (e.g. team.code) can be used; SQLite applies
+        # the column's affinity, so '12' still matches an INTEGER id of 12
         try:
             row = data.get_row_by_id(table_name, item_id)
             if row is None:
                 raise HTTPException(status_code=404, detail="Item not found")
-            return row
+            return data.expand_rows(table_name, [row], expand)[0]
         except HTTPException:
             raise
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
         except Exception as exc:
             raise HTTPException(status_code=500, detail=str(exc))
 
@@ -97,18 +139,52 @@ def _make_search_route(table_name: str) -> Callable:
     - Only columns that exist in the table are considered; unknown query keys are ignored.
     - Matching is exact equality (\"column\" = ?). Wildcards/partial matches are not supported.
     - If no valid query parameters are supplied, the endpoint returns all rows for the table.
+    - expand= nests related rows as for GET /<table>, e.g. /games/search?year=2012&expand=host
     """
 
-    async def _route(request: Request):
+    def _route(request: Request):
         try:
             params = dict(request.query_params)
-            return data.search_table(table_name, params)
+            expand = params.pop("expand", None)
+            return data.expand_rows(table_name, data.search_table(table_name, params), expand)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
         except Exception as exc:
             raise HTTPException(status_code=500, detail=str(exc))
 
     return _route
 
 
+def _export_response(chunks, name: str, fmt: str) -> StreamingResponse:
+    """ Stream an export as a file download. """
+    disposition = f'attachment; filename="{name}.{fmt}"'
+    return StreamingResponse(chunks, media_type=export.FORMATS[fmt],
+                             headers={"Content-Disposition": disposition})
+
+
+def _make_export_route(table_name: str) -> Callable:
+    """
+    Create a GET '/<table>/export' route that downloads the whole table as a file.
+
+    Usage:
+    - format=csv (default), xlsx or parquet. Parquet needs the pyarrow package.
+    - The rows are read from the database and sent in chunks, so large tables start
+      downloading straight away without being held in memory (see data/export.py).
+
+    Example:
+    - /games/export?format=xlsx
+    """
+
+    async def _route(format: str = "csv"):
+        try:
+            chunks = data.export_table(table_name, format)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        return _export_response(chunks, table_name, format)
+
+    return _route
+
+
 def _make_post_route(table_name: str) -> Callable:
     """
     Create a POST '/<table>' route to insert a new row.
@@ -116,8 +192,9 @@ def _make_post_route(table_name: str) -> Callable:
     Usage:
     - Send HTTP POST to /{table} with a JSON object body (Content-Type: application/json).
     - Only keys that match existing column names are used; unknown keys are ignored.
-    - On success the endpoint returns the inserted row as JSON. If the table has a primary key
-      the returned row is fetched by that key; otherwise the row is returned using SQLite's rowid.
+    - On success the endpoint returns the inserted row as JSON. The row is returned by the
+      INSERT ... RETURNING statement itself, so it includes any default values and the primary
+      key (integer or text).
 
     Responses:
     - 200: inserted row as JSON.
@@ -135,7 +212,8 @@ def _make_post_route(table_name: str) -> Callable:
             payload = await request.json()
             if not isinstance(payload, dict):
                 raise HTTPException(status_code=400, detail="Request body must be a JSON object")
-            new_row = data.add_row(table_name, payload)
+            # Waits for the writer thread to commit, so off the event loop
+            new_row = await run_in_threadpool(data.add_row, table_name, payload)
             return new_row
         except HTTPException:
             raise
@@ -145,17 +223,66 @@ def _make_post_route(table_name: str) -> Callable:
     return _route
 
 
+def _make_batch_get_route(table_name: str) -> Callable:
+    """
+    Create a POST '/<table>/batch_get' route to get several rows by primary key in one request.
+
+    Usage:
+    - Send HTTP POST to /{table}/batch_get with a JSON body {"ids": [1, 2, 3]}.
+    - Add "expand": "host.country" to the body to nest related rows, as for GET /<table>.
+    - The rows are fetched with one query per 500 ids rather than one request per row.
+
+    Responses:
+    - 200: {"rows": [...], "missing": [...]}, rows in the order of ids, missing the ids that
+      were not found.
+    - 400: the body is not a JSON object with a list of ids, or has too many ids.
+
+    Example:
+    curl -X POST 'http://localhost:8000/host/batch_get' \\
+         -H 'Content-Type: application/json' \\
+         -d '{"ids": [3, 1, 2]}'
+    """
+
+    async def _route(request: Request):
+        try:
+            payload = await request.json()
+            if not isinstance(payload, dict) or not isinstance(payload.get("ids"), list):
+                raise HTTPException(status_code=400,
+                                    detail='Request body must be a JSON object with an "ids" list')
+            result = await run_in_threadpool(data.get_rows_by_ids, table_name, payload["ids"])
+            await run_in_threadpool(data.expand_rows, table_name, result["rows"],
+                                    payload.get("expand"))
+            return result
+        except HTTPException:
+            raise
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        except Exception as exc:
+            raise HTTPException(status_code=500, detail=str(exc))
+
+    return _route
+
+
 # create the routes for each table
 for _t in _tables:
     app.get(f"/{_t}", name=f"{_t}_all")(_make_get_all_route(_t))
     app.get(f"/{_t}/search", name=f"{_t}_search")(_make_search_route(_t))
+    app.get(f"/{_t}/export", name=f"{_t}_export")(_make_export_route(_t))
     app.get(f"/{_t}/{{item_id}}", name=f"{_t}_get")(_make_get_by_id_route(_t))
     app.post(f"/{_t}", name=f"{_t}_post")(_make_post_route(_t))
+    app.post(f"/{_t}/batch_get", name=f"{_t}_batch_get")(_make_batch_get_route(_t))
+
+
+# Create a route to report data layer statistics, e.g. the SQL statement cache hit rate, and the
+# admission control queue depths and shed requests
+@app.get("/metrics", summary="Data layer metrics")
+async def get_metrics():
+    return {**data.metrics(), "admission": admission.metrics()}
 
 
 # Create a route to get data for the charts
 @app.get("/all")
-async def get_all():
+def get_all():
     try:
         return data.get_all_data()
     except AttributeError:
@@ -164,5 +291,279 @@ async def get_all():
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@app.get("/all/export", summary="Download the chart dataset as a file")
+async def export_all(format: str = "csv"):
+    """
+    Download the /all chart dataset as CSV (default), xlsx or parquet, streamed in chunks.
+
+    Example:
+    - /all/export?format=parquet
+    """
+    try:
+        chunks = data.export_all(format)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return _export_response(chunks, "all", format)
+
+
+@app.get("/all/search")
+def search_all(request: Request):
+    """
+    Filter the /all chart dataset using the in-memory vectorized engine.
+
+    Usage:
+    - Column names as query parameters are exact matches, e.g. event_type=winter.
+    - <column>_min and <column>_max give an inclusive range on a numeric column.
+    - columns=a,b,c returns only those columns.
+
+    Example:
+    - /all/search?event_type=summer&year_min=1990&columns=year,place_name,participants
+    """
+    try:
+        params = dict(request.query_params)
+        columns = _split(params.pop("columns", ""))
+        return data.get_columnar().filter(params, columns)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@app.get("/all/summary")
+def summarise_all(request: Request):
+    """
+    Group the /all chart dataset and aggregate a column using the in-memory vectorized engine.
+
+    Usage:
+    - group_by: comma separated columns to group by (required).
+    - value: numeric column to aggregate, agg: sum (default), mean, min, max or count.
+    - Any other query parameters filter the rows first, as for /all/search.
+
+    Example:
+    - /all/summary?group_by=year,event_type&value=participants&agg=sum
+    """
+    try:
+        params = dict(request.query_params)
+        keys = _split(params.pop("group_by", ""))
+        value = params.pop("value", None)
+        agg = params.pop("agg", "sum")
+        dataset = data.get_columnar()
+        return dataset.group_by(keys or [], value, agg, mask=dataset.filter_mask(params))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@app.get("/geo/clusters", summary="Clustered host locations for a map viewport")
+def geo_clusters(zoom: int = 0, min_lat: float = -90, min_lon: float = -180,
+                       max_lat: float = 90, max_lon: float = 180):
+    """
+    Return the host locations in a map viewport, clustered on a grid for the zoom level.
+
+    Usage:
+    - zoom: 0 (whole world in one cluster) up to 16, each level halves the grid cell size.
+    - min_lat, min_lon, max_lat, max_lon: the viewport, defaults to the whole world. min_lon can
+      be greater than max_lon for a viewport that crosses the 180th meridian.
+
+    Each cluster has its centroid latitude and longitude, count, up to three place names and,
+    for a single location, the host id. Only clusters inside the viewport are returned, so a map
+    can load the clusters for the area in view as the user pans and zooms.
+
+    Example:
+    - /geo/clusters?zoom=4&min_lat=35&min_lon=-10&max_lat=60&max_lon=30
+    """
+    try:
+        index = data.get_geo_index()
+        clusters = index.clusters(zoom, (min_lat, min_lon, max_lat, max_lon))
+        return {"zoom": zoom, "points": index.size, "clusters": clusters}
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@app.get("/search", summary="Full-text search of games, teams and questions")
+def search_text(q: str, tables: Optional[str] = None, limit: int = 20, offset: int = 0):
+    """
+    Search the games highlights, team names and notes, and question text.
+
+    Usage:
+    - q: words to search for; rows containing every word match, the last word as a prefix.
+    - tables: comma separated tables to search, from games, team and question (default all).
+    - limit and offset page through the results; next_offset is null on the last page.
+
+    Each result has the source table, the row's primary key (as text, fetch the row from
+    /{table}/{key}), the title, a snippet with the matched words in [brackets] and the rank
+    (lower is a better match).
+
+    Example:
+    - /search?q=wheelchair rugby&tables=games&limit=10
+    """
+    try:
+        return data.search_text(q, _split(tables or ""), limit, offset)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@app.get("/leaderboard", summary="Quiz leaderboard")
+def get_leaderboard(limit: int = 10, offset: int = 0):
+    """
+    Return a page of the quiz leaderboard, ranked by each player's best score.
+
+    Attempts are recorded by posting to /score, e.g.
+    {"first_name": "Ada", "last_name": "Lovelace", "score": 4}. Players with the same best
+    score share a rank and are listed with the fewest attempts first.
+
+    Example:
+    - /leaderboard?limit=10&offset=0
+    """
+    try:
+        return data.get_leaderboard(limit, offset)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@app.get("/leaderboard/rank", summary="A player's leaderboard rank")
+def get_player_rank(first_name: str, last_name: str):
+    """
+    Return a player's rank, best score and attempts, and the total number of players.
+
+    Example:
+    - /leaderboard/rank?first_name=Ada&last_name=Lovelace
+    """
+    try:
+        entry = data.get_player_rank(first_name, last_name)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Player not found")
+    return entry
+
+
+@app.post("/admin/snapshot", status_code=202, summary="Start an online backup of the database")
+async def start_snapshot(name: Optional[str] = None):
+    """
+    Copy the database to a snapshot file in the background while the API keeps serving.
+
+    Returns the job, whose progress is at /admin/jobs/{id}. The snapshot is written to the
+    PARALYMPICS_BACKUP_DIR directory, or 'backups' next to the database file.
+
+    Example:
+    - /admin/snapshot?name=before-quiz.db
+    """
+    try:
+        dest = backup.snapshot_path(backup.backup_dir(data.database_file), name)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    job = data.backups.start("snapshot", dest.name,
+                             lambda progress: data.backup(dest.name, progress=progress))
+    return job.to_json()
+
+
+@app.post("/admin/restore", status_code=202, summary="Start restoring the database from a snapshot")
+async def start_restore(name: str):
+    """
+    Replace the contents of the database with a snapshot in the background.
+
+    Writes made while the restore runs wait for it, reads see the old data until it completes.
+    Returns the job, whose progress is at /admin/jobs/{id}.
+
+    Example:
+    - /admin/restore?name=before-quiz.db
+    """
+    try:
+        source = backup.snapshot_path(backup.backup_dir(data.database_file), name)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if not source.exists():
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    job = data.backups.start("restore", name,
+                             lambda progress: data.restore(name, progress=progress))
+    return job.to_json()
+
+
+@app.get("/admin/snapshots", summary="List the database snapshots")
+def get_snapshots():
+    return data.list_backups()
+
+
+@app.get("/admin/jobs/{job_id}", summary="Progress of a snapshot or restore")
+async def get_backup_job(job_id: str):
+    job = data.backups.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_json()
+
+
+# Seconds between checks for writes by other worker processes while an /events stream is idle,
+# and between keep-alive comments sent to the client
+EVENTS_POLL_INTERVAL = 1.0
+EVENTS_KEEPALIVE = 15.0
+
+
+@app.get("/events", summary="Stream of table changes (Server-Sent Events)")
+async def events(request: Request, tables: Optional[str] = None):
+    """
+    Stream a notification for each row added to a table, as Server-Sent Events.
+
+    Each event has the SSE id of the change and JSON data such as
+    {"id": 7, "table": "question", "version": 3, "pks": [5]}. pks is empty when the change was
+    made by another API worker process.
+
+    Usage:
+    - tables=question,response only sends changes to those tables.
+    - A reconnecting client that sends the Last-Event-ID header receives the changes it missed.
+    """
+    wanted = set(_split(tables or "") or [])
+    last_id = request.headers.get("last-event-id")
+    subscriber = data.changes.subscribe(int(last_id) if last_id and last_id.isdigit() else None)
+    _, queue = subscriber
+
+    async def _stream():
+        idle = 0.0
+        try:
+            yield ": connected\n\n"
+            while not await request.is_disconnected():
+                try:
+                    change = await asyncio.wait_for(queue.get(), EVENTS_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    data.poll_changes()
+                    idle += EVENTS_POLL_INTERVAL
+                    if idle >= EVENTS_KEEPALIVE:
+                        idle = 0.0
+                        yield ": keep-alive\n\n"
+                    continue
+                if wanted and change.table not in wanted:
+                    continue
+                yield f"id: {change.id}\nevent: change\ndata: {json.dumps(change.to_json())}\n\n"
+        finally:
+            data.changes.unsubscribe(subscriber)
+
+    return StreamingResponse(_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+
 if __name__ == "__main__":
-    uvicorn.run("src.data.api:app", host="127.0.0.1", port=8000, reload=True)
+    parser = argparse.ArgumentParser(description="Run the Paralympics REST API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--database", help="Path of the database file, defaults to the "
+                                           "PARALYMPICS_DB variable or data/paralympics.db")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes. More than 1 runs the production mode "
+                             "with a reference table snapshot per worker and no auto-reload.")
+    args = parser.parse_args()
+    if args.database:
+        # Set in the environment so the worker or reloader processes use it too
+        os.environ[DATABASE_ENV] = args.database
+    if args.workers > 1:
+        # The workers are new processes that import this module, they read the setting from env
+        os.environ[SNAPSHOT_ENV] = "1"
+        uvicorn.run("data.api:app", host=args.host, port=args.port, workers=args.workers)
+    else:
+        uvicorn.run("src.data.api:app", host=args.host, port=args.port, reload=True)
@@ -0,0 +1,219 @@
+""" Online snapshots of the paralympics database with SQLite's backup API.
+
+Copying the database file while the API is running can capture a half-written transaction,
+and the WAL file alongside it would be missed. Connection.backup copies the database page by
+page instead. The copy is made in steps of BACKUP_PAGES pages with a short sleep between them,
+so a large database is copied without holding a lock for the whole time, and a progress
+callback is told how many pages remain after each step.
+
+The source connection holds a read transaction for the whole backup. In WAL mode this pins a
+consistent view of the database without blocking writers, and the backup doesn't restart when
+another connection commits part way through.
+
+A restore copies a snapshot back into the database through the DatabaseWriter's connection,
+between write batches, so it is never interleaved with an add_row. Readers see the old data
+until the restore completes.
+
+Snapshots are written to the backup directory, PARALYMPICS_BACKUP_DIR or a 'backups' directory
+next to the database file.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+BACKUP_DIR_ENV = "PARALYMPICS_BACKUP_DIR"
+# Pages copied per step: 1024 pages of 4 KB is 4 MB
+BACKUP_PAGES = 1024
+# Seconds to wait between steps, giving other connections a turn
+BACKUP_SLEEP = 0.005
+SNAPSHOT_SUFFIX = ".db"
+_SNAPSHOT_NAME = re.compile(r"^[\w.-]+\.db$")
+
+# Called after each step with the number of pages remaining and the total number of pages
+Progress = Callable[[int, int], None]
+
+
+def backup_dir(database_file: Path) -> Path:
+    """ Return the directory snapshots of the database are written to and restored from. """
+    return Path(os.environ.get(BACKUP_DIR_ENV) or database_file.parent.joinpath("backups"))
+
+
+def snapshot_path(directory: Path, name: Optional[str] = None) -> Path:
+    """ Return the path of a snapshot in the backup directory.
+
+    Args:
+        directory: the backup directory
+        name: file name of the snapshot, defaults to a new UTC timestamped name
+
+    Raises:
+        ValueError: if the name is not a plain file name ending .db
+    """
+    if name is None:
+        name = datetime.now(timezone.utc).strftime("paralympics-%Y%m%dT%H%M%S%fZ") + SNAPSHOT_SUFFIX
+    if not _SNAPSHOT_NAME.match(name):
+        raise ValueError("Snapshot names may only contain letters, digits, '.', '-' and '_' "
+                         f"and must end {SNAPSHOT_SUFFIX}")
+    return directory.joinpath(name)
+
+
+def list_snapshots(directory: Path) -> List[Dict[str, Any]]:
+    """ Return the name, size in bytes and modified time of each snapshot, newest first. """
+    if not directory.exists():
+        return []
+    files = sorted(directory.glob(f"*{SNAPSHOT_SUFFIX}"), key=lambda f: f.stat().st_mtime,
+                   reverse=True)
+    return [{"name": f.name, "bytes": f.stat().st_size, "modified": f.stat().st_mtime}
+            for f in files]
+
+
+def _progress_callback(progress: Optional[Progress]):
+    if progress is None:
+        return None
+    return lambda status, remaining, total: progress(remaining, total)
+
+
+def backup_to_file(database_file: Path, dest: Path, pages: int = BACKUP_PAGES,
+                   sleep: float = BACKUP_SLEEP, progress: Optional[Progress] = None) -> Path:
+    """ Copy the database to a snapshot file while it stays in use.
+
+    The copy is written to dest with a .partial suffix and renamed when complete, so dest is
+    only ever a complete snapshot.
+
+    Args:
+        database_file: the database to copy
+        dest: path of the snapshot file
+        pages: pages copied per step
+        sleep: seconds between steps
+        progress: called after each step with (pages remaining, total pages)
+
+    Returns:
+        dest
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    partial = dest.with_name(dest.name + ".partial")
+    partial.unlink(missing_ok=True)
+    source = sqlite3.connect(database_file, isolation_level=None)
+    try:
+        # Pin a consistent read snapshot for the whole backup
+        source.execute("BEGIN")
+        source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        target = sqlite3.connect(partial, isolation_level=None)
+        try:
+            source.backup(target, pages=pages, progress=_progress_callback(progress),
+                          sleep=sleep)
+            # A standalone single file, rather than one expecting a WAL file alongside it
+            target.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            target.close()
+        source.execute("COMMIT")
+    finally:
+        source.close()
+    partial.replace(dest)
+    return dest
+
+
+def restore_from_file(conn: sqlite3.Connection, source_file: Path, pages: int = BACKUP_PAGES,
+                      sleep: float = BACKUP_SLEEP, progress: Optional[Progress] = None) -> None:
+    """ Replace the contents of the database with a snapshot.
+
+    Run as a DatabaseWriter job with transaction=False, Connection.backup manages the
+    transaction.
+
+    Args:
+        conn: the writer's connection to the database
+        source_file: the snapshot file
+        pages: pages copied per step
+        sleep: seconds between steps
+        progress: called after each step with (pages remaining, total pages)
+    """
+    if not source_file.exists():
+        raise FileNotFoundError(f"Snapshot not found: {source_file.name}")
+    source = sqlite3.connect(source_file)
+    try:
+        source.backup(conn, pages=pages, progress=_progress_callback(progress), sleep=sleep)
+    finally:
+        source.close()
+    # The snapshot is in rollback journal mode, put the database back into WAL mode
+    conn.execute("PRAGMA journal_mode=WAL")
+
+
+@dataclass
+class BackupJob:
+    """ Progress of a snapshot or restore running in the background.
+
+    Attributes:
+        id: job id
+        kind: 'snapshot' or 'restore'
+        name: file name of the snapshot
+        status: 'running', 'done' or 'failed'
+        pages_total: pages in the database being copied, 0 until the first step
+        pages_remaining: pages still to copy
+        started: time the job started (seconds since the epoch)
+        finished: time the job finished, None while running
+        error: error message if the job failed
+    """
+    id: str
+    kind: str
+    name: str
+    status: str = "running"
+    pages_total: int = 0
+    pages_remaining: int = 0
+    started: float = 0.0
+    finished: Optional[float] = None
+    error: Optional[str] = None
+
+    def progress(self, remaining: int, total: int) -> None:
+        self.pages_remaining, self.pages_total = remaining, total
+
+    def to_json(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class BackupJobs:
+    """ Runs snapshot and restore jobs on background threads and keeps their progress. """
+
+    def __init__(self, history_size: int = 50):
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, BackupJob] = {}
+        self._history_size = history_size
+
+    def start(self, kind: str, name: str, run: Callable[[Progress], Any]) -> BackupJob:
+        """ Start a job on a new thread.
+
+        Args:
+            kind: 'snapshot' or 'restore'
+            name: file name of the snapshot
+            run: function that does the work, passed the job's progress callback
+
+        Returns:
+            The BackupJob, updated as the job runs
+        """
+        job = BackupJob(uuid.uuid4().hex, kind, name, started=time.time())
+
+        def _target():
+            try:
+                run(job.progress)
+                job.status = "done"
+            except Exception as e:
+                job.status, job.error = "failed", str(e)
+            job.finished = time.time()
+
+        with self._lock:
+            self._jobs[job.id] = job
+            # Forget the oldest finished jobs
+            finished = [j for j in self._jobs.values() if j.finished is not None]
+            for old in finished[:max(0, len(self._jobs) - self._history_size)]:
+                del self._jobs[old.id]
+        threading.Thread(target=_target, name=f"paralympics-{kind}", daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Optional[BackupJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
@@ -0,0 +1,149 @@
+""" Feed of table change notifications for the API /events stream.
+
+Every row added through ParalympicsData.add_row is published as a TableChange with the table
+name, the table's new version (see the _table_version table in snapshot.py) and the primary
+key of the inserted row. API clients subscribe to the feed through Server-Sent Events and
+clear only the caches affected by a change, instead of polling the API.
+
+Writes made by another process (e.g. another API worker) are found by poll_database, which
+checks PRAGMA data_version and publishes a change, without primary keys, for each table whose
+version has gone up.
+"""
+import asyncio
+import sqlite3
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from data.snapshot import read_table_versions
+
+# Number of recent changes kept so a reconnecting client can catch up (SSE Last-Event-ID)
+HISTORY_SIZE = 1000
+# Changes waiting to be sent to one subscriber; the oldest is dropped if a client falls behind
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class TableChange:
+    """ A change to a table.
+
+    Attributes:
+        id: sequence number of the change in this feed, used as the SSE event id
+        table: name of the table
+        version: version of the table after the change
+        pks: primary keys of the inserted rows, empty if not known
+    """
+    id: int
+    table: str
+    version: int
+    pks: List[Any] = field(default_factory=list)
+
+    def to_json(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+Subscriber = Tuple[asyncio.AbstractEventLoop, asyncio.Queue]
+
+
+class ChangeFeed:
+    """ Thread-safe publisher of TableChange notifications to asyncio subscribers.
+
+    publish can be called from any thread, e.g. the database writer. Subscribers are asyncio
+    queues, each change is handed to the subscriber's event loop with call_soon_threadsafe.
+    """
+
+    def __init__(self, history_size: int = HISTORY_SIZE):
+        self._lock = threading.Lock()
+        self._history: Deque[TableChange] = deque(maxlen=history_size)
+        self._subscribers: Set[Subscriber] = set()
+        self._next_id = 1
+        self._versions: Dict[str, int] = {}
+        self._data_version: Optional[int] = None
+
+    def publish(self, table: str, version: int, pks: Iterable[Any] = ()) -> TableChange:
+        """ Record a change and send it to every subscriber.
+
+        Args:
+            table: name of the table that changed
+            version: the table's version after the change
+            pks: primary keys of the inserted rows
+
+        Returns:
+            The published TableChange
+        """
+        with self._lock:
+            change = TableChange(self._next_id, table, version, list(pks))
+            self._next_id += 1
+            self._history.append(change)
+            self._versions[table] = max(version, self._versions.get(table, 0))
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_deliver, queue, change)
+            except RuntimeError:
+                # The subscriber's event loop has closed
+                self.unsubscribe((loop, queue))
+        return change
+
+    def subscribe(self, last_id: Optional[int] = None) -> Subscriber:
+        """ Subscribe the running event loop to the feed.
+
+        Args:
+            last_id: id of the last change the client received; any later changes still in the
+                history are queued straight away
+
+        Returns:
+            The subscription, pass it to unsubscribe when finished. Changes are read from the
+            asyncio.Queue it holds.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            if last_id is not None:
+                for change in self._history:
+                    if change.id > last_id:
+                        _deliver(queue, change)
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def poll_database(self, conn: sqlite3.Connection) -> List[TableChange]:
+        """ Publish changes made to the database by other processes.
+
+        Args:
+            conn: a connection to the database that is only used by the caller's thread
+
+        Returns:
+            The changes published
+        """
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        with self._lock:
+            first_poll = self._data_version is None
+            if data_version == self._data_version:
+                return []
+            self._data_version = data_version
+            known = dict(self._versions)
+        versions = read_table_versions(conn)
+        if first_poll:
+            # Start from the current versions rather than announcing every past write
+            with self._lock:
+                for table, version in versions.items():
+                    self._versions[table] = max(version, self._versions.get(table, 0))
+            return []
+        return [self.publish(table, version) for table, version in versions.items()
+                if version > known.get(table, 0)]
+
+
+def _deliver(queue: asyncio.Queue, change: TableChange) -> None:
+    """ Add a change to a subscriber queue, dropping the oldest change if it is full. """
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(change)
@@ -0,0 +1,285 @@
+""" Vectorized in-memory query engine for the /all dataset.
+
+The /all route returns the games, host and country tables joined into one denormalized dataset
+which the charts then filter and aggregate. ColumnarDataset holds that join result as NumPy
+column arrays, with the repeated text columns (event_type, country_name, place_name) stored as
+integer category codes. Equality and range filters are evaluated as boolean masks over whole
+columns and group-by aggregates use np.unique and np.bincount, so a query takes microseconds
+instead of a round trip through SQLite.
+
+Usage:
+    dataset = ColumnarDataset(data.get_all_data())
+    dataset.filter({"event_type": "winter", "year_min": "1990"}, columns=["year", "place_name"])
+    dataset.group_by(["year", "event_type"], value="participants", agg="sum")
+
+See benchmarks/bench_columnar.py for a comparison with the SQLite path.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CATEGORICAL_COLUMNS = ("event_type", "country_name", "place_name")
+AGGREGATES = ("sum", "mean", "min", "max", "count")
+
+# Group-by uses a dense bincount over every key combination up to this many combinations,
+# and a sort (np.unique) above it
+DENSE_GROUP_LIMIT = 1 << 20
+
+# Query parameter suffixes for range filters, e.g. year_min=1990&year_max=2000 (inclusive)
+RANGE_SUFFIXES = {"_min": "min", "_max": "max"}
+
+
+def _python_value(value: Any) -> Any:
+    """ Convert a NumPy scalar to the equivalent Python value, other values are unchanged. """
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class ColumnarDataset:
+    """ Column arrays for a list of row dicts with vectorized filtering and aggregation.
+
+    Column kinds:
+        category: int32 codes into an array of labels, -1 for null
+        int: int64, or float64 with NaN if the column has nulls (returned as int or None)
+        float: float64 with NaN for null
+        text: object array of str or None
+
+    Attributes:
+        columns: list of column names in the order of the source rows
+        kinds: dict of column name to kind
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]],
+                 categorical: Sequence[str] = CATEGORICAL_COLUMNS):
+        self.columns: List[str] = list(rows[0].keys()) if rows else []
+        self.kinds: Dict[str, str] = {}
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._labels: Dict[str, np.ndarray] = {}
+        self._group_keys: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._length = len(rows)
+        for col in self.columns:
+            values = [row.get(col) for row in rows]
+            if col in categorical:
+                self._add_category(col, values)
+            else:
+                self._add_column(col, values)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def _add_category(self, col: str, values: List[Any]) -> None:
+        labels = sorted({v for v in values if v is not None})
+        lookup = {label: code for code, label in enumerate(labels)}
+        self._labels[col] = np.array(labels, dtype=object)
+        self._arrays[col] = np.array([lookup.get(v, -1) for v in values], dtype=np.int32)
+        self.kinds[col] = "category"
+
+    def _add_column(self, col: str, values: List[Any]) -> None:
+        present = [v for v in values if v is not None]
+        if present and all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+            kind = "int"
+        elif present and all(isinstance(v, (int, float)) for v in present):
+            kind = "float"
+        else:
+            kind = "text"
+        if kind == "text":
+            self._arrays[col] = np.array(values, dtype=object)
+        elif kind == "int" and len(present) == len(values):
+            self._arrays[col] = np.array(values, dtype=np.int64)
+        else:
+            self._arrays[col] = np.array([np.nan if v is None else v for v in values],
+                                         dtype=np.float64)
+        self.kinds[col] = kind
+
+    def _check_column(self, col: str) -> None:
+        if col not in self._arrays:
+            raise ValueError(f"Unknown column: {col}")
+
+    def _parse(self, col: str, value: Any) -> Any:
+        """ Convert a query parameter value to the type of the column. """
+        if self.kinds[col] in ("int", "float"):
+            return float(value)
+        return value
+
+    def mask(self, equals: Optional[Dict[str, Any]] = None,
+             ranges: Optional[Dict[str, Tuple[Any, Any]]] = None) -> np.ndarray:
+        """ Return a boolean mask of the rows matching all the filters.
+
+        Args:
+            equals: dict of column name to the value to match exactly
+            ranges: dict of column name to (min, max), inclusive, either may be None
+
+        Returns:
+            Boolean array with one element per row
+        """
+        result = np.ones(self._length, dtype=bool)
+        for col, value in (equals or {}).items():
+            self._check_column(col)
+            arr = self._arrays[col]
+            if self.kinds[col] == "category":
+                codes = np.flatnonzero(self._labels[col] == value)
+                result &= arr == (codes[0] if codes.size else -2)
+            else:
+                result &= arr == self._parse(col, value)
+        for col, (low, high) in (ranges or {}).items():
+            self._check_column(col)
+            if self.kinds[col] not in ("int", "float"):
+                raise ValueError(f"Range filters need a numeric column: {col}")
+            arr = self._arrays[col]
+            if low is not None:
+                result &= arr >= self._parse(col, low)
+            if high is not None:
+                result &= arr <= self._parse(col, high)
+        return result
+
+    def _values(self, col: str, selected: np.ndarray) -> List[Any]:
+        """ Return the column values for the selected rows as JSON friendly Python values. """
+        arr = self._arrays[col][selected]
+        kind = self.kinds[col]
+        if kind == "category":
+            labels = np.append(self._labels[col], None)  # code -1 indexes the trailing None
+            return labels[arr].tolist()
+        if arr.dtype == np.float64:
+            nulls = np.isnan(arr)
+            if kind == "int":
+                values = np.where(nulls, 0, arr).astype(np.int64).tolist()
+            else:
+                values = arr.tolist()
+            return [None if null else v for v, null in zip(values, nulls.tolist())]
+        return arr.tolist()
+
+    def select(self, columns: Optional[Sequence[str]] = None,
+               mask: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """ Return the rows selected by the mask, projected to the columns, as dicts.
+
+        Args:
+            columns: columns to return, defaults to all columns
+            mask: boolean row mask, defaults to all rows
+        """
+        columns = list(columns) if columns else self.columns
+        for col in columns:
+            self._check_column(col)
+        selected = np.flatnonzero(mask) if mask is not None else np.arange(self._length)
+        values = [self._values(col, selected) for col in columns]
+        return [dict(zip(columns, row)) for row in zip(*values)]
+
+    def filter_mask(self, filters: Dict[str, str]) -> np.ndarray:
+        """ Return the row mask for search_table style query parameters.
+
+        Keys that are column names are exact matches. Keys ending _min or _max give an inclusive
+        range on a numeric column, e.g. year_min=1990. Unknown keys are ignored.
+
+        Args:
+            filters: dict of query parameter name to value
+        """
+        equals = {}
+        ranges: Dict[str, List[Any]] = {}
+        for key, value in filters.items():
+            if key in self._arrays:
+                equals[key] = value
+                continue
+            for suffix, bound in RANGE_SUFFIXES.items():
+                col = key[:-len(suffix)]
+                if key.endswith(suffix) and col in self._arrays:
+                    ranges.setdefault(col, [None, None])[0 if bound == "min" else 1] = value
+        return self.mask(equals, {col: tuple(bounds) for col, bounds in ranges.items()})
+
+    def filter(self, filters: Dict[str, str],
+               columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """ Return the rows matching search_table style query parameters (see filter_mask).
+
+        Args:
+            filters: dict of query parameter name to value
+            columns: columns to return, defaults to all columns
+        """
+        return self.select(columns, self.filter_mask(filters))
+
+    def _group_codes(self, col: str) -> Tuple[np.ndarray, np.ndarray]:
+        """ Return (code per row from 0 to n-1, the n labels) for a group-by key column. """
+        if col not in self._group_keys:
+            if self.kinds[col] == "category":
+                # Shift the codes up one so null (-1) becomes code 0
+                codes = self._arrays[col].astype(np.int64) + 1
+                labels = np.insert(self._labels[col], 0, None)
+            else:
+                labels, codes = np.unique(self._arrays[col], return_inverse=True)
+            self._group_keys[col] = (codes.reshape(-1), labels)
+        return self._group_keys[col]
+
+    def group_by(self, keys: Sequence[str], value: Optional[str] = None, agg: str = "sum",
+                 mask: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """ Aggregate a numeric column for each distinct combination of the key columns.
+
+        Args:
+            keys: columns to group by, e.g. ["year", "event_type"]
+            value: numeric column to aggregate, not needed for agg='count'
+            agg: one of sum, mean, min, max or count. Null values are ignored.
+            mask: boolean row mask applied before grouping
+
+        Returns:
+            List of dicts with the key columns and the aggregate (named after agg), ordered by
+            the keys
+        """
+        if agg not in AGGREGATES:
+            raise ValueError(f"Invalid aggregate {agg}, must be one of {AGGREGATES}")
+        if not keys:
+            raise ValueError("At least one group by column is required")
+        for col in [*keys, *([value] if value else [])]:
+            self._check_column(col)
+        if agg != "count" and (value is None or self.kinds[value] not in ("int", "float")):
+            raise ValueError(f"{agg} needs a numeric value column")
+        rows = np.flatnonzero(mask) if mask is not None else np.arange(self._length)
+
+        key_codes, key_labels = zip(*(self._group_codes(col) for col in keys))
+        # Combine the key codes into one group id per row (mixed radix), rows with the same id
+        # form a group
+        group_id = np.zeros(len(rows), dtype=np.int64)
+        combinations = 1
+        for codes, labels in zip(key_codes, key_labels):
+            group_id = group_id * len(labels) + codes[rows]
+            combinations *= len(labels)
+        if combinations <= DENSE_GROUP_LIMIT:
+            groups = np.flatnonzero(np.bincount(group_id, minlength=combinations))
+            position = np.zeros(combinations, dtype=np.int64)
+            position[groups] = np.arange(len(groups))
+            inverse = position[group_id]
+        else:
+            groups, inverse = np.unique(group_id, return_inverse=True)
+            inverse = inverse.reshape(-1)
+        n_groups = len(groups)
+
+        if value is None:
+            result = np.bincount(inverse, minlength=n_groups).astype(np.float64)
+        else:
+            values = self._arrays[value][rows].astype(np.float64)
+            present = ~np.isnan(values)
+            counts = np.bincount(inverse[present], minlength=n_groups)
+            if agg == "count":
+                result = counts.astype(np.float64)
+            elif agg in ("sum", "mean"):
+                result = np.bincount(inverse[present], weights=values[present],
+                                     minlength=n_groups)
+                if agg == "mean":
+                    with np.errstate(invalid="ignore", divide="ignore"):
+                        result = result / counts
+            else:
+                fill = np.inf if agg == "min" else -np.inf
+                result = np.full(n_groups, fill)
+                ufunc = np.minimum if agg == "min" else np.maximum
+                ufunc.at(result, inverse[present], values[present])
+                result[counts == 0] = np.nan
+
+        integral = agg == "count" or (agg != "mean" and self.kinds.get(value) == "int")
+        output = []
+        for g, group in enumerate(groups.tolist()):
+            entry = {}
+            for col, labels in reversed(list(zip(keys, key_labels))):
+                group, code = divmod(group, len(labels))
+                entry[col] = _python_value(labels[code])
+            entry = {col: entry[col] for col in keys}
+            aggregate = result[g]
+            if np.isnan(aggregate):
+                entry[agg] = None
+            else:
+                entry[agg] = int(aggregate) if integral else float(aggregate)
+            output.append(entry)
+        return output
@@ -0,0 +1,168 @@
+""" Streaming CSV, Excel and Parquet export of query results.
+
+Returning a whole table as JSON builds every row as a dict, then the whole response, in memory.
+An export instead reads the rows from the SQLite cursor CHUNK_ROWS at a time and encodes each
+chunk as it goes, so memory use doesn't grow with the number of rows:
+
+    csv: each chunk is written as CSV text and sent straight away, so the download starts with
+        the first rows
+    parquet: each chunk is written as a Parquet row group and sent straight away; the footer is
+        sent at the end. Needs the optional pyarrow package.
+    xlsx: openpyxl's write-only mode writes each row to a temporary file rather than keeping the
+        worksheet in memory. An xlsx file is a zip whose directory is written last, so the file
+        is sent once all the rows have been written.
+
+Usage:
+    chunks = export_rows(cursor, "csv")
+    StreamingResponse(chunks, media_type=FORMATS["csv"])
+"""
+import csv
+import io
+import tempfile
+from typing import Any, Iterator, List, Sequence
+
+# Rows read from the cursor and encoded at a time
+CHUNK_ROWS = 5000
+# Bytes read at a time when sending a file written to disk
+FILE_CHUNK_BYTES = 64 * 1024
+# Format: media type
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def check_format(fmt: str) -> None:
+    """ Raise ValueError if the format is not supported, or needs a package that is missing. """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}', must be one of {list(FORMATS)}")
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ValueError("Parquet export needs the pyarrow package: pip install pyarrow") \
+                from e
+
+
+def _chunks(cursor, chunk_rows: int) -> Iterator[List[Sequence[Any]]]:
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            return
+        yield rows
+
+
+def _columns(cursor) -> List[str]:
+    return [d[0] for d in cursor.description]
+
+
+def iter_csv(cursor, chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+    """ Encode the cursor's rows as CSV with a header row, one chunk of rows at a time. """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(_columns(cursor))
+    for rows in _chunks(cursor, chunk_rows):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Only the header, the cursor had no rows
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_xlsx(cursor, chunk_rows: int = CHUNK_ROWS, sheet: str = "data") -> Iterator[bytes]:
+    """ Encode the cursor's rows as an Excel workbook with a header row, using write-only mode. """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(sheet)
+    worksheet.append(_columns(cursor))
+    for rows in _chunks(cursor, chunk_rows):
+        for row in rows:
+            worksheet.append(list(row))
+    with tempfile.TemporaryFile() as file:
+        workbook.save(file)
+        file.seek(0)
+        while chunk := file.read(FILE_CHUNK_BYTES):
+            yield chunk
+
+
+class _ChunkSink(io.RawIOBase):
+    """ Write-only file that collects written bytes until they are taken.
+
+    pyarrow asks the file for its position to record the offsets of the row groups, so tell()
+    counts every byte written rather than the bytes currently held.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._parts.append(bytes(b))
+        self._position += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def iter_parquet(cursor, chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+    """ Encode the cursor's rows as Parquet, one row group per chunk of rows.
+
+    The column types are taken from the first chunk; a column with no values in it is written
+    as text.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns = _columns(cursor)
+    sink = _ChunkSink()
+    writer = None
+    schema = None
+    try:
+        for rows in _chunks(cursor, chunk_rows):
+            arrays = list(zip(*rows))
+            if schema is None:
+                types = [pa.array(values).type for values in arrays]
+                schema = pa.schema([(name, pa.string() if pa.types.is_null(t) else t)
+                                    for name, t in zip(columns, types)])
+                writer = pq.ParquetWriter(sink, schema)
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(arrays, schema)],
+                schema=schema))
+            yield sink.take()
+        if writer is None:
+            # No rows: a file with the columns as text and no row groups
+            schema = pa.schema([(name, pa.string()) for name in columns])
+            writer = pq.ParquetWriter(sink, schema)
+    finally:
+        if writer is not None:
+            writer.close()
+    yield sink.take()
+
+
+def export_rows(cursor, fmt: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+    """ Return an iterator of the cursor's rows encoded in the format.
+
+    Args:
+        cursor: an executed sqlite3 cursor
+        fmt: 'csv', 'xlsx' or 'parquet'
+        chunk_rows: rows fetched and encoded at a time
+
+    Raises:
+        ValueError: if the format is not supported
+    """
+    check_format(fmt)
+    encoders = {"csv": iter_csv, "xlsx": iter_xlsx, "parquet": iter_parquet}
+    return encoders[fmt](cursor, chunk_rows)
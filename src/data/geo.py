@@ -0,0 +1,149 @@
+""" Grid spatial index with zoom-level clustering for the map.
+
+Sending every location to the browser is fine for the ~30 host cities but not for tens of
+thousands of team or venue locations. GeoGridIndex divides the world into a grid for each zoom
+level, with cells half the size at each level (like map tiles), and pre-aggregates the points
+in each cell into a cluster (count, centroid and a few names). A query returns only the
+clusters in the cells that overlap the requested viewport, so the response size depends on the
+viewport and zoom, not on the number of points.
+
+Usage:
+    index = GeoGridIndex(data.get_table_as_json("host"))
+    index.clusters(zoom=3, bounds=(35.0, -10.0, 60.0, 30.0))  # (min_lat, min_lon, max_lat, max_lon)
+"""
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+MAX_ZOOM = 16
+# Names included with each cluster, e.g. for hover text
+SAMPLE_NAMES = 3
+WORLD = (-90.0, -180.0, 90.0, 180.0)
+
+Bounds = Tuple[float, float, float, float]
+
+
+def cell_size(zoom: int) -> float:
+    """ Return the width and height in degrees of a grid cell at the zoom level. """
+    return 360.0 / (2 ** zoom)
+
+
+def cell_key(zoom: int, lat: float, lon: float) -> Tuple[int, int]:
+    """ Return the (column, row) of the grid cell containing the point at the zoom level. """
+    size = cell_size(zoom)
+    return int((lon + 180.0) // size), int((lat + 90.0) // size)
+
+
+@dataclass
+class Cluster:
+    """ The points in one grid cell at one zoom level. """
+    count: int = 0
+    lat_sum: float = 0.0
+    lon_sum: float = 0.0
+    names: List[str] = field(default_factory=list)
+    point_id: Any = None
+
+    def add(self, point_id: Any, name: str, lat: float, lon: float) -> None:
+        self.count += 1
+        self.lat_sum += lat
+        self.lon_sum += lon
+        if len(self.names) < SAMPLE_NAMES:
+            self.names.append(name)
+        self.point_id = point_id if self.count == 1 else None
+
+    def to_json(self, zoom: int, column: int, row: int) -> Dict[str, Any]:
+        result = {"cell": f"{zoom}/{column}/{row}",
+                  "latitude": self.lat_sum / self.count,
+                  "longitude": self.lon_sum / self.count,
+                  "count": self.count,
+                  "names": self.names}
+        if self.point_id is not None:
+            result["id"] = self.point_id
+        return result
+
+
+class GeoGridIndex:
+    """ Points grouped into grid cell clusters for every zoom level from 0 to max_zoom.
+
+    Attributes:
+        max_zoom: the highest zoom level indexed
+        size: number of points indexed (points without a valid location are skipped)
+    """
+
+    def __init__(self, points: List[Dict[str, Any]], id_key: str = "id",
+                 name_key: str = "place_name", lat_key: str = "latitude",
+                 lon_key: str = "longitude", max_zoom: int = MAX_ZOOM):
+        self.max_zoom = max_zoom
+        self.size = 0
+        self._levels: List[Dict[Tuple[int, int], Cluster]] = [{} for _ in range(max_zoom + 1)]
+        for point in points:
+            try:
+                lat, lon = float(point[lat_key]), float(point[lon_key])
+            except (TypeError, ValueError, KeyError):
+                continue
+            if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+                continue
+            self.size += 1
+            for zoom, level in enumerate(self._levels):
+                key = cell_key(zoom, lat, lon)
+                level.setdefault(key, Cluster()).add(point.get(id_key), point.get(name_key),
+                                                     lat, lon)
+
+    def _cells(self, zoom: int, bounds: Bounds) -> Iterator[Tuple[int, int]]:
+        """ Yield the occupied cells at the zoom level that overlap the bounds. """
+        min_lat, min_lon, max_lat, max_lon = bounds
+        level = self._levels[zoom]
+        if min_lon > max_lon:
+            # The viewport crosses the 180th meridian, query the two sides separately
+            yield from self._cells(zoom, (min_lat, min_lon, max_lat, 180.0))
+            yield from self._cells(zoom, (min_lat, -180.0, max_lat, max_lon))
+            return
+        col_min, row_min = cell_key(zoom, min_lat, min_lon)
+        col_max, row_max = cell_key(zoom, max_lat, max_lon)
+        if (col_max - col_min + 1) * (row_max - row_min + 1) <= len(level):
+            # Fewer cells in the viewport than occupied cells: look each one up
+            for col in range(col_min, col_max + 1):
+                for row in range(row_min, row_max + 1):
+                    if (col, row) in level:
+                        yield col, row
+        else:
+            for col, row in level:
+                if col_min <= col <= col_max and row_min <= row <= row_max:
+                    yield col, row
+
+    def clusters(self, zoom: int, bounds: Optional[Bounds] = None) -> List[Dict[str, Any]]:
+        """ Return the clusters visible in the viewport at the zoom level.
+
+        Args:
+            zoom: zoom level from 0 (whole world in one cell) to max_zoom
+            bounds: viewport as (min_lat, min_lon, max_lat, max_lon), defaults to the world.
+                min_lon may be greater than max_lon for a viewport across the 180th meridian.
+
+        Returns:
+            List of clusters with cell key, centroid latitude and longitude, count and up to
+            SAMPLE_NAMES names. A cluster of one point also has the point's id.
+
+        Raises:
+            ValueError: if the zoom level or bounds are invalid
+        """
+        if not 0 <= zoom <= self.max_zoom:
+            raise ValueError(f"zoom must be between 0 and {self.max_zoom}")
+        min_lat, min_lon, max_lat, max_lon = bounds or WORLD
+        if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= 180
+                and -180 <= max_lon <= 180):
+            raise ValueError("Invalid bounds, expected min_lat <= max_lat within -90 to 90 and "
+                             "longitudes within -180 to 180")
+        level = self._levels[zoom]
+        cells = sorted(set(self._cells(zoom, (min_lat, min_lon, max_lat, max_lon))))
+        return [level[cell].to_json(zoom, *cell) for cell in cells]
+
+
+def zoom_for_span(lon_span: float, max_zoom: int = MAX_ZOOM) -> int:
+    """ Return a zoom level that gives roughly 16 grid columns across a viewport.
+
+    Args:
+        lon_span: width of the viewport in degrees of longitude
+    """
+    if lon_span <= 0:
+        return max_zoom
+    return max(0, min(max_zoom, int(math.log2(360.0 * 16 / lon_span))))
@@ -0,0 +1,167 @@
+""" Quiz leaderboard kept up to date incrementally by SQLite triggers.
+
+Each row in the score table is one attempt at the quiz. Ranking players by reading the whole
+score table and sorting it for every viewer gets slower with every attempt, so two summary
+tables are updated by a trigger as each attempt is inserted:
+
+    _player_score: one row per player (first_name, last_name) with their best score and number
+        of attempts, indexed by best score so the top N is read straight from the index
+    _score_histogram: the number of players whose best is each score, so a player's rank is
+        1 + the number of players with a higher best, a sum over the few distinct scores
+
+Both queries take O(log n) in the number of players and don't depend on the number of attempts.
+Players with the same best score share a rank. Tables whose name starts with an underscore are
+not exposed by the API.
+
+The trigger means any insert into score, including the generic POST /score route, keeps the
+leaderboard up to date. Attempts recorded before the tables existed are added when they are
+created (see create_leaderboard).
+"""
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+PLAYER_TABLE = "_player_score"
+HISTOGRAM_TABLE = "_score_histogram"
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+
+# Attempts with a null score are not ranked. A null name is stored as '' so the primary key
+# matches it.
+LEADERBOARD_SQL = f"""
+CREATE TABLE IF NOT EXISTS {PLAYER_TABLE} (
+    first_name TEXT NOT NULL,
+    last_name TEXT NOT NULL,
+    best INTEGER NOT NULL,
+    attempts INTEGER NOT NULL,
+    PRIMARY KEY (first_name, last_name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS {PLAYER_TABLE}_ranking
+    ON {PLAYER_TABLE} (best DESC, attempts, last_name, first_name);
+CREATE TABLE IF NOT EXISTS {HISTOGRAM_TABLE} (
+    score INTEGER PRIMARY KEY,
+    players INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS score_leaderboard AFTER INSERT ON score
+WHEN NEW.score IS NOT NULL
+BEGIN
+    -- Move the player out of their old best score's bucket if this attempt beats it
+    UPDATE {HISTOGRAM_TABLE} SET players = players - 1
+    WHERE score = (SELECT best FROM {PLAYER_TABLE}
+                   WHERE first_name = coalesce(NEW.first_name, '')
+                   AND last_name = coalesce(NEW.last_name, '')
+                   AND best < NEW.score);
+    DELETE FROM {HISTOGRAM_TABLE} WHERE players = 0;
+    -- Add them to the new best score's bucket unless they already have this score or better
+    INSERT INTO {HISTOGRAM_TABLE} (score, players)
+    SELECT NEW.score, 1
+    WHERE NOT EXISTS (SELECT 1 FROM {PLAYER_TABLE}
+                      WHERE first_name = coalesce(NEW.first_name, '')
+                      AND last_name = coalesce(NEW.last_name, '')
+                      AND best >= NEW.score)
+    ON CONFLICT (score) DO UPDATE SET players = players + 1;
+    INSERT INTO {PLAYER_TABLE} (first_name, last_name, best, attempts)
+    VALUES (coalesce(NEW.first_name, ''), coalesce(NEW.last_name, ''), NEW.score, 1)
+    ON CONFLICT (first_name, last_name)
+    DO UPDATE SET best = max(best, excluded.best), attempts = attempts + 1;
+END;
+"""
+
+BACKFILL_PLAYERS_SQL = (
+    f"INSERT INTO {PLAYER_TABLE} (first_name, last_name, best, attempts) "
+    "SELECT coalesce(first_name, ''), coalesce(last_name, ''), max(score), count(*) "
+    "FROM score WHERE score IS NOT NULL "
+    "GROUP BY coalesce(first_name, ''), coalesce(last_name, '')"
+)
+BACKFILL_HISTOGRAM_SQL = (
+    f"INSERT INTO {HISTOGRAM_TABLE} (score, players) "
+    f"SELECT best, count(*) FROM {PLAYER_TABLE} GROUP BY best"
+)
+TOP_SQL = (
+    f"SELECT first_name, last_name, best, attempts FROM {PLAYER_TABLE} "
+    "ORDER BY best DESC, attempts, last_name, first_name LIMIT ? OFFSET ?"
+)
+PLAYER_SQL = (
+    f"SELECT first_name, last_name, best, attempts FROM {PLAYER_TABLE} "
+    "WHERE first_name = ? AND last_name = ?"
+)
+HIGHER_SQL = f"SELECT coalesce(sum(players), 0) FROM {HISTOGRAM_TABLE} WHERE score > ?"
+PLAYERS_SQL = f"SELECT coalesce(sum(players), 0) FROM {HISTOGRAM_TABLE}"
+
+
+def create_leaderboard(conn: sqlite3.Connection) -> None:
+    """ Create the leaderboard tables and trigger if needed, adding any existing attempts.
+
+    Runs as a DatabaseWriter job, inside the writer's transaction.
+
+    Args:
+        conn: the writer's connection
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                          (PLAYER_TABLE,)).fetchone()
+    for statement in _statements(LEADERBOARD_SQL):
+        conn.execute(statement)
+    if not exists:
+        conn.execute(BACKFILL_PLAYERS_SQL)
+        conn.execute(BACKFILL_HISTOGRAM_SQL)
+
+
+def _statements(script: str) -> List[str]:
+    """ Split a script into statements; executescript would commit the writer's transaction. """
+    statements, current = [], ""
+    for line in script.strip().splitlines(keepends=True):
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ""
+    return statements
+
+
+def _entry(row: sqlite3.Row, rank: int) -> Dict[str, Any]:
+    return {"rank": rank, "first_name": row["first_name"], "last_name": row["last_name"],
+            "best": row["best"], "attempts": row["attempts"]}
+
+
+def top(conn: sqlite3.Connection, limit: int = DEFAULT_LIMIT,
+        offset: int = 0) -> List[Dict[str, Any]]:
+    """ Return a page of the leaderboard, highest best score first.
+
+    Args:
+        conn: read connection with sqlite3.Row rows
+        limit: number of players, at most MAX_LIMIT
+        offset: number of players to skip
+
+    Returns:
+        List of dicts with rank, first_name, last_name, best and attempts. Ties are ordered by
+        fewest attempts.
+
+    Raises:
+        ValueError: if limit or offset are out of range
+    """
+    if not 1 <= limit <= MAX_LIMIT or offset < 0:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT} and offset 0 or more")
+    rows = conn.execute(TOP_SQL, (limit, offset)).fetchall()
+    ranks: Dict[int, int] = {}
+    for row in rows:
+        if row["best"] not in ranks:
+            ranks[row["best"]] = conn.execute(HIGHER_SQL, (row["best"],)).fetchone()[0] + 1
+    return [_entry(row, ranks[row["best"]]) for row in rows]
+
+
+def rank(conn: sqlite3.Connection, first_name: str, last_name: str) -> Optional[Dict[str, Any]]:
+    """ Return a player's rank, best score and number of attempts.
+
+    Args:
+        conn: read connection with sqlite3.Row rows
+        first_name: the player's first name
+        last_name: the player's last name
+
+    Returns:
+        Dict with rank, first_name, last_name, best, attempts and the total number of players,
+        or None if the player has no recorded attempts
+    """
+    row = conn.execute(PLAYER_SQL, (first_name, last_name)).fetchone()
+    if row is None:
+        return None
+    entry = _entry(row, conn.execute(HIGHER_SQL, (row["best"],)).fetchone()[0] + 1)
+    entry["players"] = conn.execute(PLAYERS_SQL).fetchone()[0]
+    return entry
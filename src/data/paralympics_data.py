@@ -1,9 +1,57 @@
 import json
+import os
 import sqlite3
+import threading
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-import pandas as pd
+from data import leaderboard, search
+from data.backup import (BACKUP_PAGES, BackupJobs, Progress, backup_dir, backup_to_file,
+                         list_snapshots, restore_from_file, snapshot_path)
+from data.changes import ChangeFeed
+from data.export import CHUNK_ROWS, check_format, export_rows
+from data.relations import ExpandTree, RelationGraph, parse_expand
+from data.snapshot import (VERSION_BUMP_SQL, VERSION_TABLE, VERSION_TABLE_SQL,
+                           ReferenceSnapshot, read_table_versions)
+from data.statements import CACHED_STATEMENTS, StatementRegistry
+from data.writer import DatabaseWriter
+
+# Path of the database file to use instead of paralympics.db in this package, e.g. a copy
+DATABASE_ENV = "PARALYMPICS_DB"
+ALL_DATA_TABLES = ("games", "games_host", "host", "country")
+ALL_DATA_SQL = (
+    "SELECT country.country_name, games.event_type, games.year, games.start_date, "
+    "games.end_date, host.place_name, games.events, games.sports, games.countries, "
+    "games.participants_m, games.participants_f, games.participants, host.latitude, "
+    "host.longitude "
+    "FROM games "
+    "JOIN games_host ON games.id = games_host.games_id "
+    "JOIN host ON games_host.host_id = host.id "
+    "JOIN country ON host.country_id = country.id"
+)
+
+# SQLite limits the number of ? placeholders in one statement (999 before version 3.32), so
+# IN lists are split into chunks of at most this many values
+MAX_IN_VALUES = 500
+# Most ids that can be requested at once from get_rows_by_ids
+MAX_BATCH_IDS = 10_000
+
+
+def default_database_file() -> Path:
+    """ Return the database file from the PARALYMPICS_DB variable, or the packaged one. """
+    return Path(os.environ.get(DATABASE_ENV) or Path(__file__).parent.joinpath("paralympics.db"))
+
+
+def _in_list_size(n: int) -> int:
+    """ Return the number of placeholders to use for an IN list of n values.
+
+    Rounded up to a power of two (the extra placeholders repeat the last value) so only a few
+    distinct statements are generated and reused, rather than one per list length.
+    """
+    size = 1
+    while size < n:
+        size *= 2
+    return min(size, MAX_IN_VALUES)
 
 
 class ParalympicsData:
@@ -12,56 +60,191 @@ class ParalympicsData:
     Each method returns all rows from a table as JSON.
 
     Attributes:
-        database_file: path to the database file
-        tables: list of table names from the database
+        database_file: path to the database file, defaults to default_database_file()
+        tables: list of table names from the database, excluding internal tables whose names
+            start with an underscore
+        snapshot: if True, reads of the reference tables are served from an in-memory
+            ReferenceSnapshot (used when the API runs with several worker processes)
+        changes: ChangeFeed that each row added is published to
+        relations: RelationGraph of the foreign keys between the tables, used by expand_rows
+        backups: BackupJobs running snapshots and restores in the background for the API
 
     Methods:
         get_table_as_json(self, table_name): Gets the data from the specified table and returns it as JSON
         get_all_data(self): Gets data from joined tables and returns it as JSON
         get_row_by_id(self, row_id): Gets the data from the specified row and returns it as JSON
+        get_rows_by_ids(self, table_name, ids): Gets several rows by primary key in one query
+        expand_rows(self, table_name, rows, expand): Adds related rows following foreign keys
         add_row(self, row_id): Adds a new row to the table
         search_table(self, table_name, filters): Gets rows based on search criteria in any column
+        get_columnar(self): Gets the get_all_data result as a vectorized ColumnarDataset
+        get_geo_index(self): Gets a GeoGridIndex of the host locations for map clustering
+        get_leaderboard(self, limit, offset): Gets a page of the quiz leaderboard
+        get_player_rank(self, first_name, last_name): Gets a player's leaderboard rank
+        search_text(self, q, tables, limit, offset): Full-text search of the indexed text columns
+        backup(self, name): Copies the database to a snapshot file while it stays in use
+        restore(self, name): Replaces the database contents with a snapshot
+        list_backups(self): Lists the snapshot files in the backup directory
+        export_table(self, table_name, fmt): Streams a table as CSV, Excel or Parquet
+        export_all(self, fmt): Streams the get_all_data rows as CSV, Excel or Parquet
+        poll_changes(self): Publishes changes made by other processes to the change feed
+        metrics(self): Gets statement cache and writer statistics
+        close(self): Stops the writer thread and closes the database connections
+
+    Writes are not made directly, they are queued to a single DatabaseWriter thread which
+    group commits them. The database runs in WAL mode so reads are not blocked by writes.
 
+    Reads use a persistent connection per thread. Generated SQL comes from a StatementRegistry,
+    so the same text is reused and found in the connection's prepared statement cache.
     """
 
-    def __init__(self):
-        self.database_file = Path(__file__).parent.joinpath("paralympics.db")
+    def __init__(self, snapshot: bool = False, database_file: Optional[Path] = None):
+        self.database_file = Path(database_file) if database_file else default_database_file()
         if not self.database_file.exists():
             raise FileNotFoundError(f"Database file not found: {self.database_file}")
         self.tables = []
+        # PRAGMA table_info rows for each table: (cid, name, type, notnull, dflt_value, pk)
+        self._table_info: Dict[str, List[tuple]] = {}
+        self._writer: Optional[DatabaseWriter] = None
+        self._writer_lock = threading.Lock()
+        self._internal_tables_ready = False
+        self.statements = StatementRegistry()
+        self._local = threading.local()
+        self._read_connections: List[sqlite3.Connection] = []
+        self._read_lock = threading.Lock()
+        self.snapshot = snapshot
+        self._snapshot: Optional[ReferenceSnapshot] = None
+        # Structures built from table data, e.g. the columnar dataset: name -> (versions, value)
+        self._derived: Dict[str, Tuple[Dict[str, int], Any]] = {}
+        self._derived_lock = threading.Lock()
+        self.changes = ChangeFeed()
+        self.backups = BackupJobs()
+        conn = sqlite3.connect(self.database_file)
         try:
-            conn = sqlite3.connect(self.database_file)
             with conn:
                 cur = conn.cursor()
                 cur.execute(
-                    "SELECT name FROM sqlite_master WHERE type='table' AND name != 'sqlite_master'"
+                    "SELECT name FROM sqlite_master WHERE type='table' "
+                    "AND name NOT LIKE 'sqlite_%' AND name NOT LIKE '\\_%' ESCAPE '\\'"
                 )
                 self.tables = [row[0] for row in cur.fetchall()]
+                for table_name in self.tables:
+                    cur.execute(f"PRAGMA table_info('{table_name}')")
+                    self._table_info[table_name] = cur.fetchall()
+                self.relations = RelationGraph.from_connection(conn, self.tables)
         except Exception as e:
             raise RuntimeError(f"Error querying database tables: {e}") from e
-
-    def _get_columns(self, table_name: str) -> List[str]:
-        conn = sqlite3.connect(self.database_file)
-        try:
-            cur = conn.cursor()
-            cur.execute(f"PRAGMA table_info('{table_name}')")
-            cols = [row[1] for row in cur.fetchall()]  # the second column is 'name'
-            return cols
         finally:
+            # 'with conn' only commits, close it so no connection keeps the WAL file open
             conn.close()
+        if self.snapshot:
+            # Load the snapshot now so the first request doesn't pay for it
+            self._get_snapshot()
 
-    def _get_pk_column(self, table_name: str) -> Optional[str]:
-        conn = sqlite3.connect(self.database_file)
-        try:
-            cur = conn.cursor()
-            cur.execute(f"PRAGMA table_info('{table_name}')")
-            for row in cur.fetchall():
-                # row format: (cid, name, type, notnull, dflt_value, pk)
-                if row[5]:  # pk > 0
-                    return row[1]
+    def _get_writer(self) -> DatabaseWriter:
+        """ Return the writer thread, starting it on first use. """
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = DatabaseWriter(self.database_file)
+                self._create_internal_tables(self._writer)
+            return self._writer
+
+    def _create_internal_tables(self, writer: DatabaseWriter) -> None:
+        """ Queue jobs creating the internal tables, ahead of any insert. """
+        # The table of per-table write versions
+        writer.submit(lambda conn: conn.execute(VERSION_TABLE_SQL))
+        if "score" in self.tables:
+            writer.submit(leaderboard.create_leaderboard)
+        writer.submit(lambda conn: search.create_search_index(conn, self.tables))
+
+    def _wait_for_internal_tables(self) -> None:
+        """ Wait until the writer has created the internal tables, before they are read. """
+        if not self._internal_tables_ready:
+            # Jobs run in order, so once this no-op job is committed the tables exist
+            self._get_writer().execute(lambda conn: None)
+            self._internal_tables_ready = True
+
+    def _get_snapshot(self) -> Optional[ReferenceSnapshot]:
+        """ Return the reference table snapshot if enabled, loading it on first use. """
+        if not self.snapshot:
             return None
-        finally:
-            conn.close()
+        with self._read_lock:
+            if self._snapshot is None:
+                self._snapshot = ReferenceSnapshot(self.database_file)
+            return self._snapshot
+
+    def _fetchall(self, sql: str, params: Sequence = (),
+                  tables: Iterable[str] = ()) -> List[sqlite3.Row]:
+        """ Run a query, from the snapshot if it holds all the tables, otherwise the file.
+
+        Args:
+            sql: the SQL query
+            params: values for the query placeholders
+            tables: the tables the query reads
+        """
+        snapshot = self._get_snapshot()
+        if snapshot is not None and snapshot.covers(tables):
+            return snapshot.fetchall(sql, params)
+        return self._read_connection().execute(sql, params).fetchall()
+
+    def _read_connection(self) -> sqlite3.Connection:
+        """ Return this thread's persistent read connection, opening it on first use. """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # check_same_thread=False only so that close() can close it from another thread
+            conn = sqlite3.connect(self.database_file, check_same_thread=False,
+                                   cached_statements=CACHED_STATEMENTS)
+            conn.row_factory = sqlite3.Row  # Returns columns by names instead of tuples
+            self._local.conn = conn
+            with self._read_lock:
+                self._read_connections.append(conn)
+        return conn
+
+    def metrics(self) -> Dict:
+        """ Return statement registry hit rate, open read connections and writer counts. """
+        with self._read_lock:
+            connections = len(self._read_connections)
+        with self._writer_lock:
+            writer = self._writer.stats() if self._writer else None
+        snapshot = None
+        if self._snapshot is not None:
+            snapshot = {"tables": list(self._snapshot.tables),
+                        "versions": self._snapshot.versions,
+                        "loads": self._snapshot.loads}
+        return {"statements": self.statements.stats(),
+                "read_connections": connections,
+                "writer": writer,
+                "snapshot": snapshot}
+
+    def close(self):
+        """ Finish any queued writes, stop the writer thread and close the read connections.
+
+        Connections and the writer are opened again if the data is used after close.
+        """
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+                self._internal_tables_ready = False
+        with self._read_lock:
+            for conn in self._read_connections:
+                conn.close()
+            self._read_connections = []
+            self._local = threading.local()
+            if self._snapshot is not None:
+                self._snapshot.close()
+                self._snapshot = None
+
+    def _get_columns(self, table_name: str) -> List[str]:
+        # The schema is read once in __init__ rather than with a PRAGMA query per request
+        return [row[1] for row in self._table_info.get(table_name, [])]  # 2nd column is 'name'
+
+    def _get_pk_column(self, table_name: str) -> Optional[str]:
+        for row in self._table_info.get(table_name, []):
+            # row format: (cid, name, type, notnull, dflt_value, pk)
+            if row[5]:  # pk > 0
+                return row[1]
+        return None
 
     def get_table_as_json(self, table_name):
         """ Method to return the specified table data from the paralympics .db file.
@@ -76,22 +259,15 @@ class ParalympicsData:
             json_data: json format data
         """
         try:
-            conn = sqlite3.connect(self.database_file)
-            with conn:
-                conn.row_factory = sqlite3.Row  # Returns columns by names instead of tuples
-                cur = conn.cursor()
-                sql = f"SELECT * from {table_name}"
-                cur.execute(sql)
-                rows = cur.fetchall()
-                if not rows:
-                    return []
-                data = [dict(row) for row in rows]
-                return data
+            sql = self.statements.get(table_name, "select_all", (),
+                                      lambda: f"SELECT * from {table_name}")
+            rows = self._fetchall(sql, (), (table_name,))
+            if not rows:
+                return []
+            data = [dict(row) for row in rows]
+            return data
         except Exception as e:
             raise RuntimeError(f"Error querying table {table_name}: {e}") from e
-        finally:
-            if conn:
-                conn.close()
 
     def get_all_data(self):
         """ Method to return all data from the paralympics .db file.
@@ -104,50 +280,364 @@ class ParalympicsData:
         Raises:
             e: Exception
         """
-        sql = (
-            "SELECT country.country_name, games.event_type, games.year, games.start_date, "
-            "games.end_date, host.place_name, games.events, games.sports, games.countries, "
-            "games.participants_m, games.participants_f, games.participants, host.latitude, "
-            "host.longitude "
-            "FROM games "
-            "JOIN games_host ON games.id = games_host.games_id "
-            "JOIN host ON games_host.host_id = host.id "
-            "JOIN country ON host.country_id = country.id"
-        )
         try:
-            conn = sqlite3.connect(self.database_file)
-            with conn:
-                conn.row_factory = sqlite3.Row  # Returns columns by names instead of tuples
-                cur = conn.cursor()
-                cur.execute(sql)
-                rows = cur.fetchall()
-                if not rows:
-                    return []
-                data = [dict(row) for row in rows]
-                return data
+            rows = self._fetchall(ALL_DATA_SQL, (), ALL_DATA_TABLES)
+            if not rows:
+                return []
+            data = [dict(row) for row in rows]
+            return data
         except Exception as e:
             raise RuntimeError(f"Error querying tables: {e}") from e
+
+    def get_columnar(self):
+        """ Return the get_all_data rows as a ColumnarDataset for vectorized queries.
+
+        The dataset is built on first use and rebuilt when any of the joined tables has been
+        written to since. NumPy is only imported when this is first called.
+
+        Returns:
+            data.columnar.ColumnarDataset
+        """
+        from data.columnar import ColumnarDataset
+
+        return self._get_derived("columnar", ALL_DATA_TABLES,
+                                 lambda: ColumnarDataset(self.get_all_data()))
+
+    def get_geo_index(self):
+        """ Return a spatial grid index of the host locations, for clustered map points.
+
+        The index is built on first use and rebuilt when the host table has been written to.
+
+        Returns:
+            data.geo.GeoGridIndex
+        """
+        from data.geo import GeoGridIndex
+
+        return self._get_derived("geo_host", ("host",),
+                                 lambda: GeoGridIndex(self.get_table_as_json("host")))
+
+    def get_leaderboard(self, limit: int = leaderboard.DEFAULT_LIMIT, offset: int = 0):
+        """ Return a page of the quiz leaderboard, highest best score first.
+
+        The leaderboard is kept up to date by a trigger on the score table, see leaderboard.py.
+
+        Args:
+            limit: number of players
+            offset: number of players to skip
+
+        Returns:
+            List of dicts with rank, first_name, last_name, best and attempts
+
+        Raises:
+            ValueError: if limit or offset are out of range
+        """
+        self._wait_for_internal_tables()
+        return leaderboard.top(self._read_connection(), limit, offset)
+
+    def get_player_rank(self, first_name: str, last_name: str):
+        """ Return a player's leaderboard rank, or None if they have no recorded attempts.
+
+        Returns:
+            Dict with rank, first_name, last_name, best, attempts and the number of players
+        """
+        self._wait_for_internal_tables()
+        return leaderboard.rank(self._read_connection(), first_name, last_name)
+
+    def search_text(self, q: str, tables: Optional[Sequence[str]] = None,
+                    limit: int = search.DEFAULT_LIMIT, offset: int = 0):
+        """ Full-text search of the games, team and question text, best match first.
+
+        Uses the FTS5 index kept in sync by triggers, see search.py.
+
+        Args:
+            q: search text, rows containing every word match (the last word as a prefix)
+            tables: only search these tables, defaults to all indexed tables
+            limit: number of results
+            offset: number of results to skip
+
+        Returns:
+            Dict with the query, the results and the next_offset
+
+        Raises:
+            ValueError: if the search text, tables, limit or offset are not valid
+        """
+        self._wait_for_internal_tables()
+        return search.search(self._read_connection(), q, tables, limit, offset)
+
+    def backup(self, name: Optional[str] = None, pages: int = BACKUP_PAGES,
+               progress: Optional[Progress] = None) -> Path:
+        """ Copy the database to a snapshot file while reads and writes continue.
+
+        Uses SQLite's online backup in steps of pages, see backup.py.
+
+        Args:
+            name: file name of the snapshot in the backup directory, defaults to a timestamp
+            pages: pages copied per step
+            progress: called after each step with (pages remaining, total pages)
+
+        Returns:
+            Path of the snapshot file
+
+        Raises:
+            ValueError: if the name is not a valid snapshot file name
+        """
+        dest = snapshot_path(backup_dir(self.database_file), name)
+        return backup_to_file(self.database_file, dest, pages, progress=progress)
+
+    def restore(self, name: str, pages: int = BACKUP_PAGES,
+                progress: Optional[Progress] = None) -> None:
+        """ Replace the contents of the database with a snapshot from the backup directory.
+
+        The restore runs on the writer thread, after the writes already queued. Afterwards
+        every table's version is increased, so the reference snapshot, the derived structures
+        and the clients listening to the change feed all reload.
+
+        The snapshot must have the same tables as the database.
+
+        Args:
+            name: file name of the snapshot in the backup directory
+            pages: pages copied per step
+            progress: called after each step with (pages remaining, total pages)
+
+        Raises:
+            ValueError: if the name is not a valid snapshot file name
+            FileNotFoundError: if there is no snapshot with the name
+        """
+        source = snapshot_path(backup_dir(self.database_file), name)
+        if not source.exists():
+            raise FileNotFoundError(f"Snapshot not found: {name}")
+
+        def _restore(conn: sqlite3.Connection) -> Dict[str, int]:
+            before = read_table_versions(conn, self.tables)
+            restore_from_file(conn, source, pages, progress=progress)
+            after = read_table_versions(conn, self.tables)
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(VERSION_TABLE_SQL)
+            versions = {}
+            for table in self.tables:
+                # Higher than both the old and the restored version, so nothing mistakes the
+                # restored data for data it has already seen
+                version = max(before[table], after[table]) + 1
+                conn.execute(f"INSERT OR REPLACE INTO {VERSION_TABLE} (table_name, version) "
+                             "VALUES (?, ?)", (table, version))
+                versions[table] = version
+            conn.execute("COMMIT")
+            return versions
+
+        writer = self._get_writer()
+        versions = writer.execute(_restore, transaction=False)
+        # The snapshot may predate the internal tables
+        self._create_internal_tables(writer)
+        self._internal_tables_ready = False
+        snapshot = self._get_snapshot()
+        if snapshot is not None:
+            snapshot.mark_stale()
+        for table, version in versions.items():
+            self.changes.publish(table, version)
+
+    def list_backups(self) -> List[Dict[str, Any]]:
+        """ Return the name, size and modified time of each snapshot, newest first. """
+        return list_snapshots(backup_dir(self.database_file))
+
+    def export_table(self, table_name: str, fmt: str,
+                     chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+        """ Return an iterator of a table's rows encoded as CSV, Excel or Parquet, see export.py.
+
+        Args:
+            table_name: name of the database table
+            fmt: 'csv', 'xlsx' or 'parquet'
+            chunk_rows: rows read from the database and encoded at a time
+
+        Raises:
+            ValueError: if the table doesn't exist or the format is not supported
+        """
+        if table_name not in self.tables:
+            raise ValueError(f"Table {table_name} does not exist")
+        check_format(fmt)
+        sql = self.statements.get(table_name, "select_all", (),
+                                  lambda: f"SELECT * from {table_name}")
+        return self._export(sql, fmt, chunk_rows)
+
+    def export_all(self, fmt: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+        """ Return an iterator of the get_all_data rows encoded as CSV, Excel or Parquet.
+
+        Raises:
+            ValueError: if the format is not supported
+        """
+        check_format(fmt)
+        return self._export(ALL_DATA_SQL, fmt, chunk_rows)
+
+    def _export(self, sql: str, fmt: str, chunk_rows: int) -> Iterator[bytes]:
+        # A connection of its own: the rows are read while the response is sent, and the
+        # chunks may be requested from different threads
+        conn = sqlite3.connect(self.database_file, check_same_thread=False)
+        try:
+            yield from export_rows(conn.execute(sql), fmt, chunk_rows)
         finally:
-            if conn:
-                conn.close()
+            conn.close()
+
+    def _get_derived(self, name: str, tables: Sequence[str], build: Callable[[], Any]) -> Any:
+        """ Return a structure built from table data, building it again if the tables changed.
+
+        Args:
+            name: name the structure is cached under
+            tables: the tables the structure is built from
+            build: function that builds the structure
+        """
+        versions = read_table_versions(self._read_connection(), tables)
+        with self._derived_lock:
+            cached = self._derived.get(name)
+            if cached is None or cached[0] != versions:
+                cached = (versions, build())
+                self._derived[name] = cached
+            return cached[1]
+
+    def poll_changes(self):
+        """ Publish changes to the database made by other processes to the change feed.
+
+        Returns:
+            List of the TableChange published
+        """
+        return self.changes.poll_database(self._read_connection())
 
     def get_row_by_id(self, table_name: str, item_id):
         if table_name not in self.tables:
             raise RuntimeError(f"Table {table_name} does not exist")
         pk = self._get_pk_column(table_name)
-        conn = sqlite3.connect(self.database_file)
-        try:
-            conn.row_factory = sqlite3.Row
-            cur = conn.cursor()
+
+        def _build() -> str:
             if pk:
-                sql = f"SELECT * FROM '{table_name}' WHERE \"{pk}\" = ?"
+                return f"SELECT * FROM '{table_name}' WHERE \"{pk}\" = ?"
+            return f"SELECT * FROM '{table_name}' WHERE rowid = ?"
+
+        sql = self.statements.get(table_name, "select_by_pk", (pk,), _build)
+        rows = self._fetchall(sql, (item_id,), (table_name,))
+        return dict(rows[0]) if rows else None
+
+    def _fetch_in(self, table_name: str, operation: str, column: str,
+                  build_select: Callable[[], str], values: Sequence,
+                  tables: Iterable[str]) -> List[sqlite3.Row]:
+        """ Run a query ending "WHERE <column> IN (...)" for any number of values.
+
+        The values are queried in chunks of up to MAX_IN_VALUES.
+
+        Args:
+            table_name: table the statement is registered under
+            operation: name the statement is registered under, e.g. 'select_by_pks'
+            column: the column compared with the values
+            build_select: returns the SQL up to, but not including, 'IN (...)'
+            values: the values to match, duplicates are queried once
+            tables: the tables the query reads
+        """
+        values = list(dict.fromkeys(values))
+        rows = []
+        for start in range(0, len(values), MAX_IN_VALUES):
+            chunk = values[start:start + MAX_IN_VALUES]
+            size = _in_list_size(len(chunk))
+            sql = self.statements.get(
+                table_name, operation, (column, size),
+                lambda: f"{build_select()} IN ({', '.join('?' for _ in range(size))})")
+            rows.extend(self._fetchall(sql, chunk + [chunk[-1]] * (size - len(chunk)), tables))
+        return rows
+
+    def get_rows_by_ids(self, table_name: str, ids: Sequence) -> Dict[str, List]:
+        """ Return the rows for several primary keys, in the order the keys were given.
+
+        Args:
+            table_name: name of the database table
+            ids: primary key values, e.g. [1, 2, 3] or ['1', '2', '3']
+
+        Returns:
+            Dict with 'rows', the rows found in the order of ids (once per distinct id), and
+            'missing', the ids with no row
+
+        Raises:
+            ValueError: if more than MAX_BATCH_IDS ids are given
+        """
+        if table_name not in self.tables:
+            raise RuntimeError(f"Table {table_name} does not exist")
+        if len(ids) > MAX_BATCH_IDS:
+            raise ValueError(f"At most {MAX_BATCH_IDS} ids can be requested at once")
+        pk = self._get_pk_column(table_name)
+        key = pk or "rowid"
+
+        def _build() -> str:
+            columns = "*" if pk else "rowid, *"
+            return f"SELECT {columns} FROM '{table_name}' WHERE \"{key}\""
+
+        rows = self._fetch_in(table_name, "select_by_pks", key, _build, ids, (table_name,))
+        # Compare as text so '12' from a query string finds the row with INTEGER id 12
+        found = {str(row[key]): dict(row) for row in rows}
+        result = {"rows": [], "missing": []}
+        for item_id in dict.fromkeys(ids):
+            row = found.get(str(item_id))
+            if row is None:
+                result["missing"].append(item_id)
             else:
-                sql = f"SELECT * FROM '{table_name}' WHERE rowid = ?"
-            cur.execute(sql, (item_id,))
-            row = cur.fetchone()
-            return dict(row) if row else None
-        finally:
-            conn.close()
+                result["rows"].append(row)
+        return result
+
+    def expand_rows(self, table_name: str, rows: List[Dict], expand: Optional[str]) -> List[Dict]:
+        """ Add the related rows named in expand to each row, following the foreign keys.
+
+        Each relation is fetched for all the rows with one query (per MAX_IN_VALUES keys), so
+        the number of queries depends on the number of relations, not the number of rows.
+
+        Args:
+            table_name: the table the rows are from
+            rows: row dicts, changed in place
+            expand: comma separated relation paths, e.g. "host.country,team"; see relations.py
+
+        Returns:
+            The rows, each with a key per expanded relation holding the related row (or None)
+            or a list of related rows
+
+        Raises:
+            ValueError: if a relation name is not known
+        """
+        if table_name not in self.tables:
+            raise RuntimeError(f"Table {table_name} does not exist")
+        tree = parse_expand(expand)
+        if tree and rows:
+            self._expand(table_name, rows, tree)
+        return rows
+
+    def _expand(self, table_name: str, rows: List[Dict], tree: ExpandTree) -> None:
+        for name, subtree in tree.items():
+            relation = self.relations.get(table_name, name)
+            keys = [row[relation.local_column] for row in rows
+                    if row.get(relation.local_column) is not None]
+            if relation.link:
+                tables = (relation.link, relation.table)
+
+                def _build(rel=relation) -> str:
+                    return (f"SELECT \"{rel.link}\".\"{rel.remote_column}\" AS _expand_key, "
+                            f"\"{rel.table}\".* FROM \"{rel.link}\" JOIN \"{rel.table}\" "
+                            f"ON \"{rel.table}\".\"{rel.target_column}\" = "
+                            f"\"{rel.link}\".\"{rel.link_column}\" "
+                            f"WHERE \"{rel.link}\".\"{rel.remote_column}\"")
+            else:
+                tables = (relation.table,)
+
+                def _build(rel=relation) -> str:
+                    return (f"SELECT \"{rel.remote_column}\" AS _expand_key, * "
+                            f"FROM \"{rel.table}\" WHERE \"{rel.remote_column}\"")
+
+            fetched = self._fetch_in(table_name, f"expand_{name}", relation.remote_column,
+                                     _build, keys, tables)
+            related: Dict[str, List[Dict]] = {}
+            related_rows = []
+            for row in fetched:
+                related_row = dict(row)
+                # Keys are compared as text, e.g. team.country_id is text but country.id is not
+                key = str(related_row.pop("_expand_key"))
+                related.setdefault(key, []).append(related_row)
+                related_rows.append(related_row)
+            if subtree and related_rows:
+                self._expand(relation.table, related_rows, subtree)
+            for row in rows:
+                matches = related.get(str(row.get(relation.local_column)), [])
+                row[name] = matches if relation.many else (matches[0] if matches else None)
 
     def search_table(self, table_name: str, filters: Dict[str, str]):
         if table_name not in self.tables:
@@ -156,21 +646,17 @@ class ParalympicsData:
         allowed_filters = {k: v for k, v in filters.items() if k in cols}
         if not allowed_filters:
             return self.get_table_as_json(table_name)
-        where_clauses = []
-        values = []
-        for col, val in allowed_filters.items():
-            where_clauses.append(f"\"{col}\" = ?")
-            values.append(val)
-        sql = f"SELECT * FROM '{table_name}' WHERE " + " AND ".join(where_clauses)
-        conn = sqlite3.connect(self.database_file)
-        try:
-            conn.row_factory = sqlite3.Row
-            cur = conn.cursor()
-            cur.execute(sql, tuple(values))
-            rows = cur.fetchall()
-            return [dict(r) for r in rows]
-        finally:
-            conn.close()
+        # Sort the columns so the same set of filters always generates the same SQL text
+        filter_cols = tuple(sorted(allowed_filters))
+        values = tuple(allowed_filters[col] for col in filter_cols)
+
+        def _build() -> str:
+            where_clauses = [f"\"{col}\" = ?" for col in filter_cols]
+            return f"SELECT * FROM '{table_name}' WHERE " + " AND ".join(where_clauses)
+
+        sql = self.statements.get(table_name, "search", filter_cols, _build)
+        rows = self._fetchall(sql, values, (table_name,))
+        return [dict(r) for r in rows]
 
     def add_row(self, table_name: str, row: Dict):
         if table_name not in self.tables:
@@ -180,24 +666,34 @@ class ParalympicsData:
         data = {k: v for k, v in row.items() if k in cols}
         if not data:
             raise RuntimeError("No valid columns provided for insert")
-        columns = ", ".join(f"\"{c}\"" for c in data.keys())
-        placeholders = ", ".join("?" for _ in data)
-        sql = f"INSERT INTO '{table_name}' ({columns}) VALUES ({placeholders})"
-        conn = sqlite3.connect(self.database_file)
-        try:
-            cur = conn.cursor()
-            cur.execute(sql, tuple(data.values()))
-            conn.commit()
-            last_id = cur.lastrowid
-            # return the inserted row (by primary key if available)
-            pk = self._get_pk_column(table_name)
-            if pk:
-                return self.get_row_by_id(table_name, last_id)
-            else:
-                # no pk, return the last inserted row via rowid
-                return self.get_row_by_id(table_name, last_id)
-        finally:
-            conn.close()
+        insert_cols = tuple(sorted(data))
+        values = tuple(data[col] for col in insert_cols)
+
+        def _build() -> str:
+            columns = ", ".join(f"\"{c}\"" for c in insert_cols)
+            placeholders = ", ".join("?" for _ in insert_cols)
+            # RETURNING gives back the row as stored (including defaults and the primary key,
+            # whether that is an INTEGER id or a text key such as team.code) from the insert
+            return f"INSERT INTO '{table_name}' ({columns}) VALUES ({placeholders}) RETURNING *"
+
+        sql = self.statements.get(table_name, "insert", insert_cols, _build)
+
+        def _insert(conn: sqlite3.Connection):
+            cur = conn.execute(sql, values)
+            names = [d[0] for d in cur.description]
+            new_row = dict(zip(names, cur.fetchone()))
+            # Record the write so snapshots in other worker processes know to reload
+            version = conn.execute(VERSION_BUMP_SQL, (table_name,)).fetchone()[0]
+            return new_row, version
+
+        # The insert runs on the writer thread; wait until its batch has been committed
+        new_row, version = self._get_writer().execute(_insert)
+        snapshot = self._get_snapshot()
+        if snapshot is not None and snapshot.covers((table_name,)):
+            snapshot.mark_stale()
+        pk = self._get_pk_column(table_name)
+        self.changes.publish(table_name, version, [new_row[pk]] if pk else [])
+        return new_row
 
 
 # Example of a function that gets data from an excel file and returns in JSON format
@@ -214,6 +710,10 @@ def get_event_data():
         FileNotFoundError: if no event file was found
 
         """
+    # pandas (and openpyxl, used by read_excel) are imported here rather than at module level
+    # so that importing the data package, e.g. when the API starts, doesn't pay their cost
+    import pandas as pd
+
     data_file = Path(__file__).parent.joinpath("paralympics.xlsx")
     try:
         if not data_file.exists():
@@ -235,7 +735,7 @@ def get_event_data():
 
 def add_quiz_data():
     """ Method to add question data to the paralympics database."""
-    database_file = Path(__file__).parent.joinpath("paralympics.db")
+    database_file = default_database_file()
     with sqlite3.connect(database_file) as conn:
         cur = conn.cursor()
         for sql_file in ("question.sql", "response.sql"):
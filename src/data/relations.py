@@ -0,0 +1,134 @@
+""" Relations between the tables, from the foreign keys in the schema, for ?expand=.
+
+A client that wants the games with their hosts and each host's country would otherwise make one
+request per row per hop (/games, /games_host/search, /host/{id}, /country/{id}, ...). The
+generated routes accept expand=host.country instead, and ParalympicsData.expand_rows fetches
+each relation with one batched query per hop and nests the results in the rows.
+
+Three kinds of relation are found for each foreign key, e.g. host.country_id -> country.id:
+    forward: host -> country, named after the column without _id; one row or null
+    reverse: country -> host, named after the referencing table; a list of rows
+    link: for a table that only links two others, e.g. games_host (id, games_id, host_id),
+        games -> host and host -> games, named after the table at the other end; a list
+
+Usage:
+    graph = RelationGraph.from_connection(conn, tables)
+    graph.get("games", "host")
+    parse_expand("host.country,team")  # {"host": {"country": {}}, "team": {}}
+"""
+import sqlite3
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+# Most levels of nesting allowed in one expand parameter
+MAX_EXPAND_DEPTH = 4
+
+ExpandTree = Dict[str, "ExpandTree"]
+
+
+@dataclass(frozen=True)
+class Relation:
+    """ How to find the related rows for a row of a table.
+
+    The related rows are those where remote_column (in the link table, if there is one) equals
+    the row's local_column.
+
+    Attributes:
+        name: the name used in expand and as the key of the nested rows
+        table: the related table
+        many: True if there can be several related rows, returned as a list
+        local_column: column of the row being expanded
+        remote_column: column of the related table, or of the link table, matched to it
+        link: the link table for a many-to-many relation, otherwise None
+        link_column: column of the link table that references the related table
+        target_column: column of the related table referenced by link_column
+    """
+    name: str
+    table: str
+    many: bool
+    local_column: str
+    remote_column: str
+    link: Optional[str] = None
+    link_column: Optional[str] = None
+    target_column: Optional[str] = None
+
+
+class RelationGraph:
+    """ The relations of each table, by name. """
+
+    def __init__(self, relations: Iterable[tuple]):
+        self._relations: Dict[str, Dict[str, Relation]] = {}
+        for table, relation in relations:
+            # The first relation found with a name is kept if two would have the same name
+            self._relations.setdefault(table, {}).setdefault(relation.name, relation)
+
+    @classmethod
+    def from_connection(cls, conn: sqlite3.Connection, tables: Iterable[str]) -> "RelationGraph":
+        """ Build the graph from the foreign keys of the tables.
+
+        Args:
+            conn: connection to the database
+            tables: the tables to include
+        """
+        tables = list(tables)
+        relations = []
+        for table in tables:
+            # (id, seq, table, from, to, on_update, on_delete, match)
+            foreign_keys = [fk for fk in conn.execute(f"PRAGMA foreign_key_list('{table}')")
+                            if fk[2] in tables]
+            for fk in foreign_keys:
+                _, _, ref_table, column, ref_column = fk[:5]
+                ref_column = ref_column or "rowid"
+                name = column[:-3] if column.endswith("_id") else ref_table
+                relations.append((table, Relation(name, ref_table, False, column, ref_column)))
+                relations.append((ref_table, Relation(table, table, True, ref_column, column)))
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info('{table}')")
+                       if not row[5]]
+            fk_columns = [fk[3] for fk in foreign_keys]
+            if len(foreign_keys) == 2 and sorted(columns) == sorted(fk_columns):
+                # A link table: relate each end to the other through it
+                for near, far in (foreign_keys, reversed(foreign_keys)):
+                    relations.append((near[2], Relation(
+                        far[2], far[2], True, near[4] or "rowid", near[3],
+                        link=table, link_column=far[3], target_column=far[4] or "rowid")))
+        return cls(relations)
+
+    def get(self, table: str, name: str) -> Relation:
+        """ Return the named relation of a table.
+
+        Raises:
+            ValueError: if the table has no relation with that name
+        """
+        relation = self._relations.get(table, {}).get(name)
+        if relation is None:
+            raise ValueError(f"Unknown relation '{name}' for {table}, must be one of "
+                             f"{sorted(self.names(table))}")
+        return relation
+
+    def names(self, table: str) -> List[str]:
+        """ Return the names of the relations of a table. """
+        return list(self._relations.get(table, {}))
+
+
+def parse_expand(value: Optional[str]) -> ExpandTree:
+    """ Parse an expand parameter into a tree of relation names.
+
+    Args:
+        value: comma separated relation paths, each a dot separated list of names, e.g.
+            "host.country,team"
+
+    Returns:
+        Nested dict of relation names, e.g. {"host": {"country": {}}, "team": {}}
+
+    Raises:
+        ValueError: if a path is nested more than MAX_EXPAND_DEPTH levels
+    """
+    tree: ExpandTree = {}
+    for path in (value or "").split(","):
+        names = [name.strip() for name in path.split(".") if name.strip()]
+        if len(names) > MAX_EXPAND_DEPTH:
+            raise ValueError(f"expand can be at most {MAX_EXPAND_DEPTH} levels deep")
+        node = tree
+        for name in names:
+            node = node.setdefault(name, {})
+    return tree
@@ -0,0 +1,168 @@
+""" Full-text search over the text columns of the games, team and question tables.
+
+search_table only matches whole values exactly, so finding the games whose highlights mention
+"wheelchair" meant downloading the table and searching it on the client. The text is instead
+indexed in an FTS5 virtual table, _search, which finds matching rows from its inverted index
+without scanning the tables, ranks them with bm25 and returns a highlighted snippet.
+
+Indexed text (see SOURCES):
+    games: title '<event_type> <year>', body highlights
+    team: title name, body notes
+    question: title question_text
+
+Each indexed row has an entry in _search_key (source table and primary key), whose rowid is the
+rowid of the row's text in _search. Triggers on the source tables keep the index in sync with
+inserts, updates and deletes, whichever connection makes them. Rows that existed before the
+index are added when it is created (see create_search_index). Tables whose name starts with an
+underscore are not exposed by the API.
+"""
+import re
+import sqlite3
+from typing import Any, Dict, List, Optional, Sequence
+
+SEARCH_TABLE = "_search"
+KEY_TABLE = "_search_key"
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# Tokens of context either side of the matched terms in a snippet
+SNIPPET_TOKENS = 12
+# bm25 weights of the title and body columns, a match in the title ranks higher
+TITLE_WEIGHT = 2.0
+BODY_WEIGHT = 1.0
+
+# Source table: (primary key column, SQL expression for the title, for the body), using NEW.
+SOURCES = {
+    "games": ("id", "NEW.event_type || ' ' || NEW.year", "NEW.highlights"),
+    "team": ("code", "NEW.name", "NEW.notes"),
+    "question": ("id", "NEW.question_text", "NULL"),
+}
+
+INDEX_SQL = (
+    f"CREATE TABLE IF NOT EXISTS {KEY_TABLE} ("
+    "rowid INTEGER PRIMARY KEY, source TEXT NOT NULL, source_key TEXT NOT NULL, "
+    "UNIQUE (source, source_key))",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+    "USING fts5(title, body, tokenize = 'porter unicode61')",
+)
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _key_rowid(source: str, key: str) -> str:
+    return (f"(SELECT rowid FROM {KEY_TABLE} WHERE source = '{source}' "
+            f"AND source_key = CAST({key} AS TEXT))")
+
+
+def _trigger_sql(source: str) -> List[str]:
+    """ Return the CREATE TRIGGER statements that keep the index in sync with a table. """
+    pk, title, body = SOURCES[source]
+    new_key, old_key = f'NEW."{pk}"', f'OLD."{pk}"'
+    insert = (f"INSERT INTO {KEY_TABLE} (source, source_key) "
+              f"VALUES ('{source}', CAST({new_key} AS TEXT)); "
+              f"INSERT INTO {SEARCH_TABLE} (rowid, title, body) "
+              f"VALUES ({_key_rowid(source, new_key)}, {title}, {body});")
+    delete = (f"DELETE FROM {SEARCH_TABLE} WHERE rowid = {_key_rowid(source, old_key)}; "
+              f"DELETE FROM {KEY_TABLE} WHERE source = '{source}' "
+              f"AND source_key = CAST({old_key} AS TEXT);")
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {source}_search_insert AFTER INSERT ON \"{source}\" "
+        f"BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {source}_search_update AFTER UPDATE ON \"{source}\" "
+        f"BEGIN {delete} {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {source}_search_delete AFTER DELETE ON \"{source}\" "
+        f"BEGIN {delete} END",
+    ]
+
+
+def _backfill_sql(source: str) -> List[str]:
+    """ Return the statements that index the rows already in a table. """
+    pk, title, body = SOURCES[source]
+    title, body = title.replace("NEW.", "s."), body.replace("NEW.", "s.")
+    return [
+        f"INSERT INTO {KEY_TABLE} (source, source_key) "
+        f"SELECT '{source}', CAST(\"{pk}\" AS TEXT) FROM \"{source}\"",
+        f"INSERT INTO {SEARCH_TABLE} (rowid, title, body) "
+        f"SELECT k.rowid, {title}, {body} FROM \"{source}\" AS s "
+        f"JOIN {KEY_TABLE} AS k ON k.source = '{source}' "
+        f"AND k.source_key = CAST(s.\"{pk}\" AS TEXT)",
+    ]
+
+
+def create_search_index(conn: sqlite3.Connection, tables: Sequence[str]) -> None:
+    """ Create the search index and triggers if needed, indexing the rows already present.
+
+    Runs as a DatabaseWriter job, inside the writer's transaction.
+
+    Args:
+        conn: the writer's connection
+        tables: the tables in the database; sources that aren't present are skipped
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                          (KEY_TABLE,)).fetchone()
+    for statement in INDEX_SQL:
+        conn.execute(statement)
+    for source in SOURCES:
+        if source not in tables:
+            continue
+        for statement in _trigger_sql(source):
+            conn.execute(statement)
+        if not exists:
+            for statement in _backfill_sql(source):
+                conn.execute(statement)
+
+
+def to_match_query(q: str) -> str:
+    """ Convert search box text to an FTS5 query matching rows that contain every word.
+
+    Each word is quoted so characters such as '-' or '"' in the text are not read as FTS5
+    syntax, and the last word matches as a prefix so results appear while typing.
+
+    Raises:
+        ValueError: if the text has no words
+    """
+    words = _WORD.findall(q or "")
+    if not words:
+        raise ValueError("The search text must contain at least one word")
+    return " ".join(f'"{w}"' for w in words) + "*"
+
+
+def search(conn: sqlite3.Connection, q: str, sources: Optional[Sequence[str]] = None,
+           limit: int = DEFAULT_LIMIT, offset: int = 0) -> Dict[str, Any]:
+    """ Return the indexed rows matching the search text, best match first.
+
+    Args:
+        conn: read connection with sqlite3.Row rows
+        q: search text, see to_match_query
+        sources: only return rows from these tables, defaults to all indexed tables
+        limit: number of results, at most MAX_LIMIT
+        offset: number of results to skip
+
+    Returns:
+        Dict with the query, the results (source table, primary key as text, title, snippet
+        with the matches in [brackets], and rank, lower is better) and next_offset, which is
+        None on the last page
+
+    Raises:
+        ValueError: if the text has no words, a source is not indexed or the limit or offset
+            are out of range
+    """
+    if not 1 <= limit <= MAX_LIMIT or offset < 0:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT} and offset 0 or more")
+    sources = list(sources) if sources else list(SOURCES)
+    unknown = set(sources) - set(SOURCES)
+    if unknown:
+        raise ValueError(f"Unknown tables {sorted(unknown)}, must be from {list(SOURCES)}")
+    placeholders = ", ".join("?" for _ in sources)
+    # One more row than asked for, to tell whether there is another page without counting
+    rows = conn.execute(
+        f"SELECT k.source, k.source_key, s.title, "
+        f"snippet({SEARCH_TABLE}, -1, '[', ']', '...', {SNIPPET_TOKENS}) AS snippet, "
+        f"bm25({SEARCH_TABLE}, {TITLE_WEIGHT}, {BODY_WEIGHT}) AS rank "
+        f"FROM {SEARCH_TABLE} AS s JOIN {KEY_TABLE} AS k ON k.rowid = s.rowid "
+        f"WHERE {SEARCH_TABLE} MATCH ? AND k.source IN ({placeholders}) "
+        f"ORDER BY rank LIMIT ? OFFSET ?",
+        (to_match_query(q), *sources, limit + 1, offset)).fetchall()
+    results = [{"source": row["source"], "key": row["source_key"], "title": row["title"],
+                "snippet": row["snippet"], "rank": row["rank"]} for row in rows[:limit]]
+    return {"q": q, "results": results,
+            "next_offset": offset + limit if len(rows) > limit else None}
@@ -0,0 +1,157 @@
+""" Read-only in-memory snapshot of the paralympics reference tables.
+
+The reference tables (games, host, country, team, disability and the tables that link them)
+are read by every chart but rarely change. When the API runs with several worker processes,
+each worker copies these tables into its own in-memory SQLite database at startup and serves
+reads of them from memory, so reads don't touch the database file and scale with the number
+of workers.
+
+Writes always go to the database file. add_row records a version number for the table it
+writes to in the _table_version table (see VERSION_TABLE_SQL). Each snapshot checks, at most
+every check_interval seconds, whether the database file has changed (PRAGMA data_version) and
+if so whether any reference table version has changed, and then reloads itself. A worker that
+makes a write reloads its own snapshot straight away by calling mark_stale().
+"""
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from data.statements import CACHED_STATEMENTS
+
+REFERENCE_TABLES = ("games", "host", "country", "team", "disability",
+                    "games_host", "games_team", "games_disability")
+
+# Internal table holding a version number per table, incremented by each write to the table.
+# Tables whose name starts with an underscore are not exposed by the API.
+VERSION_TABLE = "_table_version"
+VERSION_TABLE_SQL = (f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} "
+                     "(table_name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+VERSION_BUMP_SQL = (f"INSERT INTO {VERSION_TABLE} (table_name, version) VALUES (?, 1) "
+                    "ON CONFLICT(table_name) DO UPDATE SET version = version + 1 "
+                    "RETURNING version")
+
+
+def read_table_versions(conn: sqlite3.Connection,
+                        tables: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """ Return the version of each table from the _table_version table.
+
+    Args:
+        conn: connection to the database file
+        tables: tables to return, defaults to all tables with a version
+
+    Returns:
+        Dict of table name to version. Tables that have never been written to are version 0.
+    """
+    try:
+        rows = conn.execute(f"SELECT table_name, version FROM {VERSION_TABLE}").fetchall()
+    except sqlite3.OperationalError:
+        # No writes have been made yet so the table has not been created
+        rows = []
+    versions = {row[0]: row[1] for row in rows}
+    if tables is None:
+        return versions
+    return {t: versions.get(t, 0) for t in tables}
+
+
+class ReferenceSnapshot:
+    """ In-memory copy of the reference tables that reloads itself when they change.
+
+    Queries are run on a single in-memory connection under a lock. Reads of the small reference
+    tables take microseconds, and each worker process has its own snapshot.
+
+    Attributes:
+        database_file: path to the database file the snapshot is copied from
+        tables: the tables held in the snapshot
+        versions: the table versions the current snapshot was loaded from
+        check_interval: minimum number of seconds between checks for changes
+        loads: number of times the snapshot has been loaded
+    """
+
+    def __init__(self, database_file: Path, tables: Sequence[str] = REFERENCE_TABLES,
+                 check_interval: float = 1.0):
+        self.database_file = database_file
+        self.check_interval = check_interval
+        self.loads = 0
+        self._lock = threading.Lock()
+        # Connection to the file used only to check PRAGMA data_version
+        self._watch = sqlite3.connect(database_file, check_same_thread=False)
+        existing = {row[0] for row in
+                    self._watch.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        self.tables = tuple(t for t in tables if t in existing)
+        self.versions: Dict[str, int] = {}
+        self._data_version = None
+        self._next_check = 0.0
+        self._stale = False
+        self._conn = self._load()
+
+    def covers(self, tables: Iterable[str]) -> bool:
+        """ Return True if every one of the tables is held in the snapshot. """
+        return all(t in self.tables for t in tables)
+
+    def mark_stale(self) -> None:
+        """ Reload the snapshot before the next query, e.g. after this process wrote to it. """
+        self._stale = True
+
+    def fetchall(self, sql: str, params: Sequence = ()) -> List[sqlite3.Row]:
+        """ Run a query against the snapshot, reloading it first if the tables have changed. """
+        self._refresh_if_changed()
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def close(self) -> None:
+        """ Close the in-memory database and the connection to the database file. """
+        with self._lock:
+            self._conn.close()
+            self._watch.close()
+
+    def _load(self) -> sqlite3.Connection:
+        """ Copy the tables, with their indexes, into a new in-memory database. """
+        mem = sqlite3.connect(":memory:", check_same_thread=False,
+                              cached_statements=CACHED_STATEMENTS)
+        mem.row_factory = sqlite3.Row
+        mem.execute("ATTACH DATABASE ? AS disk", (str(self.database_file),))
+        # Copy inside one read transaction so the tables and versions are consistent
+        mem.execute("BEGIN")
+        placeholders = ", ".join("?" for _ in self.tables)
+        schema = mem.execute(
+            f"SELECT type, name, tbl_name, sql FROM disk.sqlite_master "
+            f"WHERE tbl_name IN ({placeholders}) AND sql IS NOT NULL "
+            f"ORDER BY type = 'index'", self.tables).fetchall()
+        for row in schema:
+            if row["type"] == "table":
+                mem.execute(row["sql"])
+                mem.execute(f"INSERT INTO main.\"{row['name']}\" "
+                            f"SELECT * FROM disk.\"{row['name']}\"")
+            elif row["type"] == "index":
+                mem.execute(row["sql"])
+        versions = read_table_versions(mem, self.tables)
+        mem.execute("COMMIT")
+        mem.execute("DETACH DATABASE disk")
+        # Nothing writes to the snapshot, so stop any accidental writes
+        mem.execute("PRAGMA query_only = ON")
+        self.versions = versions
+        self._data_version = self._watch.execute("PRAGMA data_version").fetchone()[0]
+        self._stale = False
+        self.loads += 1
+        return mem
+
+    def _refresh_if_changed(self) -> None:
+        now = time.monotonic()
+        if not self._stale and now < self._next_check:
+            return
+        with self._lock:
+            if not self._stale:
+                self._next_check = now + self.check_interval
+                # data_version changes when any other connection commits to the file
+                data_version = self._watch.execute("PRAGMA data_version").fetchone()[0]
+                if data_version == self._data_version:
+                    return
+                self._data_version = data_version
+                if read_table_versions(self._watch, self.tables) == self.versions:
+                    # Only non-reference tables (e.g. question or score) have changed
+                    return
+            old = self._conn
+            self._conn = self._load()
+            old.close()
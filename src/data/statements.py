@@ -0,0 +1,66 @@
+""" Registry of the SQL statements generated by the data layer.
+
+ParalympicsData builds its SQL from the table name and the columns used, for example
+SELECT * FROM 'games' WHERE "event_type" = ? AND "year" = ?. Building the string once and
+reusing the identical text means each persistent connection's statement cache (see the
+cached_statements argument of sqlite3.connect) finds the already prepared statement instead of
+parsing and planning the SQL again.
+
+The registry counts hits and misses so the reuse can be reported, e.g. by the API /metrics
+route.
+"""
+import threading
+from typing import Callable, Dict, Hashable, Tuple
+
+# Size of the prepared statement cache of each persistent connection (sqlite3 default is 128)
+CACHED_STATEMENTS = 256
+
+StatementKey = Tuple[str, str, Tuple[Hashable, ...]]
+
+
+class StatementRegistry:
+    """ Caches generated SQL text keyed by (table, operation, column set).
+
+    Attributes:
+        hits: number of lookups that found an existing statement
+        misses: number of lookups that had to build the statement
+    """
+
+    def __init__(self):
+        self._statements: Dict[StatementKey, str] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, table: str, operation: str, columns: Tuple[Hashable, ...],
+            build: Callable[[], str]) -> str:
+        """ Return the SQL for the key, calling build() to generate it the first time.
+
+        Args:
+            table: table name
+            operation: name of the operation, e.g. 'insert' or 'search'
+            columns: the columns the statement uses, in the order of its placeholders
+            build: function that returns the SQL text
+
+        Returns:
+            The SQL text
+        """
+        key = (table, operation, columns)
+        with self._lock:
+            sql = self._statements.get(key)
+            if sql is not None:
+                self.hits += 1
+                return sql
+            self.misses += 1
+        sql = build()
+        with self._lock:
+            return self._statements.setdefault(key, sql)
+
+    def stats(self) -> Dict:
+        """ Return the number of statements and the hit and miss counts and hit rate. """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"statements": len(self._statements),
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,190 @@
+""" Single writer thread for the paralympics SQLite database.
+
+SQLite allows only one writer at a time. Rather than every request opening its own connection
+and competing for the database lock, all writes are queued to one thread that owns the only
+write connection. The thread takes every job waiting in the queue (up to max_batch) and runs
+them in a single transaction, so a burst of inserts costs one commit rather than one each.
+
+The database is put into WAL (write-ahead log) mode, so readers using their own connections
+are not blocked while the writer commits.
+
+Usage:
+    writer = DatabaseWriter(database_file)
+    future = writer.submit(lambda conn: conn.execute(sql, values).lastrowid)
+    row_id = future.result()
+
+A job that manages its own transaction, such as restoring a backup into the database, is
+submitted with transaction=False and runs on its own between batches.
+"""
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from data.statements import CACHED_STATEMENTS
+
+Job = Callable[[sqlite3.Connection], Any]
+
+_STOP = object()
+
+
+def enable_wal(conn: sqlite3.Connection) -> None:
+    """ Put the database into WAL journal mode. The setting is stored in the database file. """
+    conn.execute("PRAGMA journal_mode=WAL")
+    # In WAL mode NORMAL is still safe from corruption and avoids an fsync per commit
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+
+class DatabaseWriter:
+    """ Runs all writes to a database on a single thread, group committing queued jobs.
+
+    A job is a function that takes the writer's sqlite3.Connection and returns a result. Each
+    job runs inside a savepoint, so a job that raises is rolled back on its own and does not
+    affect the other jobs in the same batch. Futures are only resolved once the transaction has
+    been committed.
+
+    Attributes:
+        database_file: path to the database file
+        max_batch: the maximum number of jobs committed in one transaction
+        jobs_committed: count of jobs that completed successfully
+        batches_committed: count of transactions committed
+    """
+
+    def __init__(self, database_file: Path, max_batch: int = 64, busy_timeout: float = 5.0):
+        self.database_file = database_file
+        self.max_batch = max_batch
+        self.busy_timeout = busy_timeout
+        self.jobs_committed = 0
+        self.batches_committed = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="paralympics-db-writer",
+                                        daemon=True)
+        self._thread.start()
+
+    def submit(self, job: Job, transaction: bool = True) -> Future:
+        """ Queue a job to run on the writer thread.
+
+        Args:
+            job: function that is passed the write connection
+            transaction: if False the job is run on its own, outside a transaction, e.g. for
+                Connection.backup which needs the connection not to be in a transaction
+
+        Returns:
+            Future that resolves to the job's return value once the job is committed
+
+        Raises:
+            RuntimeError: if the writer has been closed
+        """
+        if not self._thread.is_alive():
+            raise RuntimeError("Database writer is closed")
+        future: Future = Future()
+        self._queue.put((job, future, transaction))
+        return future
+
+    def execute(self, job: Job, timeout: Optional[float] = None, transaction: bool = True) -> Any:
+        """ Queue a job and wait for its result. Exceptions raised by the job are re-raised. """
+        return self.submit(job, transaction).result(timeout=timeout)
+
+    def stats(self) -> Dict[str, int]:
+        """ Return counts of committed jobs and batches and the number of jobs waiting. """
+        return {"jobs_committed": self.jobs_committed,
+                "batches_committed": self.batches_committed,
+                "pending": self._queue.qsize()}
+
+    def close(self, timeout: float = 10.0) -> None:
+        """ Finish the queued jobs, then stop the thread and close the write connection. """
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: transactions are started and committed explicitly in _commit
+        conn = sqlite3.connect(self.database_file, timeout=self.busy_timeout,
+                               isolation_level=None, cached_statements=CACHED_STATEMENTS)
+        enable_wal(conn)
+        return conn
+
+    def _run(self) -> None:
+        conn = self._connect()
+        try:
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                batch = []
+                # Group commit: take whatever else is already waiting, up to a job that must
+                # run outside a transaction
+                while True:
+                    if not item[2]:
+                        self._commit(conn, batch)
+                        batch = []
+                        self._run_alone(conn, item[0], item[1])
+                    else:
+                        batch.append(item[:2])
+                    if len(batch) >= self.max_batch:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                self._commit(conn, batch)
+        finally:
+            conn.close()
+
+    def _run_alone(self, conn: sqlite3.Connection, job: Job, future: Future) -> None:
+        """ Run a job outside a transaction; the job is responsible for what it commits. """
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = job(conn)
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            future.set_exception(e)
+        else:
+            self.jobs_committed += 1
+            future.set_result(result)
+
+    def _commit(self, conn: sqlite3.Connection, batch: List[Tuple[Job, Future]]) -> None:
+        if not batch:
+            return
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.Error as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for job, future in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            conn.execute("SAVEPOINT job")
+            try:
+                result = job(conn)
+            except Exception as e:
+                conn.execute("ROLLBACK TO job")
+                conn.execute("RELEASE job")
+                outcomes.append((future, None, e))
+            else:
+                conn.execute("RELEASE job")
+                outcomes.append((future, result, None))
+        try:
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            conn.execute("ROLLBACK")
+            for future, _, _ in outcomes:
+                future.set_exception(e)
+            return
+        self.batches_committed += 1
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                self.jobs_committed += 1
+                future.set_result(result)
@@ -0,0 +1,44 @@
+""" HTTP requests to the REST API with a timeout and one retry when the API is busy.
+
+The API sheds load when too many requests arrive at once, answering 503 with a Retry-After
+header (see data/admission.py). Rather than showing an error, a request is retried once after
+the wait the API asks for, up to MAX_RETRY_WAIT seconds.
+
+Usage:
+    response = request("GET", f"{api_base()}/all")
+"""
+import time
+
+import requests
+
+# Seconds to wait for the API to connect and to respond
+TIMEOUT = 5
+# Longest Retry-After wait before the one retry of a 503 response
+MAX_RETRY_WAIT = 3.0
+
+
+def _retry_wait(response: requests.Response) -> float:
+    try:
+        return min(max(float(response.headers.get("Retry-After", 1)), 0.0), MAX_RETRY_WAIT)
+    except ValueError:
+        # An HTTP date rather than seconds
+        return MAX_RETRY_WAIT
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """ Make a request, retrying once if the API responds 503 Service Unavailable.
+
+    Args:
+        method: HTTP method, e.g. 'GET'
+        url: URL to request
+        **kwargs: passed to requests.request, timeout defaults to TIMEOUT
+
+    Returns:
+        requests.Response: the response, call raise_for_status to check it
+    """
+    kwargs.setdefault("timeout", TIMEOUT)
+    response = requests.request(method, url, **kwargs)
+    if response.status_code == 503:
+        time.sleep(_retry_wait(response))
+        response = requests.request(method, url, **kwargs)
+    return response
@@ -1,6 +1,103 @@
+import os
+
+import numpy as np
 import pandas as pd
 import plotly.express as px
-import requests
+
+from paralympics import api_client
+from paralympics.config import api_base
+from paralympics.profiling import profile_block, profiled
+
+# Maximum number of points sent to the browser for one chart. Series with more points are
+# downsampled on the server (see downsample). Set with the PARALYMPICS_POINT_BUDGET variable.
+POINT_BUDGET_ENV = "PARALYMPICS_POINT_BUDGET"
+DEFAULT_POINT_BUDGET = 2000
+# Line charts with more points than this are drawn with WebGL (Scattergl) rather than SVG
+WEBGL_THRESHOLD = 1000
+
+
+def point_budget():
+    """ Returns the maximum number of points to plot, from the environment or the default """
+    try:
+        return max(int(os.environ.get(POINT_BUDGET_ENV, DEFAULT_POINT_BUDGET)), 3)
+    except ValueError:
+        return DEFAULT_POINT_BUDGET
+
+
+def render_mode(n_points):
+    """ Returns the Plotly Express render_mode for a chart with n_points points
+
+    SVG draws each point as a DOM element which gets slow beyond a few thousand points, WebGL
+    draws them on a canvas.
+    """
+    return "webgl" if n_points > WEBGL_THRESHOLD else "svg"
+
+
+def lttb_indices(x, y, n_out):
+    """ Selects the points to keep when downsampling a series with Largest-Triangle-Three-Buckets
+
+    The first and last points are kept. The points between are split into n_out - 2 buckets
+    and from each bucket the point that forms the largest triangle with the point kept from
+    the previous bucket and the average of the next bucket is kept. This keeps the peaks and
+    troughs that a line chart needs, which taking every nth point would miss.
+
+    Args:
+        x: numeric x values in ascending order
+        y: numeric y values, without NaN
+        n_out: number of points to keep
+
+    Returns:
+        indices: NumPy array of the positions of the points to keep, in ascending order
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # The next bucket, or the last point for the last bucket
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+
+def downsample(df, x, y, budget=None, group=None):
+    """ Downsamples a DataFrame to at most budget rows for plotting as lines
+
+    Each group (e.g. each event_type line) gets a share of the budget in proportion to its
+    number of rows and is downsampled with LTTB. DataFrames within the budget are returned
+    unchanged.
+
+    Args:
+        df: DataFrame with the data
+        x: name of the numeric x column
+        y: name of the numeric y column
+        budget: maximum number of rows, defaults to point_budget()
+        group: name of the column that splits the rows into separate series, or None
+
+    Returns:
+        df: DataFrame with at most budget rows, sorted by group and x
+    """
+    budget = budget or point_budget()
+    if len(df) <= budget:
+        return df
+    df = df.dropna(subset=[y]).sort_values([group, x] if group else [x])
+    groups = df.groupby(group, sort=False) if group else [(None, df)]
+    parts = []
+    for _, part in groups:
+        share = max(int(budget * len(part) / len(df)), 3)
+        parts.append(part.iloc[lttb_indices(part[x].to_numpy(), part[y].to_numpy(), share)])
+    return pd.concat(parts)
 
 
 def get_api_data(url):
@@ -11,14 +108,21 @@ def get_api_data(url):
 
     Returns:
         df: DataFrame with the data
+
+    Raises:
+        requests.exceptions.RequestException: if the API doesn't respond within
+            api_client.TIMEOUT seconds or responds with an error
     """
-    response = requests.get(url)
-    response.raise_for_status()
-    data = response.json()
-    df = pd.DataFrame(data)
+    with profile_block("api_fetch"):
+        response = api_client.request("GET", url)
+        response.raise_for_status()
+        data = response.json()
+    with profile_block("to_dataframe"):
+        df = pd.DataFrame(data)
     return df
 
 
+@profiled("line_chart")
 def line_chart(feature):
     """ Creates a line chart with data from the mock_api
 
@@ -38,19 +142,43 @@ def line_chart(feature):
     else:
         feature = feature.lower()
 
-    df = get_api_data("http://127.0.0.1:8000/all")
+    df = get_api_data(f"{api_base()}/all")
+
+    with profile_block("shape"):
+        chart_df = df[["event_type", "year", feature]]
+
+    return line_figure(chart_df, feature)
+
 
-    chart_df = df[["event_type", "year", feature]]
+def line_figure(chart_df, feature, budget=None):
+    """ Creates the line chart figure from the shaped data
 
-    fig = px.line(chart_df,
-                  x="year",
-                  y=feature,
-                  color="event_type",
-                  # title=f"How has the number of {feature} changed over time?",
-                  template="simple_white")
+    Above the point budget the lines are downsampled, and above WEBGL_THRESHOLD points they
+    are drawn with WebGL (Scattergl traces).
+
+    Args:
+        chart_df: DataFrame with event_type, year and feature columns
+        feature (str): name of the column to plot
+        budget (int): maximum number of points, defaults to point_budget()
+
+    Returns:
+        fig: Plotly Express line figure
+    """
+    with profile_block("downsample"):
+        chart_df = downsample(chart_df, "year", feature, budget, group="event_type")
+
+    with profile_block("figure"):
+        fig = px.line(chart_df,
+                      x="year",
+                      y=feature,
+                      color="event_type",
+                      # title=f"How has the number of {feature} changed over time?",
+                      template="simple_white",
+                      render_mode=render_mode(len(chart_df)))
     return fig
 
 
+@profiled("scatter_map")
 def scatter_map():
     """ Creates a scatter chart with locations of all Paralympics
 
@@ -58,28 +186,73 @@ def scatter_map():
         fig: Plotly Express scatter map figure
     """
 
-    df = get_api_data("http://127.0.0.1:8000/all")
+    df = get_api_data(f"{api_base()}/all")
 
-    chart_df = df[["year", "place_name", "latitude", "longitude"]].copy()
+    with profile_block("shape"):
+        chart_df = df[["year", "place_name", "latitude", "longitude"]].copy()
 
-    # Ensure latitude/longitude are numeric (non-numeric -> NaN)
-    chart_df['longitude'] = pd.to_numeric(chart_df['longitude'], errors='coerce')
-    chart_df['latitude'] = pd.to_numeric(chart_df['latitude'], errors='coerce')
+        # Ensure latitude/longitude are numeric (non-numeric -> NaN)
+        chart_df['longitude'] = pd.to_numeric(chart_df['longitude'], errors='coerce')
+        chart_df['latitude'] = pd.to_numeric(chart_df['latitude'], errors='coerce')
 
-    # Add a new column that concatenates the place_name and year e.g. Barcelona 2012
-    chart_df['name'] = chart_df['place_name'] + ' ' + chart_df['year'].astype(str)
+        # Add a new column that concatenates the place_name and year e.g. Barcelona 2012
+        chart_df['name'] = chart_df['place_name'] + ' ' + chart_df['year'].astype(str)
 
     # Create the figure
-    fig = px.scatter_map(chart_df,
-                         lat=chart_df.latitude,
-                         lon=chart_df.longitude,
-                         hover_name=chart_df.name,
-                         zoom=0.5
-                         # title="Where have the paralympics been held?"
-                         )
+    with profile_block("figure"):
+        fig = px.scatter_map(chart_df,
+                             lat=chart_df.latitude,
+                             lon=chart_df.longitude,
+                             hover_name=chart_df.name,
+                             zoom=0.5
+                             # title="Where have the paralympics been held?"
+                             )
     return fig
 
 
+@profiled("cluster_map")
+def cluster_map(zoom=0, bounds=None):
+    """ Creates a map of the host locations clustered for a zoom level and viewport
+
+    The clustering is done by the REST API (/geo/clusters), which only returns the clusters in
+    the viewport, so the figure stays small however many locations there are. Call again with
+    the new zoom and bounds as the user pans or zooms to load the clusters for that area.
+
+    Args:
+        zoom (int): grid zoom level from 0 to 16
+        bounds (tuple): viewport (min_lat, min_lon, max_lat, max_lon), defaults to the world
+
+    Returns:
+        fig: Plotly Express scatter map figure, marker size shows the number of locations
+    """
+    params = {"zoom": zoom}
+    if bounds:
+        params.update(zip(("min_lat", "min_lon", "max_lat", "max_lon"), bounds))
+
+    with profile_block("api_fetch"):
+        response = api_client.request("GET", f"{api_base()}/geo/clusters", params=params)
+        response.raise_for_status()
+        clusters = response.json()["clusters"]
+
+    with profile_block("shape"):
+        chart_df = pd.DataFrame(clusters, columns=["latitude", "longitude", "count", "names"])
+        # Hover text e.g. "Rome" for a single location or "Rome, Tokyo, Tel Aviv (+29 more)"
+        chart_df["name"] = [", ".join(names) + (f" (+{count - len(names)} more)"
+                                                if count > len(names) else "")
+                            for names, count in zip(chart_df["names"], chart_df["count"])]
+
+    with profile_block("figure"):
+        fig = px.scatter_map(chart_df,
+                             lat="latitude",
+                             lon="longitude",
+                             size="count",
+                             hover_name="name",
+                             hover_data={"count": True, "latitude": False, "longitude": False},
+                             zoom=max(zoom - 1, 0.5))
+    return fig
+
+
+@profiled("bar_chart")
 def bar_chart(event_type):
     """
     Creates a stacked bar chart showing change in the ration of male and female competitors in the summer and winter paralympics.
@@ -90,32 +263,57 @@ def bar_chart(event_type):
     Returns
     fig: Plotly Express bar chart
     """
-    df = get_api_data("http://127.0.0.1:8000/all")
+    df = get_api_data(f"{api_base()}/all")
     needed = ['event_type', 'year', 'place_name', 'participants_m', 'participants_f',
               'participants']
-    df_plot = (
-        df[needed]
-        .dropna(subset=['participants_m', 'participants_f'])
-        .query("event_type == @event_type")
-        .assign(  # Avoid divide-by-zero; if participants==0, set NaN, then drop
-            Male=lambda d: d['participants_m'].where(d['participants'] != 0, pd.NA) / d[
-                'participants'],
-            Female=lambda d: d['participants_f'].where(d['participants'] != 0, pd.NA) / d[
-                'participants'],
-            xlabel=lambda d: d['place_name'] + " " + d['year'].astype(str), )
-        .dropna(subset=['Male', 'Female'])
-        .sort_values(['event_type', 'year'])
-    )
-
-    fig = px.bar(df_plot,
-                 x='xlabel',
-                 y=['Male', 'Female'],
-                 # title=f'How has the ratio of female:male participants changed in the {event_type} paralympics?',
-                 labels={'xlabel': '', 'value': '', 'variable': ''},
-                 template="simple_white"
-                 )
-    fig.update_xaxes(ticklen=0)
-    fig.update_yaxes(tickformat=".0%")
+    with profile_block("shape"):
+        df_plot = (
+            df[needed]
+            .dropna(subset=['participants_m', 'participants_f'])
+            .query("event_type == @event_type")
+            .assign(  # Avoid divide-by-zero; if participants==0, set NaN, then drop
+                Male=lambda d: d['participants_m'].where(d['participants'] != 0, pd.NA) / d[
+                    'participants'],
+                Female=lambda d: d['participants_f'].where(d['participants'] != 0, pd.NA) / d[
+                    'participants'],
+                xlabel=lambda d: d['place_name'] + " " + d['year'].astype(str), )
+            .dropna(subset=['Male', 'Female'])
+            .sort_values(['event_type', 'year'])
+        )
+
+    return bar_figure(df_plot)
+
+
+def bar_figure(df_plot, budget=None):
+    """ Creates the stacked bar chart figure from the shaped data
+
+    Plotly has no WebGL bar trace, so above the point budget the bars are downsampled instead:
+    LTTB on the female ratio in year order keeps the bars where the ratio changes most.
+
+    Args:
+        df_plot: DataFrame with year, xlabel, Male and Female columns, sorted by year
+        budget (int): maximum number of bars, defaults to point_budget()
+
+    Returns:
+        fig: Plotly Express bar chart
+    """
+    budget = budget or point_budget()
+    with profile_block("downsample"):
+        if len(df_plot) > budget:
+            positions = np.arange(len(df_plot))
+            df_plot = df_plot.iloc[lttb_indices(positions, df_plot['Female'].to_numpy(),
+                                                budget)]
+
+    with profile_block("figure"):
+        fig = px.bar(df_plot,
+                     x='xlabel',
+                     y=['Male', 'Female'],
+                     # title=f'How has the ratio of female:male participants changed in the {event_type} paralympics?',
+                     labels={'xlabel': '', 'value': '', 'variable': ''},
+                     template="simple_white"
+                     )
+        fig.update_xaxes(ticklen=0)
+        fig.update_yaxes(tickformat=".0%")
     return fig
 
 
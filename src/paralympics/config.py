@@ -0,0 +1,14 @@
+""" Settings for the dashboard that can be changed with environment variables.
+
+PARALYMPICS_API_BASE: base URL of the REST API, default http://127.0.0.1:8000. Set it when the
+API runs elsewhere, e.g. on another port while the tests run in parallel.
+"""
+import os
+
+API_BASE_ENV = "PARALYMPICS_API_BASE"
+DEFAULT_API_BASE = "http://127.0.0.1:8000"
+
+
+def api_base() -> str:
+    """ Return the REST API base URL, without a trailing slash. """
+    return os.environ.get(API_BASE_ENV, DEFAULT_API_BASE).rstrip("/")
@@ -0,0 +1,123 @@
+""" Client for the REST API /events stream, used to clear dashboard caches when data changes.
+
+The dashboard caches API responses with st.cache_data. Rather than clearing every cache when
+a teacher adds a question, or re-fetching on a timer, a background thread listens to the API's
+Server-Sent Events stream and calls only the handlers registered for the table that changed,
+e.g. get_responses.clear when a row is added to the response table.
+
+Usage (once per Streamlit server process, e.g. from a st.cache_resource function):
+    start_listener(API_BASE, {"question": [get_catalogue.clear]})
+"""
+import json
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import requests
+
+# Seconds to wait before reconnecting after the stream fails
+RECONNECT_DELAY = 5
+# Read timeout, longer than the API's keep-alive interval
+READ_TIMEOUT = 60
+
+Handlers = Dict[str, List[Callable[[], None]]]
+
+
+def parse_sse(lines: Iterable[str]) -> Iterator[Dict]:
+    """ Parse Server-Sent Events from the lines of a stream.
+
+    Args:
+        lines: decoded lines of the response, without line endings
+
+    Yields:
+        Dict with the event 'id', 'event' name and 'data' (parsed as JSON where possible)
+    """
+    event: Dict = {}
+    data_lines: List[str] = []
+    for line in lines:
+        if not line:
+            if data_lines:
+                text = "\n".join(data_lines)
+                try:
+                    event["data"] = json.loads(text)
+                except json.JSONDecodeError:
+                    event["data"] = text
+                yield event
+            event, data_lines = {}, []
+        elif line.startswith(":"):
+            continue  # comment, e.g. keep-alive
+        else:
+            name, _, value = line.partition(":")
+            value = value[1:] if value.startswith(" ") else value
+            if name == "data":
+                data_lines.append(value)
+            elif name in ("id", "event"):
+                event[name] = value
+
+
+class ChangeListener(threading.Thread):
+    """ Background thread that calls the handlers for each table change from the API.
+
+    Attributes:
+        url: the API /events URL
+        handlers: dict of table name to the functions to call when the table changes
+        last_id: id of the last event received, sent as Last-Event-ID on reconnect
+        received: number of change events received
+    """
+
+    def __init__(self, url: str, handlers: Handlers):
+        super().__init__(name="paralympics-change-listener", daemon=True)
+        self.url = url
+        self.handlers = handlers
+        self.last_id: Optional[str] = None
+        self.received = 0
+        self._stopping = threading.Event()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def handle(self, event: Dict) -> None:
+        """ Call the handlers registered for the table in a change event. """
+        if event.get("id"):
+            self.last_id = event["id"]
+        change = event.get("data")
+        if not isinstance(change, dict):
+            return
+        self.received += 1
+        for handler in self.handlers.get(change.get("table"), []):
+            handler()
+
+    def run(self) -> None:
+        params = {"tables": ",".join(self.handlers)}
+        while not self._stopping.is_set():
+            headers = {"Last-Event-ID": self.last_id} if self.last_id else {}
+            try:
+                with requests.get(self.url, params=params, headers=headers, stream=True,
+                                  timeout=(5, READ_TIMEOUT)) as resp:
+                    resp.raise_for_status()
+                    for event in parse_sse(resp.iter_lines(decode_unicode=True)):
+                        self.handle(event)
+                        if self._stopping.is_set():
+                            return
+            except requests.exceptions.RequestException:
+                pass
+            # The stream ended or failed, e.g. the API restarted: clear the caches in case
+            # changes were missed, then reconnect
+            for handlers in self.handlers.values():
+                for handler in handlers:
+                    handler()
+            self._stopping.wait(RECONNECT_DELAY)
+
+
+def start_listener(api_base: str, handlers: Handlers) -> ChangeListener:
+    """ Start a ChangeListener for the API's /events stream.
+
+    Args:
+        api_base: base URL of the REST API, e.g. http://127.0.0.1:8000
+        handlers: dict of table name to the functions to call when the table changes
+
+    Returns:
+        The running ChangeListener
+    """
+    listener = ChangeListener(f"{api_base}/events", handlers)
+    listener.start()
+    return listener
@@ -64,9 +64,8 @@ def process_form() -> None:
             resp.raise_for_status()
         st.success("Question saved successfully.")
 
-        # Clear the caches as the data has now been updated
-        # You can clear a function's cache with func.clear() or clear the entire cache with st.cache_data.clear().
-        st.cache_data.clear()
+        # The question and response caches don't need clearing here: the dashboard's change
+        # listener (see live_updates.py) clears only those caches when the API reports the new rows
 
     except Exception as exc:
         st.error(f"Error saving question: {exc}")
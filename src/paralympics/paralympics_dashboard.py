@@ -1,23 +1,31 @@
 from pathlib import Path
 from typing import Any, Dict, List
+from uuid import uuid4
 
 import requests
 import streamlit as st
 
-from paralympics.charts import bar_chart, line_chart, scatter_map
+from paralympics import api_client, config, live_updates, profiling, quiz
+from paralympics.profiling import profile_block
 
 BASE_DIR = Path(__file__).resolve().parent
 STATIC_DIR = BASE_DIR / "static"
-API_BASE = "http://127.0.0.1:8000"  # REST API default URL
-TIMEOUT = 5  # seconds
+API_BASE = config.api_base()  # REST API URL, set with PARALYMPICS_API_BASE
+TIMEOUT = api_client.TIMEOUT  # seconds
 
 st.set_page_config(page_title="Paralympics Dashboard", layout="wide")
 
+# Opt-in render profiling, enable with PARALYMPICS_PROFILE=1 or ?profile=1 (see profiling.py)
+if "profile_session" not in st.session_state:
+    st.session_state.profile_session = uuid4().hex
+profiler = profiling.begin_run(profiling.is_enabled(st.query_params),
+                               st.session_state.profile_session)
+
 
 # Helper functions for interacting with the REST API
 
 def _get(url: str, **kwargs) -> requests.Response:
-    """HTTP GET with a uniform timeout and error handling.
+    """HTTP GET with a uniform timeout and error handling, retried once if the API is busy.
 
     Args:
         url (str): URL to request
@@ -30,7 +38,7 @@ def _get(url: str, **kwargs) -> requests.Response:
         RuntimeError: If request fails
     """
     try:
-        resp = requests.get(url, timeout=TIMEOUT, **kwargs)
+        resp = api_client.request("GET", url, timeout=TIMEOUT, **kwargs)
         resp.raise_for_status()
         return resp
     except requests.exceptions.RequestException as e:
@@ -38,46 +46,88 @@ def _get(url: str, **kwargs) -> requests.Response:
         raise RuntimeError(f"Request failed for {url}: {e}") from e
 
 
-@st.cache_data(show_spinner=False)
-def count_questions() -> int:
-    """Return the number of questions available.
+def _post(url: str, **kwargs) -> requests.Response:
+    """HTTP POST with a uniform timeout and error handling, retried once if the API is busy.
+
+    Args:
+        url (str): URL to request
+
+    Returns:
+        requests.Response: Response object
+
+    Raises:
+        RuntimeError: If request fails
+    """
+    try:
+        resp = api_client.request("POST", url, timeout=TIMEOUT, **kwargs)
+        resp.raise_for_status()
+        return resp
+    except requests.exceptions.RequestException as e:
+        raise RuntimeError(f"Request failed for {url}: {e}") from e
+
+
+@st.cache_resource(show_spinner=False)
+def get_catalogue() -> quiz.QuizCatalogue:
+    """Return the quiz questions and their responses, shared by every session.
+
+    st.cache_resource returns the same immutable object to every session rather than a copy
+    per call, as st.cache_data would. It is cleared by the change listener when a question or
+    response is added.
 
     Returns:
-        int: Number of questions
-        """
-    resp = _get(f"{API_BASE}/question")
-    data = resp.json()
-    return len(data)
+        QuizCatalogue: the questions with their responses
+    """
+    questions = _get(f"{API_BASE}/question").json()
+    responses = _get(f"{API_BASE}/response").json()
+    return quiz.load_catalogue(questions, responses)
 
 
 @st.cache_data(show_spinner=False)
-def get_question(qid: int) -> Dict[str, Any]:
-    """Return the question JSON by ID.
+def get_leaderboard(limit: int = 10) -> List[Dict[str, Any]]:
+    """Return the top of the quiz leaderboard.
 
     Args:
-        qid (int): Question ID
+        limit (int): Number of players
 
     Returns:
-        Dict[str, Any]: JSON for a given question ID with id and question_text
+        List[Dict[str, Any]]: rank, first_name, last_name, best and attempts for each player
     """
-    resp = _get(f"{API_BASE}/question/{qid}")
+    resp = _get(f"{API_BASE}/leaderboard", params={"limit": limit})
     return resp.json()
 
 
-@st.cache_data(show_spinner=False)
-def get_responses(qid: int) -> List[Dict[str, Any]]:
-    """Return the responses for a given question ID.
+def get_player_rank(first_name: str, last_name: str) -> Dict[str, Any]:
+    """Return a player's rank, best score, attempts and the number of players.
 
     Args:
-        qid (int): Question ID
+        first_name (str): Player's first name
+        last_name (str): Player's last name
 
     Returns:
-        List[Dict[str, Any]]: Response JSON containing the responses for a given question ID
-        """
-    resp = _get(f"{API_BASE}/response/search", params={"question_id": qid})
+        Dict[str, Any]: Rank JSON for the player
+    """
+    resp = _get(f"{API_BASE}/leaderboard/rank",
+                params={"first_name": first_name, "last_name": last_name})
     return resp.json()
 
 
+@st.cache_resource(show_spinner=False)
+def listen_for_changes() -> live_updates.ChangeListener:
+    """Start one background listener per server process for changes made through the API.
+
+    When a question or response is added, e.g. from the teacher admin page, only the caches for
+    that table are cleared, so every session sees the new data without polling the API.
+
+    Returns:
+        ChangeListener: the running listener thread
+    """
+    return live_updates.start_listener(API_BASE, {
+        "question": [get_catalogue.clear],
+        "response": [get_catalogue.clear],
+        "score": [get_leaderboard.clear],
+    })
+
+
 # Chart helper
 def clear_other_state():
     """Clear irrelevant widget state whenever the chart choice changes."""
@@ -85,55 +135,56 @@ def clear_other_state():
         st.session_state.pop(key, None)
 
 
+# Profiling helper
+def render_profile_panel(run_profiler: profiling.RenderProfiler):
+    """Show the block timings for this run in a collapsible panel and save them to file.
+
+    Args:
+        run_profiler (RenderProfiler): Profiler for the current script run
+    """
+    with st.expander(f"Render timings ({run_profiler.total_ms():.0f} ms)"):
+        st.dataframe(run_profiler.summary(), hide_index=True)
+    run_profiler.write()
+
+
 # Quiz helper
 def render_question_block():
     """ Render the question block.
 
-    - Get the index from the session state (starts at 1)
+    - Get the session's progress from the session state (the question number starts at 1)
     - Render the question block (question text and the response options as radio plus submit button)
     - When the submit button is clicked
         - check a response is selected
         - if a response is selected, check if is it correct (uses the response.id)
         - if the response is correct, render the next question unless all questions have been
-        completed (compares the question number to the number of questions in the database)
+        completed (compares the question number to the number of questions in the catalogue)
         - if the response is incorrect, stay on the same question and allow another attempt
+    - The score is the number of questions answered correctly at the first attempt. When all
+    questions are complete the score can be saved to the leaderboard.
 
     """
     st.header("Questions")
 
-    if "q_index" not in st.session_state:
-        st.session_state.q_index = 1
+    if "quiz_progress" not in st.session_state:
+        st.session_state.quiz_progress = quiz.QuizProgress()
+    progress = st.session_state.quiz_progress
 
-    q_index = st.session_state.q_index
-
-    # Fetch total count
+    # Fetch the shared question catalogue
     try:
-        num_q = count_questions()
+        catalogue = get_catalogue()
     except Exception as e:
         st.error(f"Unable to load questions. {e}")
         return
 
     # If past the last question, show completion and exit
-    if q_index > num_q:
+    question = catalogue.question(progress.q_index)
+    if question is None:
         st.success("Questions complete, well done!")
+        render_leaderboard_block(len(catalogue))
         return
 
-    # Fetch the current question + its responses
-    try:
-        q = get_question(q_index)
-    except Exception as e:
-        st.error(f"Unable to load question. {e}")
-        return
-
-    try:
-        responses = get_responses(q_index)
-    except Exception as e:
-        st.info(f"Unable to load responses. {e}")
-        responses = []
-
     # Build radio options as label -> id map
-    label_to_id = {r.get("response_text", ""): r.get("id") for r in responses if
-                   r.get("response_text", "")}
+    label_to_id = {r.text: r.id for r in question.responses}
 
     # If no responses returned from the REST API
     if not label_to_id:
@@ -141,7 +192,7 @@ def render_question_block():
         return
 
     with st.form(key="quiz_form", clear_on_submit=False):
-        st.write(q.get("question_text", ""))
+        st.write(question.text)
         selected_label = st.radio(
             "Select one answer:",
             options=list(label_to_id.keys()),
@@ -155,40 +206,73 @@ def render_question_block():
             st.info("Please select an answer.")
             return
 
-        selected_id = str(label_to_id[selected_label])
+        selected = question.response(label_to_id[selected_label])
+        correct = selected is not None and selected.is_correct
+        progress.answer(correct)
+        if correct:
+            # Using rerun ensures the next question (or the completion message) renders cleanly
+            st.rerun()
+        else:
+            st.info("Please try again!")
+
 
-        # Find the selected response to inspect correctness
-        selected_obj = next(
-            (r for r in responses if str(r.get("id")) == selected_id),
-            None,
-        )
+def render_leaderboard_block(num_q: int):
+    """ Render the score, a form to save it to the leaderboard and the leaderboard.
 
-        if selected_obj and selected_obj.get("is_correct"):
-            # Advance or finish
-            if q_index >= num_q:
-                st.session_state.q_index = num_q + 1
-                st.success("Questions complete, well done!")
+    The score is saved by posting an attempt to the score table, the REST API updates the
+    leaderboard as the attempt is inserted.
+
+    Args:
+        num_q (int): Number of questions in the quiz
+    """
+    score = st.session_state.quiz_progress.score
+    st.write(f"You answered {score} of {num_q} questions correctly at the first attempt.")
+
+    if "score_saved_as" not in st.session_state:
+        with st.form(key="score_form"):
+            first_name = st.text_input("First name")
+            last_name = st.text_input("Last name")
+            save = st.form_submit_button("Save score")
+        if save:
+            if not first_name.strip() or not last_name.strip():
+                st.info("Please enter your first and last name.")
             else:
-                st.session_state.q_index = q_index + 1
-                # Using rerun ensures the next question renders cleanly
-                st.rerun()
-        else:
-            st.info("Please try again!")
+                name = {"first_name": first_name.strip(), "last_name": last_name.strip()}
+                try:
+                    _post(f"{API_BASE}/score", json={**name, "score": score})
+                    st.session_state.score_saved_as = name
+                    get_leaderboard.clear()
+                except RuntimeError as e:
+                    st.error(f"Unable to save your score. {e}")
+
+    try:
+        if "score_saved_as" in st.session_state:
+            player = get_player_rank(**st.session_state.score_saved_as)
+            st.write(f"Your best score of {player['best']} is ranked {player['rank']} of "
+                     f"{player['players']} players.")
+        st.subheader("Leaderboard")
+        st.dataframe(get_leaderboard(), hide_index=True,
+                     column_order=["rank", "first_name", "last_name", "best", "attempts"])
+    except Exception as e:
+        st.info(f"Unable to load the leaderboard. {e}")
 
 
+listen_for_changes()
+
 # Layout
 
-nav_container = st.container(horizontal=True, horizontal_alignment="center")
-with nav_container:
-    logo = STATIC_DIR / "colour-logo.webp"
-    st.image(logo, width=40)
-    st.markdown("**Paralympics research app**")
+with profile_block("nav"):
+    nav_container = st.container(horizontal=True, horizontal_alignment="center")
+    with nav_container:
+        logo = STATIC_DIR / "colour-logo.webp"
+        st.image(logo, width=40)
+        st.markdown("**Paralympics research app**")
 
 st.markdown("Use the charts to explore the data and then answer the questions below.")
 
 left_col, right_col = st.columns([1, 3])
 
-with left_col:
+with left_col, profile_block("chart_selection"):
     # 1. Choose chart
     st.selectbox(
         "Choose a chart:",
@@ -217,29 +301,44 @@ with left_col:
         )
 
 with right_col:
+    # The charts module (plotly.express and pandas) is only imported once a chart is drawn so
+    # that sessions which only use the quiz don't pay its import cost.
+
     # 3. Draw a line chart after the feature is selected
     if st.session_state.get("chart_choice") == "Trends" and st.session_state.get("trend_feature"):
+        from paralympics.charts import line_chart
+
         feature = str.lower(st.session_state.trend_feature)
         fig = line_chart(feature)
-        st.plotly_chart(fig, width="content")
+        with profile_block("st.plotly_chart"):
+            st.plotly_chart(fig, width="content")
 
     # 5. Draw one or more bar charts depending on pill selection
     if st.session_state.get("chart_choice") == "Participants by gender" and st.session_state.get(
             "bar_pills"):
+        from paralympics.charts import bar_chart
+
         for pill in st.session_state.bar_pills:
             event_type = str.lower(pill)
             fig = bar_chart(event_type)
-            st.plotly_chart(fig, width="content")
+            with profile_block("st.plotly_chart"):
+                st.plotly_chart(fig, width="content")
 
     # 6. Map chart displays once chosen
     if st.session_state.get("chart_choice") == "Paralympics locations":
+        from paralympics.charts import scatter_map
+
         fig = scatter_map()
-        st.plotly_chart(fig, width="content")
+        with profile_block("st.plotly_chart"):
+            st.plotly_chart(fig, width="content")
 
 # Full-width section
 st.divider()
 
 # Questions
 question_container = st.container()
-with question_container:
+with question_container, profile_block("render_question_block"):
     render_question_block()
+
+if profiler:
+    render_profile_panel(profiler)
@@ -0,0 +1,190 @@
+""" Opt-in render profiler for the Streamlit dashboard.
+
+Streamlit re-executes the whole dashboard script on every widget interaction. The profiler
+times named blocks of a single script run (API fetch, pandas shaping, Plotly construction,
+st.plotly_chart serialization, the quiz block, ...) so slow phases can be found.
+
+Profiling is off by default. Turn it on by setting the PARALYMPICS_PROFILE environment variable
+to 1, or by adding ?profile=1 to the dashboard URL. Each profiled run is appended as JSON lines
+to the file named by PARALYMPICS_PROFILE_FILE (default: render_profile.jsonl in the working
+directory) so timings can be aggregated across sessions.
+
+Usage:
+    with profile_block("api_fetch"):
+        df = get_api_data(url)
+
+    @profiled("line_chart")
+    def line_chart(feature): ...
+
+When no profiler is active for the current run, profile_block and profiled do nothing.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+from uuid import uuid4
+
+PROFILE_ENV = "PARALYMPICS_PROFILE"
+PROFILE_FILE_ENV = "PARALYMPICS_PROFILE_FILE"
+PROFILE_QUERY_PARAM = "profile"
+DEFAULT_PROFILE_FILE = "render_profile.jsonl"
+
+_TRUTHY = {"1", "true", "yes", "on"}
+
+_current: ContextVar[Optional["RenderProfiler"]] = ContextVar("paralympics_profiler",
+                                                              default=None)
+_file_lock = threading.Lock()
+
+
+@dataclass
+class TimingRecord:
+    """ Timing for one named block of a script run.
+
+    Attributes:
+        block: block name, nested blocks are joined with '/' e.g. line_chart/api_fetch
+        depth: nesting depth, 0 for top level blocks
+        start_ms: offset of the block start from the start of the run in milliseconds
+        duration_ms: wall clock duration of the block in milliseconds
+    """
+    block: str
+    depth: int
+    start_ms: float
+    duration_ms: float
+
+
+class RenderProfiler:
+    """ Collects the block timings for a single run of the dashboard script.
+
+    Attributes:
+        session_id: identifies the browser session the run belongs to
+        run_id: unique id for this script run
+        records: list of TimingRecord in the order the blocks finished
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.run_id = uuid4().hex
+        self.started_at = time.time()
+        self.records: List[TimingRecord] = []
+        self._t0 = time.perf_counter()
+        self._stack: List[str] = []
+
+    @contextmanager
+    def block(self, name: str) -> Iterator[None]:
+        """ Time the code inside the with statement as a block called name. """
+        self._stack.append(name)
+        path = "/".join(self._stack)
+        depth = len(self._stack) - 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self._stack.pop()
+            self.records.append(TimingRecord(block=path,
+                                             depth=depth,
+                                             start_ms=(start - self._t0) * 1000,
+                                             duration_ms=(end - start) * 1000))
+
+    def total_ms(self) -> float:
+        """ Return the time elapsed since the run started in milliseconds. """
+        return (time.perf_counter() - self._t0) * 1000
+
+    def summary(self) -> List[Dict]:
+        """ Return the records as dicts ordered by start time, for display in a table. """
+        return [asdict(r) for r in sorted(self.records, key=lambda r: r.start_ms)]
+
+    def write(self, path: Optional[Path] = None) -> Path:
+        """ Append the records for this run to a JSON lines file.
+
+        Args:
+            path: file to append to, defaults to profile_file()
+
+        Returns:
+            path: the file that was written
+        """
+        path = Path(path) if path else profile_file()
+        lines = []
+        for record in self.records:
+            entry = {"session_id": self.session_id,
+                     "run_id": self.run_id,
+                     "timestamp": self.started_at,
+                     **asdict(record)}
+            lines.append(json.dumps(entry))
+        with _file_lock:
+            with path.open("a", encoding="utf-8") as f:
+                for line in lines:
+                    f.write(line + "\n")
+        return path
+
+
+def profile_file() -> Path:
+    """ Return the path of the JSON lines file that timing records are appended to. """
+    return Path(os.environ.get(PROFILE_FILE_ENV, DEFAULT_PROFILE_FILE))
+
+
+def is_enabled(query_params: Optional[Dict[str, str]] = None) -> bool:
+    """ Return True if profiling is turned on by the environment or the URL query parameters.
+
+    Args:
+        query_params: the page query parameters, e.g. st.query_params
+    """
+    if os.environ.get(PROFILE_ENV, "").lower() in _TRUTHY:
+        return True
+    if query_params is not None:
+        return str(query_params.get(PROFILE_QUERY_PARAM, "")).lower() in _TRUTHY
+    return False
+
+
+def begin_run(enabled: bool, session_id: str) -> Optional[RenderProfiler]:
+    """ Start profiling a script run, or turn profiling off for it.
+
+    Call once at the top of the script. Any profiler left over from an earlier run, for example
+    one interrupted by st.rerun(), is replaced.
+
+    Args:
+        enabled: whether this run should be profiled
+        session_id: identifies the browser session
+
+    Returns:
+        The active RenderProfiler, or None if profiling is disabled
+    """
+    profiler = RenderProfiler(session_id) if enabled else None
+    _current.set(profiler)
+    return profiler
+
+
+def current() -> Optional[RenderProfiler]:
+    """ Return the profiler for the current run, or None if profiling is disabled. """
+    return _current.get()
+
+
+@contextmanager
+def profile_block(name: str) -> Iterator[None]:
+    """ Time a block of code if a profiler is active, otherwise do nothing. """
+    profiler = _current.get()
+    if profiler is None:
+        yield
+        return
+    with profiler.block(name):
+        yield
+
+
+def profiled(name: str) -> Callable:
+    """ Decorator that times every call of the decorated function as a block called name. """
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with profile_block(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,101 @@
+""" Shared read-only quiz catalogue and the per-session quiz progress.
+
+The dashboard used to fetch each question and its responses through st.cache_data, which
+returns a copy (unpickled) of the cached value on every call, for every session. The quiz
+data is instead loaded once into a QuizCatalogue of immutable tuples, returned from
+st.cache_resource so every session shares the same object. Each session only keeps a small
+QuizProgress record in st.session_state.
+
+Usage:
+    catalogue = load_catalogue(question_rows, response_rows)
+    question = catalogue.question(progress.q_index)
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+
+
+class Response(NamedTuple):
+    """ A response option for a question. """
+    id: int
+    text: str
+    is_correct: bool
+
+
+class Question(NamedTuple):
+    """ A question with its response options in id order. """
+    id: int
+    text: str
+    responses: Tuple[Response, ...]
+
+    def response(self, response_id: int) -> Optional[Response]:
+        """ Return the response with the id, or None if it isn't one of this question's. """
+        return next((r for r in self.responses if r.id == response_id), None)
+
+
+class QuizCatalogue:
+    """ Immutable, ordered collection of the quiz questions, shared by every session.
+
+    Questions are numbered from 1 in question id order, matching QuizProgress.q_index.
+    """
+    __slots__ = ("_questions",)
+
+    def __init__(self, questions: Iterable[Question]):
+        object.__setattr__(self, "_questions", tuple(questions))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("QuizCatalogue is read-only")
+
+    def __len__(self) -> int:
+        return len(self._questions)
+
+    def question(self, number: int) -> Optional[Question]:
+        """ Return the question by its number from 1, or None if there is no such question. """
+        if 1 <= number <= len(self._questions):
+            return self._questions[number - 1]
+        return None
+
+
+@dataclass(slots=True)
+class QuizProgress:
+    """ One session's progress through the quiz.
+
+    Attributes:
+        q_index: number of the current question, from 1; past the last question when complete
+        score: number of questions answered correctly at the first attempt
+        missed: True if a wrong answer has been given to the current question
+    """
+    q_index: int = 1
+    score: int = 0
+    missed: bool = False
+
+    def answer(self, correct: bool) -> None:
+        """ Record an answer to the current question, moving to the next one if correct. """
+        if not correct:
+            self.missed = True
+            return
+        if not self.missed:
+            self.score += 1
+        self.missed = False
+        self.q_index += 1
+
+
+def load_catalogue(questions: Iterable[Dict[str, Any]],
+                   responses: Iterable[Dict[str, Any]]) -> QuizCatalogue:
+    """ Build the catalogue from the question and response table rows.
+
+    Args:
+        questions: rows of the question table (id, question_text)
+        responses: rows of the response table (id, question_id, response_text, is_correct).
+            Responses without text are left out.
+
+    Returns:
+        QuizCatalogue
+    """
+    by_question: Dict[int, list] = {}
+    for r in sorted(responses, key=lambda r: r["id"]):
+        if r.get("response_text"):
+            by_question.setdefault(r["question_id"], []).append(
+                Response(r["id"], r["response_text"], bool(r.get("is_correct"))))
+    return QuizCatalogue(
+        Question(q["id"], q.get("question_text", ""), tuple(by_question.get(q["id"], ())))
+        for q in sorted(questions, key=lambda q: q["id"]))
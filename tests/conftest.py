@@ -1,14 +1,21 @@
+import os
 import shutil
+import socket
 import subprocess
+import tempfile
 import threading
 import time
 from pathlib import Path
+from urllib.parse import urlsplit
 from urllib.request import urlopen
 
 import pytest
 import uvicorn
 from streamlit.testing.v1 import AppTest
 
+from data.paralympics_data import DATABASE_ENV
+from paralympics.config import API_BASE_ENV, api_base
+
 
 def wait_for_http(url, timeout=10):
     start = time.time()
@@ -22,51 +29,60 @@ def wait_for_http(url, timeout=10):
             time.sleep(0.1)
 
 
+def free_port():
+    """Return a TCP port that is free on this machine."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def pytest_configure(config):
+    """Give this test process (each pytest-xdist worker) its own database copy and API port.
+
+    Runs before the test modules are imported, so the environment variables are set before
+    the REST API creates its ParalympicsData and before tests read the API URL.
+    """
+    root = Path(__file__).parent.parent
+    tmp_dir = Path(tempfile.mkdtemp(prefix="paralympics-tests-"))
+    db_copy = tmp_dir.joinpath("paralympics.db")
+    shutil.copy2(root.joinpath("src", "data", "paralympics.db"), db_copy)
+    config.paralympics_tmp_dir = tmp_dir
+    os.environ[DATABASE_ENV] = str(db_copy)
+    os.environ[API_BASE_ENV] = f"http://127.0.0.1:{free_port()}"
+
+
+def pytest_unconfigure(config):
+    tmp_dir = getattr(config, "paralympics_tmp_dir", None)
+    if tmp_dir:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
 @pytest.fixture(scope="session", autouse=True)
 def api_server():
     """Start the REST API server before Dash app tests.
 
-     Makes a copy of the database before the server starts, and to replace
-     the original at the end of the tests.
-     NB this is not a recommended approach, this will be covered when the REST API is tested
+     The server uses this test process's own copy of the database (see pytest_configure), so
+     tests can add rows without changing src/data/paralympics.db, and several test processes
+     can run at once on their own ports.
     """
-
-    # Create a copy of the database
-    root = Path(__file__).parent.parent
-    _orig_db = root.joinpath("src", "data", "paralympics.db")
-    _backup_db = _orig_db.with_suffix(_orig_db.suffix + ".orig")
-
-    if not _orig_db.exists():
-        raise RuntimeError(f"Original DB not found: {_orig_db}")
-
-    # backup original
-    shutil.copy2(_orig_db, _backup_db)
-
-    from data.api import app
-
-    thread = threading.Thread(
-        target=uvicorn.run,
-        kwargs={
-            "app": app,
-            "host": "127.0.0.1",
-            "port": 8000,
-            "reload": False
-        },
-        daemon=True,
-    )
+    from data.api import app, data
+
+    api_url = urlsplit(api_base())
+    # A Server rather than uvicorn.run so it can be stopped before the database is closed,
+    # otherwise open /events streams keep reading (and reopening) the database
+    server = uvicorn.Server(uvicorn.Config(app, host=api_url.hostname, port=api_url.port,
+                                           reload=False, timeout_graceful_shutdown=2))
+    thread = threading.Thread(target=server.run, daemon=True)
     thread.start()
 
-    wait_for_http("http://127.0.0.1:8000")
+    wait_for_http(api_base())
 
     yield
 
-    # Teardown: restore original DB
-    if _backup_db.exists():
-        shutil.copy2(_backup_db, _orig_db)
-        try:
-            _backup_db.unlink()
-        except Exception:
-            pass
+    # Teardown: stop the server, then stop the writer and close the connections
+    server.should_exit = True
+    thread.join(timeout=10)
+    data.close()
 
 
 @pytest.fixture(scope="session")
@@ -74,7 +90,7 @@ def app_server():
     """Start a Streamlit app server for Playwright tests using the subprocess library."""
 
     app_path = "src/paralympics/paralympics_dashboard.py"
-    port = "8501"
+    port = str(free_port())
     url = f"http://127.0.0.1:{port}"
 
     process = subprocess.Popen([
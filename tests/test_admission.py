@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+from data.admission import (AdmissionController, AdmissionMiddleware, RouteLimit,
+                            parse_limits)
+
+
+class SlowApp:
+    """ ASGI app that answers 200 with the path, once release is set, counting its calls """
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        await self.release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": scope["path"].encode()})
+
+
+async def _request(app, path, query=b"", method="GET"):
+    """ Send a request to an ASGI app and return the status, headers and body """
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    await app({"type": "http", "method": method, "path": path, "query_string": query},
+              receive, send)
+    start, body = messages
+    return start["status"], dict(start["headers"]), body["body"]
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_identical_gets_coalesced():
+    """
+    GIVEN a route with a concurrency limit
+    WHEN five identical GET requests and one with a different query arrive together
+    THEN the app runs twice, once per distinct request
+    AND every request gets the response
+    """
+    async def _test():
+        app = SlowApp()
+        controller = AdmissionController([RouteLimit("*", 4, 10)])
+        middleware = AdmissionMiddleware(app, controller)
+        tasks = [asyncio.create_task(_request(middleware, "/all")) for _ in range(5)]
+        tasks.append(asyncio.create_task(_request(middleware, "/all", b"year=2012")))
+        await asyncio.sleep(0.01)
+        app.release.set()
+        results = await asyncio.gather(*tasks)
+        return app.calls, results, controller.metrics()
+
+    calls, results, metrics = _run(_test())
+    assert calls == 2
+    assert all(r == (200, {}, b"/all") for r in results)
+    assert metrics["routes"][0]["coalesced"] == 4 and metrics["in_flight"] == 0
+
+
+def test_full_queue_sheds_with_retry_after():
+    """
+    GIVEN a route limited to 1 request at a time with a queue of 1
+    WHEN three different requests arrive together
+    THEN the third is rejected straight away with 503 and Retry-After
+    AND the other two complete once the first finishes
+    """
+    async def _test():
+        app = SlowApp()
+        controller = AdmissionController([RouteLimit("*", 1, 1)], retry_after=2)
+        middleware = AdmissionMiddleware(app, controller)
+        tasks = [asyncio.create_task(_request(middleware, f"/team/{i}")) for i in range(3)]
+        await asyncio.sleep(0.01)
+        shed = tasks[2].result() if tasks[2].done() else None
+        stats = dict(controller.metrics()["routes"][0])
+        app.release.set()
+        return shed, stats, await asyncio.gather(*tasks[:2]), controller.metrics()
+
+    shed, during, done, after = _run(_test())
+    assert shed[0] == 503 and shed[1][b"retry-after"] == b"2"
+    assert during["active"] == 1 and during["queued"] == 1
+    assert [status for status, _, _ in done] == [200, 200]
+    assert after["routes"][0]["shed"] == 1 and after["routes"][0]["admitted"] == 2
+
+
+def test_queue_timeout_sheds():
+    """
+    GIVEN a route limited to 1 request at a time and a short queue timeout
+    WHEN a second request waits longer than the timeout
+    THEN it is rejected with 503
+    """
+    async def _test():
+        app = SlowApp()
+        controller = AdmissionController([RouteLimit("*", 1, 5)], queue_timeout=0.05)
+        middleware = AdmissionMiddleware(app, controller)
+        first = asyncio.create_task(_request(middleware, "/host"))
+        status, _, _ = await _request(middleware, "/country")
+        app.release.set()
+        await first
+        return status
+
+    assert _run(_test()) == 503
+
+
+def test_exempt_and_post_requests_not_coalesced():
+    """
+    GIVEN the default exempt paths
+    WHEN identical /events requests and identical POST requests arrive together
+    THEN each one runs the app
+    """
+    async def _test():
+        app = SlowApp()
+        controller = AdmissionController([RouteLimit("*", 4, 10)])
+        middleware = AdmissionMiddleware(app, controller)
+        tasks = [asyncio.create_task(_request(middleware, "/events")) for _ in range(2)]
+        tasks += [asyncio.create_task(_request(middleware, "/score", method="POST"))
+                  for _ in range(2)]
+        await asyncio.sleep(0.01)
+        app.release.set()
+        await asyncio.gather(*tasks)
+        return app.calls
+
+    assert _run(_test()) == 4
+
+
+def test_parse_limits():
+    """
+    GIVEN PARALYMPICS_ADMISSION settings
+    WHEN they are parsed
+    THEN the limits are in order and exports are not coalesced
+    AND an invalid setting raises ValueError
+    """
+    assert parse_limits("*/export=1/2,*=8/64") == (RouteLimit("*/export", 1, 2, coalesce=False),
+                                                   RouteLimit("*", 8, 64))
+    with pytest.raises(ValueError):
+        parse_limits("/all=4")
@@ -0,0 +1,196 @@
+import requests
+
+from paralympics.config import api_base
+
+API_URL = api_base()
+
+
+def test_post_returns_inserted_row():
+    """
+    GIVEN the REST API
+    WHEN a new score is posted
+    THEN the inserted row is returned with its new id
+    AND the row can be fetched by that id
+    """
+    resp = requests.post(f"{API_URL}/score",
+                         json={"first_name": "Ada", "last_name": "Lovelace", "score": 4})
+    assert resp.status_code == 200
+    row = resp.json()
+    assert row["first_name"] == "Ada" and row["score"] == 4
+    assert requests.get(f"{API_URL}/score/{row['id']}").json() == row
+
+
+def test_post_text_primary_key_returns_inserted_row():
+    """
+    GIVEN the team table which has a text primary key (code)
+    WHEN a new team is posted
+    THEN the row returned is the team that was inserted, not a row looked up by rowid
+    AND it can be fetched by its code
+    """
+    team = {"code": "ZZZ", "name": "Test team", "member_type": "team", "region": "Europe"}
+    row = requests.post(f"{API_URL}/team", json=team).json()
+    assert row["code"] == "ZZZ" and row["name"] == "Test team"
+    assert requests.get(f"{API_URL}/team/ZZZ").json()["name"] == "Test team"
+
+
+def test_metrics_report_statement_reuse():
+    """
+    GIVEN the REST API
+    WHEN the same search is requested twice
+    THEN the metrics show the generated statement was reused
+    """
+    before = requests.get(f"{API_URL}/metrics").json()["statements"]["hits"]
+    for _ in range(2):
+        resp = requests.get(f"{API_URL}/games/search", params={"event_type": "winter"})
+        assert resp.status_code == 200
+    after = requests.get(f"{API_URL}/metrics").json()["statements"]
+    assert after["hits"] >= before + 1
+    assert 0 < after["hit_rate"] <= 1
+
+
+def test_all_summary_matches_all_data():
+    """
+    GIVEN the REST API
+    WHEN participants are summed by event type using /all/summary
+    THEN the totals match those calculated from /all
+    """
+    rows = requests.get(f"{API_URL}/all").json()
+    expected = {}
+    for row in rows:
+        expected[row["event_type"]] = (expected.get(row["event_type"], 0)
+                                       + (row["participants"] or 0))
+    resp = requests.get(f"{API_URL}/all/summary",
+                        params={"group_by": "event_type", "value": "participants"})
+    assert resp.status_code == 200
+    assert {r["event_type"]: r["sum"] for r in resp.json()} == expected
+
+
+def test_all_search_invalid_column_is_bad_request():
+    """
+    GIVEN the REST API
+    WHEN /all/search is asked for a column that does not exist
+    THEN a 400 response is returned
+    """
+    resp = requests.get(f"{API_URL}/all/search", params={"columns": "year,nope"})
+    assert resp.status_code == 400
+
+
+def test_geo_clusters_for_viewport():
+    """
+    GIVEN the REST API
+    WHEN the host clusters for the whole world at zoom 0 and for Europe at zoom 6 are requested
+    THEN zoom 0 returns a single cluster of every host
+    AND the European viewport returns European hosts but not Tokyo
+    """
+    world = requests.get(f"{API_URL}/geo/clusters", params={"zoom": 0}).json()
+    assert len(world["clusters"]) == 1
+    assert world["clusters"][0]["count"] == world["points"]
+    europe = requests.get(f"{API_URL}/geo/clusters",
+                          params={"zoom": 6, "min_lat": 35, "min_lon": -10, "max_lat": 60,
+                                  "max_lon": 30}).json()
+    names = [name for c in europe["clusters"] for name in c["names"]]
+    assert "Barcelona" in names and "Tokyo" not in names
+    assert requests.get(f"{API_URL}/geo/clusters", params={"zoom": 40}).status_code == 400
+
+
+def test_leaderboard_ranks_posted_scores():
+    """
+    GIVEN the REST API
+    WHEN a player posts two attempts to /score
+    THEN the leaderboard has their best score and two attempts
+    AND their rank can be requested by name
+    """
+    for score in (2, 9):
+        requests.post(f"{API_URL}/score",
+                      json={"first_name": "Leader", "last_name": "Board", "score": score})
+    top = requests.get(f"{API_URL}/leaderboard", params={"limit": 100}).json()
+    entry = next(p for p in top if p["first_name"] == "Leader")
+    assert entry["best"] == 9 and entry["attempts"] == 2
+    rank = requests.get(f"{API_URL}/leaderboard/rank",
+                        params={"first_name": "Leader", "last_name": "Board"}).json()
+    assert rank["rank"] == entry["rank"] and rank["players"] >= 1
+    assert requests.get(f"{API_URL}/leaderboard/rank",
+                        params={"first_name": "No", "last_name": "One"}).status_code == 404
+
+
+def test_get_by_ids_in_request_order():
+    """
+    GIVEN the REST API
+    WHEN hosts are requested with ?ids= in a mixed order including an id that doesn't exist
+    THEN the rows are returned in the requested order and the unknown id is reported missing
+    """
+    resp = requests.get(f"{API_URL}/host", params={"ids": "3,1,99999,2"})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert [row["id"] for row in body["rows"]] == [3, 1, 2]
+    assert body["missing"] == ["99999"]
+
+
+def test_batch_get_chunks_large_requests():
+    """
+    GIVEN the REST API
+    WHEN more ids than fit in one SQL statement are posted to /games/batch_get
+    THEN every existing games row is returned once, in order, and the rest are missing
+    """
+    games = requests.get(f"{API_URL}/games").json()
+    ids = list(range(1, 1201))
+    resp = requests.post(f"{API_URL}/games/batch_get", json={"ids": ids})
+    assert resp.status_code == 200
+    body = resp.json()
+    existing = {g["id"] for g in games}
+    assert [row["id"] for row in body["rows"]] == [i for i in ids if i in existing]
+    assert len(body["missing"]) == len(ids) - len(existing)
+    assert requests.post(f"{API_URL}/games/batch_get", json=[1, 2]).status_code == 400
+
+
+def test_expand_nests_related_rows():
+    """
+    GIVEN the REST API
+    WHEN a games row is requested with expand=host.country,team,disability
+    THEN the hosts with their countries, the teams and the disabilities are nested in the row
+    AND an unknown relation is a 400 error
+    """
+    game = requests.get(f"{API_URL}/games/1",
+                        params={"expand": "host.country,team,disability"}).json()
+    links = requests.get(f"{API_URL}/games_host/search", params={"games_id": 1}).json()
+    assert sorted(h["id"] for h in game["host"]) == sorted(l["host_id"] for l in links)
+    for host in game["host"]:
+        assert host["country"]["id"] == host["country_id"]
+    assert isinstance(game["team"], list) and isinstance(game["disability"], list)
+    all_games = requests.get(f"{API_URL}/games", params={"expand": "host"}).json()
+    assert all("host" in g for g in all_games)
+    assert requests.get(f"{API_URL}/games", params={"expand": "nothing"}).status_code == 400
+
+
+def test_search_finds_games_highlights():
+    """
+    GIVEN the REST API
+    WHEN the games are searched for 'wheelchair'
+    THEN the results are games whose highlights contain the word
+    AND a search without any words is a 400 error
+    """
+    body = requests.get(f"{API_URL}/search",
+                        params={"q": "wheelchair", "tables": "games"}).json()
+    assert body["results"]
+    for result in body["results"]:
+        game = requests.get(f"{API_URL}/games/{result['key']}").json()
+        assert "wheelchair" in game["highlights"].lower()
+    assert requests.get(f"{API_URL}/search", params={"q": "?!"}).status_code == 400
+
+
+def test_export_downloads_table_and_all_data():
+    """
+    GIVEN the REST API
+    WHEN the games table and the chart dataset are exported as CSV
+    THEN every row is downloaded as an attachment
+    AND an unknown format is a 400 error
+    """
+    resp = requests.get(f"{API_URL}/games/export", params={"format": "csv"})
+    assert resp.status_code == 200
+    assert resp.headers["content-disposition"] == 'attachment; filename="games.csv"'
+    lines = resp.text.splitlines()
+    assert len(lines) == len(requests.get(f"{API_URL}/games").json()) + 1
+    all_lines = requests.get(f"{API_URL}/all/export").text.splitlines()
+    assert all_lines[0].startswith("country_name,event_type,year")
+    assert len(all_lines) == len(requests.get(f"{API_URL}/all").json()) + 1
+    assert requests.get(f"{API_URL}/games/export", params={"format": "json"}).status_code == 400
@@ -0,0 +1,138 @@
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import pytest
+import requests
+
+from data.paralympics_data import ParalympicsData
+from data.snapshot import read_table_versions
+from paralympics.config import api_base
+
+API_URL = api_base()
+DATABASE = Path(__file__).parent.parent.joinpath("src", "data", "paralympics.db")
+
+
+@pytest.fixture()
+def data(tmp_path):
+    """ ParalympicsData using a copy of the database, with snapshots in tmp_path/backups """
+    db = tmp_path / "paralympics.db"
+    shutil.copy2(DATABASE, db)
+    data = ParalympicsData(database_file=db)
+    yield data
+    data.close()
+
+
+def _score(name, score):
+    return {"first_name": name, "last_name": "Backup", "score": score}
+
+
+def _count(db, table):
+    with sqlite3.connect(db) as conn:
+        count = conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+    conn.close()
+    return count
+
+
+def test_snapshot_while_writing_is_consistent(data):
+    """
+    GIVEN a database that rows are being added to
+    WHEN a snapshot is taken a few pages at a time
+    THEN progress is reported after each step
+    AND the snapshot is a complete, standalone database holding the rows committed before it
+    """
+    before = len(data.get_table_as_json("score"))
+    stop = threading.Event()
+
+    def _write():
+        i = 0
+        while not stop.is_set():
+            data.add_row("score", _score(f"w{i}", i % 5))
+            i += 1
+
+    writer = threading.Thread(target=_write)
+    writer.start()
+    steps = []
+    try:
+        path = data.backup("during-writes.db", pages=4,
+                           progress=lambda remaining, total: steps.append((remaining, total)))
+    finally:
+        stop.set()
+        writer.join()
+
+    assert path == data.database_file.parent / "backups" / "during-writes.db"
+    assert len(steps) > 1 and steps[-1][0] == 0
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    conn.close()
+    assert _count(path, "score") >= before
+    assert [s["name"] for s in data.list_backups()] == ["during-writes.db"]
+
+
+def test_restore_replaces_data_and_bumps_versions(data):
+    """
+    GIVEN a snapshot taken before some scores were added
+    WHEN the snapshot is restored
+    THEN the scores added since the snapshot are gone, from the tables and the leaderboard
+    AND every table's version is higher than before the restore
+    """
+    data.backup("before.db")
+    before = len(data.get_table_as_json("score"))
+    data.add_row("score", _score("Lost", 99))
+    with sqlite3.connect(data.database_file) as conn:
+        versions = read_table_versions(conn, data.tables)
+    conn.close()
+
+    steps = []
+    data.restore("before.db", pages=8,
+                 progress=lambda remaining, total: steps.append(remaining))
+
+    assert steps and steps[-1] == 0
+    assert len(data.get_table_as_json("score")) == before
+    assert data.get_player_rank("Lost", "Backup") is None
+    with sqlite3.connect(data.database_file) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        restored = read_table_versions(conn, data.tables)
+    conn.close()
+    assert all(restored[t] > versions[t] for t in data.tables)
+    # Writes carry on after the restore
+    assert data.add_row("score", _score("After", 1))["first_name"] == "After"
+
+
+def test_snapshot_names_are_checked(data):
+    """
+    GIVEN snapshot names that are not plain .db file names, or don't exist
+    WHEN a snapshot or restore is requested
+    THEN ValueError or FileNotFoundError is raised
+    """
+    with pytest.raises(ValueError):
+        data.backup("../outside.db")
+    with pytest.raises(ValueError):
+        data.backup("no-suffix")
+    with pytest.raises(FileNotFoundError):
+        data.restore("missing.db")
+
+
+def test_api_snapshot_job_reports_progress():
+    """
+    GIVEN the REST API
+    WHEN a snapshot is started
+    THEN the job can be polled until it is done
+    AND the snapshot is listed
+    """
+    resp = requests.post(f"{API_URL}/admin/snapshot", params={"name": "api-test.db"})
+    assert resp.status_code == 202
+    job = resp.json()
+    deadline = time.time() + 10
+    while job["status"] == "running" and time.time() < deadline:
+        time.sleep(0.05)
+        job = requests.get(f"{API_URL}/admin/jobs/{job['id']}").json()
+    assert job["status"] == "done" and job["pages_remaining"] == 0 and job["pages_total"] > 0
+    names = [s["name"] for s in requests.get(f"{API_URL}/admin/snapshots").json()]
+    assert "api-test.db" in names
+    assert requests.post(f"{API_URL}/admin/restore",
+                         params={"name": "missing.db"}).status_code == 404
+    assert requests.get(f"{API_URL}/admin/jobs/unknown").status_code == 404
@@ -0,0 +1,66 @@
+import asyncio
+import sqlite3
+import threading
+
+from data.changes import ChangeFeed
+from data.snapshot import VERSION_BUMP_SQL, VERSION_TABLE_SQL
+
+
+def test_change_published_from_another_thread_reaches_subscriber():
+    """
+    GIVEN a subscriber to the change feed
+    WHEN a change is published from another thread, e.g. after a database write
+    THEN the subscriber receives it
+    """
+    feed = ChangeFeed()
+
+    async def _receive():
+        subscriber = feed.subscribe()
+        threading.Thread(target=feed.publish, args=("question", 3, [5])).start()
+        change = await asyncio.wait_for(subscriber[1].get(), 5)
+        feed.unsubscribe(subscriber)
+        return change
+
+    change = asyncio.run(_receive())
+    assert (change.table, change.version, change.pks) == ("question", 3, [5])
+    assert feed.subscriber_count() == 0
+
+
+def test_subscriber_catches_up_from_last_id():
+    """
+    GIVEN three changes have been published
+    WHEN a client reconnects with the id of the first change
+    THEN it receives the two changes it missed
+    """
+    feed = ChangeFeed()
+    first = feed.publish("question", 1, [1])
+    feed.publish("response", 1, [1])
+    feed.publish("response", 2, [2])
+
+    async def _missed():
+        _, queue = feed.subscribe(last_id=first.id)
+        return [queue.get_nowait() for _ in range(queue.qsize())]
+
+    assert [(c.table, c.version) for c in asyncio.run(_missed())] == [("response", 1),
+                                                                      ("response", 2)]
+
+
+def test_poll_database_publishes_writes_by_other_processes(tmp_path):
+    """
+    GIVEN a change feed that has polled the database once
+    WHEN another connection (standing in for another API worker) writes to a table
+    THEN the next poll publishes a change for that table only
+    """
+    db = tmp_path / "test.db"
+    other = sqlite3.connect(db, isolation_level=None)
+    other.execute(VERSION_TABLE_SQL)
+    other.execute(VERSION_BUMP_SQL, ("question",)).fetchone()
+    feed = ChangeFeed()
+    conn = sqlite3.connect(db)
+    assert feed.poll_database(conn) == []
+    other.execute(VERSION_BUMP_SQL, ("score",)).fetchone()
+    changes = feed.poll_database(conn)
+    assert [(c.table, c.version, c.pks) for c in changes] == [("score", 1, [])]
+    assert feed.poll_database(conn) == []
+    conn.close()
+    other.close()
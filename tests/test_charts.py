@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+from paralympics.charts import bar_figure, downsample, line_figure, lttb_indices
+
+
+def make_series(n):
+    """ Two event_type series of n points each with a spike in the middle of the summer one """
+    years = np.arange(n)
+    summer = np.sin(years / 50.0)
+    summer[n // 2] = 100.0
+    return pd.DataFrame({"event_type": ["summer"] * n + ["winter"] * n,
+                         "year": np.concatenate([years, years]),
+                         "participants": np.concatenate([summer, np.cos(years / 50.0)])})
+
+
+def test_lttb_keeps_end_points_and_peaks():
+    """
+    GIVEN a series of 10,000 points with a single spike
+    WHEN it is downsampled to 100 points with LTTB
+    THEN 100 ascending positions are returned including the first, last and spike points
+    """
+    y = np.sin(np.arange(10_000) / 100.0)
+    y[4321] = 50.0
+    indices = lttb_indices(np.arange(10_000), y, 100)
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == 9_999
+    assert np.all(np.diff(indices) > 0)
+    assert 4321 in indices
+
+
+def test_downsample_within_budget_is_unchanged():
+    """
+    GIVEN a DataFrame with fewer rows than the budget
+    WHEN it is downsampled
+    THEN the same DataFrame is returned
+    """
+    df = make_series(10)
+    assert downsample(df, "year", "participants", budget=100, group="event_type") is df
+
+
+def test_line_figure_downsamples_and_uses_webgl():
+    """
+    GIVEN two series of 50,000 points and a point budget of 2,000
+    WHEN the line figure is created
+    THEN each series is a Scattergl trace, the total points are within the budget and the
+    spike is still plotted
+    """
+    fig = line_figure(make_series(50_000), "participants", budget=2_000)
+    assert {trace.type for trace in fig.data} == {"scattergl"}
+    assert sum(len(trace.x) for trace in fig.data) <= 2_000
+    assert max(max(trace.y) for trace in fig.data) == 100.0
+
+
+def test_line_figure_small_uses_svg():
+    """
+    GIVEN a series below the WebGL threshold
+    WHEN the line figure is created
+    THEN it uses SVG scatter traces with every point
+    """
+    fig = line_figure(make_series(100), "participants", budget=2_000)
+    assert {trace.type for trace in fig.data} == {"scatter"}
+    assert sum(len(trace.x) for trace in fig.data) == 200
+
+
+def test_bar_figure_downsamples_bars():
+    """
+    GIVEN 5,000 bars and a budget of 500
+    WHEN the bar figure is created
+    THEN each of the Male and Female traces has 500 bars
+    """
+    n = 5_000
+    female = np.linspace(0.1, 0.5, n)
+    df_plot = pd.DataFrame({"year": np.arange(n), "xlabel": [f"Place {i}" for i in range(n)],
+                            "Male": 1 - female, "Female": female})
+    fig = bar_figure(df_plot, budget=500)
+    assert [len(trace.x) for trace in fig.data] == [500, 500]
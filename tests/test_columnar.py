@@ -0,0 +1,72 @@
+import pytest
+
+from data.columnar import ColumnarDataset
+
+ROWS = [
+    {"event_type": "summer", "year": 1960, "place_name": "Rome", "participants": 209,
+     "participants_m": None, "latitude": 41.9},
+    {"event_type": "winter", "year": 1976, "place_name": "Ornskoldsvik", "participants": 196,
+     "participants_m": 159, "latitude": 63.3},
+    {"event_type": "summer", "year": 1976, "place_name": "Toronto", "participants": 1657,
+     "participants_m": 1404, "latitude": None},
+    {"event_type": "winter", "year": 1994, "place_name": "Lillehammer", "participants": 471,
+     "participants_m": 379, "latitude": 61.1},
+]
+
+
+@pytest.fixture()
+def dataset():
+    return ColumnarDataset(ROWS)
+
+
+def test_round_trip_rows(dataset):
+    """
+    GIVEN a columnar dataset
+    WHEN all rows are selected
+    THEN the rows are the same as the source rows, including nulls and integer types
+    """
+    assert dataset.select() == ROWS
+    assert dataset.kinds["event_type"] == "category"
+    assert dataset.kinds["participants_m"] == "int"
+
+
+def test_filter_equality_range_and_projection(dataset):
+    """
+    GIVEN a columnar dataset
+    WHEN it is filtered with query parameter strings for a category and a year range
+    THEN only the matching rows are returned with the requested columns
+    """
+    rows = dataset.filter({"event_type": "winter", "year_min": "1980", "unknown": "x"},
+                          columns=["year", "place_name"])
+    assert rows == [{"year": 1994, "place_name": "Lillehammer"}]
+    assert dataset.filter({"event_type": "spring"}) == []
+
+
+def test_group_by_aggregates(dataset):
+    """
+    GIVEN a columnar dataset
+    WHEN rows are grouped by event_type
+    THEN sum, count and max ignore nulls and match the source data
+    """
+    assert dataset.group_by(["event_type"], "participants", "sum") == [
+        {"event_type": "summer", "sum": 1866}, {"event_type": "winter", "sum": 667}]
+    assert dataset.group_by(["event_type"], "participants_m", "count") == [
+        {"event_type": "summer", "count": 1}, {"event_type": "winter", "count": 2}]
+    assert dataset.group_by(["year", "event_type"], "participants", "max",
+                            mask=dataset.filter_mask({"year": "1976"})) == [
+        {"year": 1976, "event_type": "summer", "max": 1657},
+        {"year": 1976, "event_type": "winter", "max": 196}]
+
+
+def test_invalid_queries_raise_value_error(dataset):
+    """
+    GIVEN a columnar dataset
+    WHEN an unknown aggregate, a range on a text column or an unknown column is requested
+    THEN a ValueError is raised
+    """
+    with pytest.raises(ValueError):
+        dataset.group_by(["event_type"], "participants", "median")
+    with pytest.raises(ValueError):
+        dataset.mask(ranges={"place_name": ("A", "B")})
+    with pytest.raises(ValueError):
+        dataset.select(["nope"])
@@ -0,0 +1,73 @@
+import pytest
+
+from data.geo import GeoGridIndex, zoom_for_span
+
+POINTS = [
+    {"id": 1, "place_name": "Rome", "latitude": 41.89, "longitude": 12.48},
+    {"id": 2, "place_name": "Turin", "latitude": 45.07, "longitude": 7.69},
+    {"id": 3, "place_name": "Tokyo", "latitude": 35.68, "longitude": 139.69},
+    {"id": 4, "place_name": "Sydney", "latitude": -33.87, "longitude": 151.21},
+    {"id": 5, "place_name": "Vancouver", "latitude": 49.28, "longitude": -123.12},
+    {"id": 6, "place_name": "Nowhere", "latitude": None, "longitude": None},
+]
+
+
+@pytest.fixture()
+def index():
+    return GeoGridIndex(POINTS)
+
+
+def test_every_zoom_level_clusters_all_points(index):
+    """
+    GIVEN a grid index of locations, one without coordinates
+    WHEN the clusters for the whole world are requested at each zoom level
+    THEN the cluster counts add up to the number of located points
+    AND zoom 0 is one cluster while a high zoom has one cluster per location
+    """
+    assert index.size == 5
+    for zoom in range(index.max_zoom + 1):
+        assert sum(c["count"] for c in index.clusters(zoom)) == 5
+    assert len(index.clusters(0)) == 1
+    assert {c["id"] for c in index.clusters(10)} == {1, 2, 3, 4, 5}
+
+
+def test_only_clusters_in_viewport_returned(index):
+    """
+    GIVEN a grid index of locations
+    WHEN the clusters in a viewport around Italy are requested
+    THEN only the Italian locations are returned
+    """
+    clusters = index.clusters(10, (35.0, 5.0, 50.0, 20.0))
+    assert sorted(name for c in clusters for name in c["names"]) == ["Rome", "Turin"]
+
+
+def test_viewport_across_antimeridian(index):
+    """
+    GIVEN a grid index of locations
+    WHEN a viewport from Sydney east across the 180th meridian to Vancouver is requested
+    THEN both Sydney and Vancouver are returned but not Tokyo
+    """
+    clusters = index.clusters(8, (-50.0, 150.0, 60.0, -120.0))
+    assert sorted(name for c in clusters for name in c["names"]) == ["Sydney", "Vancouver"]
+
+
+def test_invalid_zoom_or_bounds(index):
+    """
+    GIVEN a grid index
+    WHEN an out of range zoom or latitude is requested
+    THEN a ValueError is raised
+    """
+    with pytest.raises(ValueError):
+        index.clusters(index.max_zoom + 1)
+    with pytest.raises(ValueError):
+        index.clusters(2, (10.0, 0.0, -10.0, 20.0))
+
+
+def test_zoom_for_span():
+    """
+    GIVEN viewport widths
+    WHEN a zoom level is chosen
+    THEN the world gives a low zoom and a narrow viewport a higher one
+    """
+    assert zoom_for_span(360) == 4
+    assert zoom_for_span(10) > zoom_for_span(360)
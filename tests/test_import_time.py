@@ -0,0 +1,62 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict
+
+SRC_DIR = Path(__file__).parent.parent.joinpath("src")
+APP_FILE = SRC_DIR.joinpath("paralympics", "paralympics_dashboard.py")
+
+# Modules that should only be imported when a chart or the Excel data is first used
+HEAVY_MODULES = ("pandas", "plotly.express", "openpyxl")
+
+# Cumulative import time budget for the API module, in microseconds. Without pandas the import
+# takes well under half of this; importing pandas eagerly again pushes it over.
+API_IMPORT_BUDGET_US = 1_000_000
+
+
+def import_times(code: str) -> Dict[str, int]:
+    """ Run code in a fresh interpreter with -X importtime.
+
+    Args:
+        code: Python code to run
+
+    Returns:
+        Dict of module name to cumulative import time in microseconds
+    """
+    env = {**os.environ, "PYTHONPATH": str(SRC_DIR)}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, env=env, timeout=120, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_api_import_defers_heavy_modules():
+    """
+    GIVEN a fresh interpreter
+    WHEN the REST API module is imported
+    THEN pandas, plotly.express and openpyxl are not imported
+    AND the import is within the time budget
+    """
+    times = import_times("import data.api")
+    assert not [m for m in HEAVY_MODULES if m in times]
+    # Wall clock timings are not reliable while other pytest-xdist workers load the CPU
+    if not os.environ.get("PYTEST_XDIST_WORKER"):
+        assert times["data.api"] < API_IMPORT_BUDGET_US
+
+
+def test_dashboard_quiz_only_defers_heavy_modules():
+    """
+    GIVEN a fresh interpreter
+    WHEN the dashboard runs without a chart selected
+    THEN pandas, plotly.express and openpyxl are not imported
+    """
+    code = ("from streamlit.testing.v1 import AppTest; "
+            f"AppTest.from_file({str(APP_FILE)!r}).run(timeout=30)")
+    times = import_times(code)
+    assert not [m for m in HEAVY_MODULES if m in times]
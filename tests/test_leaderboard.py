@@ -0,0 +1,71 @@
+import sqlite3
+
+import pytest
+
+from data import leaderboard
+
+
+@pytest.fixture()
+def conn():
+    """ In-memory database with the score table and the leaderboard tables and trigger """
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE score (id INTEGER PRIMARY KEY, first_name TEXT, "
+                 "last_name TEXT, score INTEGER)")
+    yield conn
+    conn.close()
+
+
+def add_attempts(conn, attempts):
+    conn.executemany("INSERT INTO score (first_name, last_name, score) VALUES (?, ?, ?)",
+                     attempts)
+
+
+def test_trigger_keeps_best_score_attempts_and_rank(conn):
+    """
+    GIVEN the leaderboard has been created
+    WHEN players record several attempts each
+    THEN the top list has each player's best score and number of attempts, highest first
+    AND players with the same best score share a rank
+    """
+    leaderboard.create_leaderboard(conn)
+    add_attempts(conn, [("Ada", "Lovelace", 3), ("Alan", "Turing", 5), ("Ada", "Lovelace", 6),
+                        ("Grace", "Hopper", 5), ("Ada", "Lovelace", 2), ("Alan", "Turing", 4)])
+    top = leaderboard.top(conn, limit=10)
+    assert [(p["first_name"], p["best"], p["attempts"], p["rank"]) for p in top] == [
+        ("Ada", 6, 3, 1), ("Grace", 5, 1, 2), ("Alan", 5, 2, 2)]
+    assert leaderboard.rank(conn, "Alan", "Turing") == {
+        "rank": 2, "first_name": "Alan", "last_name": "Turing", "best": 5, "attempts": 2,
+        "players": 3}
+    assert leaderboard.rank(conn, "No", "One") is None
+
+
+def test_create_adds_existing_attempts(conn):
+    """
+    GIVEN attempts recorded before the leaderboard tables exist
+    WHEN the leaderboard is created and another attempt is added
+    THEN the ranking includes both the earlier and the new attempts
+    """
+    add_attempts(conn, [("Ada", "Lovelace", 3), ("Alan", "Turing", 5)])
+    leaderboard.create_leaderboard(conn)
+    leaderboard.create_leaderboard(conn)  # a second call changes nothing
+    add_attempts(conn, [("Ada", "Lovelace", 7)])
+    assert [(p["first_name"], p["rank"]) for p in leaderboard.top(conn)] == [
+        ("Ada", 1), ("Alan", 2)]
+    histogram = conn.execute("SELECT score, players FROM _score_histogram").fetchall()
+    assert [tuple(row) for row in histogram] == [(5, 1), (7, 1)]
+
+
+def test_top_pages_and_limits(conn):
+    """
+    GIVEN 30 players with different scores
+    WHEN the second page of 10 is requested
+    THEN ranks 11 to 20 are returned
+    AND a limit above the maximum is rejected
+    """
+    leaderboard.create_leaderboard(conn)
+    add_attempts(conn, [(f"Player{i}", "Test", i) for i in range(30)])
+    page = leaderboard.top(conn, limit=10, offset=10)
+    assert [p["rank"] for p in page] == list(range(11, 21))
+    with pytest.raises(ValueError):
+        leaderboard.top(conn, limit=leaderboard.MAX_LIMIT + 1)
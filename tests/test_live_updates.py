@@ -0,0 +1,44 @@
+import threading
+
+import requests
+
+from paralympics.config import api_base
+from paralympics.live_updates import ChangeListener, parse_sse
+
+API_URL = api_base()
+
+
+def test_parse_sse_events():
+    """
+    GIVEN the lines of a Server-Sent Events stream with a comment and two events
+    WHEN they are parsed
+    THEN the two events are returned with their ids and JSON data
+    """
+    lines = [": keep-alive", "",
+             "id: 1", "event: change", 'data: {"table": "question"}', "",
+             "id: 2", "data: plain text", ""]
+    events = list(parse_sse(lines))
+    assert events == [{"id": "1", "event": "change", "data": {"table": "question"}},
+                      {"id": "2", "data": "plain text"}]
+
+
+def test_listener_only_calls_handlers_for_changed_table():
+    """
+    GIVEN a listener connected to the API /events stream with handlers for two tables
+    WHEN a score is posted to the API
+    THEN only the score handler is called
+    """
+    called = {"score": threading.Event(), "question": threading.Event()}
+    listener = ChangeListener(f"{API_URL}/events",
+                              {table: [event.set] for table, event in called.items()})
+    listener.start()
+    try:
+        # Post until the listener has connected and receives a change
+        for _ in range(20):
+            requests.post(f"{API_URL}/score", json={"first_name": "L", "score": 1})
+            if called["score"].wait(0.5):
+                break
+        assert called["score"].is_set()
+        assert not called["question"].is_set()
+    finally:
+        listener.stop()
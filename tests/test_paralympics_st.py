@@ -3,6 +3,8 @@ from pathlib import Path
 
 from streamlit.testing.v1 import AppTest
 
+from paralympics.quiz import QuizProgress
+
 APP_FILE = Path(__file__).parent.parent.joinpath("src", "paralympics", "paralympics_dashboard.py")
 
 def test_questions_header():
@@ -39,3 +41,35 @@ def test_line_chart_selectors():
     at.selectbox[1].set_value("Sports").run()
     assert at.selectbox[1].value == "Sports"
 
+
+
+def test_profile_panel_shown_with_query_param(tmp_path, monkeypatch):
+    """
+    GIVEN a test app
+    WHEN the page is requested with ?profile=1
+    THEN a render timings panel is shown and the timings are written to the profile file
+    """
+    profile_file = tmp_path / "render_profile.jsonl"
+    monkeypatch.setenv("PARALYMPICS_PROFILE_FILE", str(profile_file))
+    at = AppTest.from_file(APP_FILE)
+    at.query_params["profile"] = "1"
+    at.run()
+    assert not at.exception
+    assert any(e.label.startswith("Render timings") for e in at.expander)
+    assert "render_question_block" in profile_file.read_text()
+
+
+def test_completed_quiz_shows_leaderboard():
+    """
+    GIVEN a test app where every question has been answered
+    WHEN the page is run
+    THEN the score, the form to save it and the leaderboard are shown
+    """
+    at = AppTest.from_file(APP_FILE)
+    at.session_state["quiz_progress"] = QuizProgress(q_index=1000, score=3)
+    at.run()
+    assert not at.exception
+    assert at.header[0].value == "Questions"
+    assert any("3 of" in m.value for m in at.markdown)
+    assert [t.label for t in at.text_input] == ["First name", "Last name"]
+    assert any(s.value == "Leaderboard" for s in at.subheader)
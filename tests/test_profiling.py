@@ -0,0 +1,66 @@
+import json
+
+from paralympics import profiling
+from paralympics.profiling import profile_block
+
+
+def test_profile_block_is_noop_when_disabled():
+    """
+    GIVEN profiling is disabled for the run
+    WHEN a block is profiled
+    THEN the code still runs and there is no active profiler
+    """
+    profiling.begin_run(False, "session")
+    with profile_block("nav"):
+        ran = True
+    assert ran
+    assert profiling.current() is None
+
+
+def test_nested_blocks_recorded():
+    """
+    GIVEN profiling is enabled for the run
+    WHEN a chart builder block contains fetch and figure blocks
+    THEN each block is recorded with its nested name and depth
+    """
+    profiler = profiling.begin_run(True, "session")
+    with profile_block("line_chart"):
+        with profile_block("api_fetch"):
+            pass
+        with profile_block("figure"):
+            pass
+    blocks = {r["block"]: r["depth"] for r in profiler.summary()}
+    assert blocks == {"line_chart": 0, "line_chart/api_fetch": 1, "line_chart/figure": 1}
+    profiling.begin_run(False, "session")
+
+
+def test_is_enabled_by_env_or_query_param(monkeypatch):
+    """
+    GIVEN the profile environment variable and query parameter
+    WHEN is_enabled is checked
+    THEN either one turns profiling on
+    """
+    monkeypatch.delenv(profiling.PROFILE_ENV, raising=False)
+    assert not profiling.is_enabled({})
+    assert profiling.is_enabled({"profile": "1"})
+    monkeypatch.setenv(profiling.PROFILE_ENV, "1")
+    assert profiling.is_enabled()
+
+
+def test_records_appended_to_file(tmp_path):
+    """
+    GIVEN a profiled run
+    WHEN the run is written twice
+    THEN the JSON lines file contains the records of both writes
+    """
+    profiler = profiling.begin_run(True, "abc")
+    with profile_block("render_question_block"):
+        pass
+    out = tmp_path / "timings.jsonl"
+    profiler.write(out)
+    profiler.write(out)
+    lines = [json.loads(line) for line in out.read_text().splitlines()]
+    assert len(lines) == 2
+    assert lines[0]["session_id"] == "abc"
+    assert lines[0]["block"] == "render_question_block"
+    profiling.begin_run(False, "abc")
@@ -0,0 +1,54 @@
+import pytest
+
+from paralympics.quiz import QuizProgress, load_catalogue
+
+QUESTIONS = [{"id": 2, "question_text": "Second?"}, {"id": 1, "question_text": "First?"}]
+RESPONSES = [
+    {"id": 3, "question_id": 1, "response_text": "No", "is_correct": 0},
+    {"id": 1, "question_id": 1, "response_text": "Yes", "is_correct": 1},
+    {"id": 4, "question_id": 2, "response_text": "", "is_correct": 0},
+    {"id": 5, "question_id": 2, "response_text": "Maybe", "is_correct": 1},
+]
+
+
+def test_catalogue_orders_questions_and_responses():
+    """
+    GIVEN question and response rows in any order
+    WHEN the catalogue is loaded
+    THEN questions are numbered from 1 in id order with their responses in id order
+    AND responses without text are left out
+    """
+    catalogue = load_catalogue(QUESTIONS, RESPONSES)
+    assert len(catalogue) == 2
+    first = catalogue.question(1)
+    assert first.text == "First?"
+    assert [r.text for r in first.responses] == ["Yes", "No"]
+    assert first.response(1).is_correct and first.response(5) is None
+    assert [r.text for r in catalogue.question(2).responses] == ["Maybe"]
+    assert catalogue.question(3) is None
+
+
+def test_catalogue_is_read_only():
+    """
+    GIVEN a catalogue shared between sessions
+    WHEN code tries to change it
+    THEN an error is raised
+    """
+    catalogue = load_catalogue(QUESTIONS, RESPONSES)
+    with pytest.raises(AttributeError):
+        catalogue._questions = ()
+    with pytest.raises(AttributeError):
+        catalogue.question(1).text = "Changed"
+
+
+def test_progress_scores_first_attempts():
+    """
+    GIVEN a new quiz progress record
+    WHEN the first question is answered correctly and the second only at the second attempt
+    THEN the score is 1 and the progress is past the second question
+    """
+    progress = QuizProgress()
+    progress.answer(True)
+    progress.answer(False)
+    progress.answer(True)
+    assert (progress.q_index, progress.score, progress.missed) == (3, 1, False)
@@ -0,0 +1,63 @@
+import sqlite3
+
+import pytest
+
+from data.relations import MAX_EXPAND_DEPTH, RelationGraph, parse_expand
+
+
+@pytest.fixture()
+def graph():
+    """ Relation graph for a games, host, country schema with a games_host link table """
+    conn = sqlite3.connect(":memory:")
+    conn.executescript("""
+        CREATE TABLE country (id INTEGER PRIMARY KEY, country_name TEXT);
+        CREATE TABLE host (id INTEGER PRIMARY KEY, place_name TEXT,
+                           country_id INTEGER REFERENCES country (id));
+        CREATE TABLE games (id INTEGER PRIMARY KEY, year INTEGER);
+        CREATE TABLE games_host (id INTEGER PRIMARY KEY,
+                                 games_id INTEGER REFERENCES games (id),
+                                 host_id INTEGER REFERENCES host (id));
+    """)
+    yield RelationGraph.from_connection(conn, ["country", "host", "games", "games_host"])
+    conn.close()
+
+
+def test_forward_reverse_and_link_relations(graph):
+    """
+    GIVEN a schema with a foreign key and a link table
+    WHEN the relation graph is built
+    THEN host has a single country, country has a list of hosts, and games and host are
+    related to each other through the link table
+    """
+    country = graph.get("host", "country")
+    assert (country.table, country.many, country.local_column, country.remote_column) == (
+        "country", False, "country_id", "id")
+    assert graph.get("country", "host").many
+    host = graph.get("games", "host")
+    assert (host.link, host.remote_column, host.link_column, host.target_column) == (
+        "games_host", "games_id", "host_id", "id")
+    assert graph.get("host", "games").link == "games_host"
+    assert sorted(graph.names("games")) == ["games_host", "host"]
+
+
+def test_unknown_relation_is_an_error(graph):
+    """
+    GIVEN the relation graph
+    WHEN a relation that doesn't exist is requested
+    THEN a ValueError lists the relations that do
+    """
+    with pytest.raises(ValueError, match="games_host"):
+        graph.get("games", "team")
+
+
+def test_parse_expand():
+    """
+    GIVEN expand parameters with shared prefixes, spaces and too many levels
+    WHEN they are parsed
+    THEN a tree of relation names is returned, or a ValueError if too deep
+    """
+    assert parse_expand("host.country, host.games,team") == {
+        "host": {"country": {}, "games": {}}, "team": {}}
+    assert parse_expand(None) == {}
+    with pytest.raises(ValueError):
+        parse_expand(".".join(["host"] * (MAX_EXPAND_DEPTH + 1)))
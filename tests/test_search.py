@@ -0,0 +1,69 @@
+import sqlite3
+
+import pytest
+
+from data import search
+
+
+@pytest.fixture()
+def conn():
+    """ In-memory database with small games, team and question tables and the search index """
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.executescript("""
+        CREATE TABLE games (id INTEGER PRIMARY KEY, event_type TEXT, year INTEGER,
+                            highlights TEXT);
+        CREATE TABLE team (code TEXT PRIMARY KEY, name TEXT, notes TEXT);
+        CREATE TABLE question (id INTEGER PRIMARY KEY, question_text TEXT);
+        INSERT INTO games VALUES (1, 'summer', 1960, 'First Games, wheelchair racing only');
+        INSERT INTO games VALUES (2, 'winter', 2006, 'Wheelchair Curling added');
+    """)
+    search.create_search_index(conn, ["games", "team", "question"])
+    yield conn
+    conn.close()
+
+
+def test_existing_rows_indexed_and_ranked(conn):
+    """
+    GIVEN games rows added before the index was created
+    WHEN 'wheelchair' is searched for
+    THEN both games are found with the word highlighted in the snippet
+    """
+    result = search.search(conn, "wheelchair")
+    assert sorted(r["key"] for r in result["results"]) == ["1", "2"]
+    assert all("[" in r["snippet"] for r in result["results"])
+    assert result["next_offset"] is None
+
+
+def test_triggers_keep_index_in_sync(conn):
+    """
+    GIVEN the search index
+    WHEN a team is inserted, then updated, and a games row is deleted
+    THEN searches find the team by its new notes only and no longer find the deleted games
+    """
+    conn.execute("INSERT INTO team VALUES ('ITA', 'Italy', 'Hosted in Rome')")
+    conn.execute("UPDATE team SET notes = 'Hosted in Turin' WHERE code = 'ITA'")
+    conn.execute("DELETE FROM games WHERE id = 2")
+    assert [r["key"] for r in search.search(conn, "turin")["results"]] == ["ITA"]
+    assert search.search(conn, "rome")["results"] == []
+    assert [r["key"] for r in search.search(conn, "curling")["results"]] == []
+
+
+def test_prefix_pagination_and_filters(conn):
+    """
+    GIVEN indexed games and questions
+    WHEN searching with a partial last word, one result per page, or only questions
+    THEN prefixes match, next_offset pages through results and the table filter applies
+    AND text with no words or an unknown table is rejected
+    """
+    conn.execute("INSERT INTO question (question_text) VALUES ('When was wheelchair curling "
+                 "first played?')")
+    assert len(search.search(conn, "wheelchair curl")["results"]) == 2
+    page = search.search(conn, "wheelchair", limit=1)
+    assert len(page["results"]) == 1 and page["next_offset"] == 1
+    only = search.search(conn, "wheelchair", sources=["question"])
+    assert [r["source"] for r in only["results"]] == ["question"]
+    with pytest.raises(ValueError):
+        search.search(conn, '"-')
+    with pytest.raises(ValueError):
+        search.search(conn, "wheelchair", sources=["host"])
@@ -0,0 +1,55 @@
+from data.paralympics_data import ParalympicsData
+
+
+def test_snapshot_reads_match_database():
+    """
+    GIVEN data with the reference table snapshot enabled
+    WHEN the chart data and a reference table are read
+    THEN the rows are the same as those read from the database file
+    """
+    file_data = ParalympicsData()
+    snap_data = ParalympicsData(snapshot=True)
+    try:
+        assert snap_data.get_all_data() == file_data.get_all_data()
+        assert snap_data.search_table("games", {"year": "2012"}) == \
+               file_data.search_table("games", {"year": "2012"})
+        assert snap_data.metrics()["snapshot"]["loads"] == 1
+    finally:
+        file_data.close()
+        snap_data.close()
+
+
+def test_snapshot_refreshed_after_write_by_another_worker():
+    """
+    GIVEN two data instances with snapshots, standing in for two API worker processes
+    WHEN one of them adds a country
+    THEN it can read the new row straight away
+    AND the other reloads its snapshot and reads the new row on its next check
+    """
+    worker_1 = ParalympicsData(snapshot=True)
+    worker_2 = ParalympicsData(snapshot=True)
+    worker_2._get_snapshot().check_interval = 0
+    try:
+        new_row = worker_1.add_row("country", {"country_name": "Snapshot Land"})
+        assert worker_1.get_row_by_id("country", new_row["id"]) == new_row
+        assert worker_2.get_row_by_id("country", new_row["id"]) == new_row
+        assert worker_2.metrics()["snapshot"]["loads"] == 2
+    finally:
+        worker_1.close()
+        worker_2.close()
+
+
+def test_snapshot_not_reloaded_for_quiz_writes():
+    """
+    GIVEN data with the snapshot enabled
+    WHEN a score is added (score is not a reference table)
+    THEN the snapshot is not reloaded
+    """
+    snap_data = ParalympicsData(snapshot=True)
+    snap_data._get_snapshot().check_interval = 0
+    try:
+        snap_data.add_row("score", {"first_name": "A", "last_name": "B", "score": 1})
+        snap_data.get_all_data()
+        assert snap_data.metrics()["snapshot"]["loads"] == 1
+    finally:
+        snap_data.close()
@@ -0,0 +1,34 @@
+from data.statements import StatementRegistry
+
+
+def test_statement_built_once_and_reused():
+    """
+    GIVEN a statement registry
+    WHEN the same (table, operation, columns) key is requested three times
+    THEN the SQL is built once and the later lookups are counted as hits
+    """
+    registry = StatementRegistry()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return "SELECT * FROM 'games' WHERE \"year\" = ?"
+
+    sqls = {registry.get("games", "search", ("year",), build) for _ in range(3)}
+    assert len(sqls) == 1
+    assert len(builds) == 1
+    assert registry.stats()["hits"] == 2
+    assert registry.stats()["hit_rate"] == 2 / 3
+
+
+def test_different_columns_are_different_statements():
+    """
+    GIVEN a statement registry
+    WHEN statements for different column sets are requested
+    THEN each is stored separately
+    """
+    registry = StatementRegistry()
+    registry.get("games", "search", ("year",), lambda: "a")
+    registry.get("games", "search", ("event_type", "year"), lambda: "b")
+    assert registry.stats()["statements"] == 2
+    assert registry.stats()["misses"] == 2
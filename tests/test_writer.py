@@ -0,0 +1,107 @@
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from data.writer import DatabaseWriter
+
+
+@pytest.fixture()
+def writer(tmp_path):
+    db = tmp_path / "test.db"
+    with sqlite3.connect(db) as conn:
+        conn.execute("CREATE TABLE score (id INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+    w = DatabaseWriter(db)
+    yield w
+    w.close()
+
+
+def _insert(name):
+    return lambda conn: conn.execute("INSERT INTO score (name) VALUES (?)", (name,)).lastrowid
+
+
+def _count(db):
+    with sqlite3.connect(db) as conn:
+        return conn.execute("SELECT COUNT(*) FROM score").fetchone()[0]
+
+
+def test_database_in_wal_mode(writer):
+    """
+    GIVEN a database writer
+    WHEN a job has run
+    THEN the database is in WAL journal mode
+    """
+    writer.execute(_insert("a"))
+    with sqlite3.connect(writer.database_file) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_concurrent_inserts_all_committed(writer):
+    """
+    GIVEN a database writer
+    WHEN 50 inserts are submitted from 10 threads at once
+    THEN every insert returns a distinct id and all rows are committed
+    """
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        ids = list(pool.map(lambda i: writer.execute(_insert(f"p{i}")), range(50)))
+    assert len(set(ids)) == 50
+    assert _count(writer.database_file) == 50
+
+
+def test_queued_jobs_group_committed(writer):
+    """
+    GIVEN a writer that is busy with a job
+    WHEN 10 more inserts are queued
+    THEN they are committed together in one transaction
+    """
+    release = threading.Event()
+    blocked = writer.submit(lambda conn: release.wait(5))
+    futures = [writer.submit(_insert(f"p{i}")) for i in range(10)]
+    release.set()
+    blocked.result()
+    for f in futures:
+        f.result()
+    assert writer.stats()["jobs_committed"] == 11
+    assert writer.stats()["batches_committed"] <= 2
+
+
+def test_failed_job_does_not_affect_batch(writer):
+    """
+    GIVEN a batch of queued inserts where one violates a constraint
+    WHEN the batch is committed
+    THEN the failing insert raises and the others are committed
+    """
+    release = threading.Event()
+    writer.submit(lambda conn: release.wait(5))
+    good = writer.submit(_insert("ok"))
+    bad = writer.submit(_insert(None))
+    release.set()
+    assert good.result() is not None
+    with pytest.raises(sqlite3.IntegrityError):
+        bad.result()
+    assert _count(writer.database_file) == 1
+
+
+def test_readers_not_blocked_by_open_write(writer):
+    """
+    GIVEN a write transaction that has not committed yet
+    WHEN another connection reads the table
+    THEN the read completes without waiting for the lock
+    """
+    writer.execute(_insert("first"))
+    in_txn = threading.Event()
+    release = threading.Event()
+
+    def _slow_insert(conn):
+        conn.execute("INSERT INTO score (name) VALUES ('second')")
+        in_txn.set()
+        release.wait(5)
+
+    future = writer.submit(_slow_insert)
+    assert in_txn.wait(5)
+    with sqlite3.connect(writer.database_file, timeout=0) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM score").fetchone()[0] == 1
+    release.set()
+    future.result()
+    assert _count(writer.database_file) == 2